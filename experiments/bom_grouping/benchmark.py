@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the BoM grouping (make_groups) against the pairwise comparison we used before (each component against the
+first component of all the groups).
+Usage: benchmark.py [COMPONENTS] [PAIRWISE_COMPONENTS]
+Uses random components (default 20000) and checks the groups are the same for various configurations. The pairwise
+comparison is O(components x groups), so it uses less components (default 2000).
+"""
+import os
+import random
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from kibot import log  # noqa: E402
+log.set_domain('kibot')
+log.init()
+from kibot.bom.bom import make_groups, ComponentGroup, RLC_PREFIX  # noqa: E402
+from kibot.bom.columnlist import ColumnList  # noqa: E402
+from kibot.bom.units import comp_match  # noqa: E402
+from kibot.misc import DNF  # noqa: E402
+
+VALUES = {'R': ['10', '100', '1k', '1000', '1K', '3k3', '3300', '4.7k', '10k', '47k', '100k', '1M'],
+          'C': ['100n', '100nF', '0.1uF', '1u', '1uF', '10u', '22p', '4.7uF', '~'],
+          'L': ['10u', '10uH', '4.7u', '1m'],
+          'U': ['LM358', 'lm358', 'NE555', 'ATmega328P', 'STM32F103'],
+          'J': ['Conn_01x02', 'Conn_01x04', 'USB_B', 'Power'],
+          'D': ['1N4148', 'LED', 'BAT54']}
+PARTS = {'R': ['R', 'R_Small', 'Resistor'], 'C': ['C', 'C_Small', 'CP'], 'L': ['L', 'L_Small'], 'U': ['LM358', 'NE555', 'MCU'],
+         'J': ['Conn_01x02', 'USB_B'], 'D': ['D', 'LED', 'D_Small']}
+# Same as out_bom.DEFAULT_ALIASES, the output needs pcbnew
+ALIASES = [['r', 'r_small', 'res', 'resistor'], ['l', 'l_small', 'inductor'], ['c', 'c_small', 'cap', 'capacitor'],
+           ['sw', 'switch'], ['zener', 'zenersmall'], ['d', 'diode', 'd_small']]
+FOOTPRINTS = ['R_0603', 'R_0805', 'C_0603', 'C_0805', 'SOIC-8', 'DIP-8', 'PinHeader_1x02', '']
+
+
+class Component(object):
+    def __init__(self, n, prefix, rnd):
+        self.ref_prefix = prefix
+        self.ref_suffix = str(n)
+        self.ref = prefix+str(n)
+        self.project = 'bench'
+        self.included = True
+        self.fitted = rnd.random() > 0.05
+        self.fixed = rnd.random() < 0.02
+        self.value = rnd.choice(VALUES[prefix])
+        self.name = rnd.choice(PARTS[prefix])
+        self.lib = 'Connector' if prefix == 'J' else 'Device'
+        self.fields = {'footprint': rnd.choice(FOOTPRINTS),
+                       'voltage': rnd.choice(['', '', '', '16V', '50V']),
+                       'tolerance': rnd.choice(['', '', '1%', '5%']),
+                       'current': rnd.choice(['', '', '', '', '1A']),
+                       'power': rnd.choice(['', '', '0.1W', '0.25W']),
+                       'mpn': rnd.choice(['', 'MPN1', 'MPN2', 'mpn1'])}
+
+    def get_field_value(self, field):
+        field = field.lower()
+        if field == ColumnList.COL_VALUE_L:
+            return self.value
+        if field == ColumnList.COL_PART_L:
+            return self.name
+        return self.fields.get(field, '')
+
+
+def make_components(n, seed):
+    rnd = random.Random(seed)
+    prefixes = list(VALUES.keys())
+    comps = [Component(i+1, rnd.choice(prefixes), rnd) for i in range(n)]
+    # Some repeated references (multi-unit components)
+    comps.extend(rnd.sample(comps, n//20))
+    return comps
+
+
+def pairwise_groups(cfg, components):
+    """ The old algorithm """
+    groups = []
+    for c in components:
+        if not c.included:
+            continue
+        if c.ref_prefix in RLC_PREFIX and c.value.lower() not in DNF:
+            c.value_sort = comp_match(c.value, c.ref_prefix, c.ref)
+        else:
+            c.value_sort = None
+        for g in groups:
+            if g.match_component(c):
+                g.add_component(c)
+                break
+        else:
+            g = ComponentGroup(cfg)
+            g.add_component(c)
+            groups.append(g)
+    return groups
+
+
+def make_cfg(**kwargs):
+    group_fields = ColumnList.DEFAULT_GROUPING + ['voltage', 'tolerance', 'current', 'power']
+    cfg = SimpleNamespace(group_fields=group_fields, group_fields_fallbacks=[None]*len(group_fields),
+                          component_aliases=ALIASES, merge_blank_fields=True, merge_both_blank=True,
+                          group_connectors=True)
+    for k, v in kwargs.items():
+        setattr(cfg, k, v)
+    if len(cfg.group_fields_fallbacks) < len(cfg.group_fields):
+        cfg.group_fields_fallbacks += [None]*(len(cfg.group_fields)-len(cfg.group_fields_fallbacks))
+    return cfg
+
+
+CONFIGS = {'default': make_cfg(),
+           'no_merge_blank': make_cfg(merge_blank_fields=False),
+           'no_merge_both_blank': make_cfg(merge_blank_fields=False, merge_both_blank=False),
+           'no_group_connectors': make_cfg(group_connectors=False),
+           'fallbacks': make_cfg(group_fields=['part', 'mpn', 'value', 'footprint'],
+                                 group_fields_fallbacks=[None, 'value', None, None]),
+           'no_grouping': make_cfg(group_fields=[])}
+
+
+def refs(groups):
+    return [[c.ref for c in g.components] for g in groups]
+
+
+def measure(func, *args):
+    start = perf_counter()
+    res = func(*args)
+    return res, perf_counter()-start
+
+
+n_comps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+n_pairwise = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+ok = True
+print('{:<20} {:>8} {:>7} {:>12} {:>12}'.format('Config', 'Comps', 'Groups', 'Pairwise [s]', 'Indexed [s]'))
+for name, cfg in CONFIGS.items():
+    for n in sorted({n_pairwise, n_comps}):
+        comps = make_components(n, 1)
+        indexed, t_indexed = measure(make_groups, cfg, comps)
+        t_pairwise = None
+        if n <= n_pairwise:
+            pairwise, t_pairwise = measure(pairwise_groups, cfg, comps)
+            if refs(pairwise) != refs(indexed):
+                print('Different groups for `{}` ({} components)'.format(name, n))
+                ok = False
+        print('{:<20} {:>8} {:>7} {:>12} {:>12.3f}'.format(name, len(comps), len(indexed),
+              '{:.3f}'.format(t_pairwise) if t_pairwise is not None else '-', t_indexed))
+sys.exit(0 if ok else 1)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Measures the memory used by a loaded schematic.
+Usage: measure.py SCHEMATIC [COPIES]
+The schematic is loaded COPIES times (default 10) and kept in memory, the result is the memory allocated by
+Python for each copy and for each component.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from kibot import log  # noqa: E402
+log.set_domain('kibot')
+log.init()
+from kibot.gs import GS  # noqa: E402
+from kibot.kicad.config import KiConf  # noqa: E402
+from kibot.kicad.v5_sch import Schematic  # noqa: E402
+from kibot.kicad.v6_sch import SchematicV6  # noqa: E402
+from kibot.kicad import v6_sch  # noqa: E402
+
+fname = sys.argv[1]
+copies = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+project = os.path.splitext(os.path.basename(fname))[0]
+is_v5 = fname.endswith('.sch')
+GS.ki5 = is_v5
+GS.ki6 = GS.ki7 = not is_v5
+GS.ki8 = False
+GS.global_date_time_format = GS.global_date_format = '%Y-%m-%d'
+# Measure the whole schematic, not just the used parts of the lib symbols
+v6_sch.lazy_lib_symbols = False
+if is_v5:
+    KiConf.init(fname)
+
+
+def load():
+    if is_v5:
+        sch = Schematic()
+        sch.load(fname, project)
+        sch.load_libs(fname)
+    else:
+        sch = SchematicV6()
+        sch.load(fname, project)
+    return sch
+
+
+# Warm-up: load the modules, compile the regexs, etc.
+load()
+gc.collect()
+tracemalloc.start()
+start = tracemalloc.get_traced_memory()[0]
+schs = [load() for _ in range(copies)]
+gc.collect()
+used = tracemalloc.get_traced_memory()[0]-start
+tracemalloc.stop()
+comps = len(schs[0].get_components())
+per_copy = used/copies
+print('Schematic:      {}'.format(fname))
+print('Components:     {}'.format(comps))
+print('Per schematic:  {:.1f} KiB'.format(per_copy/1024))
+print('Per component:  {:.0f} bytes'.format(per_copy/comps))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the sequential load of a hierarchical schematic against the parallel parse of the sub-sheets (-j).
+Usage: benchmark.py [SHEET] [SUB_SHEETS] [JOBS]
+Creates a temporal project where the root sheet instantiates SUB_SHEETS (default 16) copies of SHEET (default
+light_control.kicad_sch from the tests). Each copy is a different file, so all of them must be parsed. The symbol
+instances of the copies are adjusted to the new sheet paths. Then loads it using 1 and JOBS (default the number of
+CPUs) processes and checks we get the same components.
+"""
+import os
+import re
+import sys
+import tempfile
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from kibot import log  # noqa: E402
+log.set_domain('kibot')
+log.init()
+from kibot.gs import GS  # noqa: E402
+from kibot.kicad.v6_sch import SchematicV6  # noqa: E402
+
+SHEET = """  (sheet (at {x} 50) (size 20 20)
+    (uuid 00000000-0000-0000-0000-{n:012x})
+    (property "Sheetname" "Sub {n}" (at {x} 49 0)
+      (effects (font (size 1.27 1.27)) (justify left bottom))
+    )
+    (property "Sheetfile" "sub_{n}.kicad_sch" (at {x} 71 0)
+      (effects (font (size 1.27 1.27)) (justify left top))
+    )
+  )
+"""
+ROOT = """(kicad_sch (version 20230121) (generator eeschema)
+  (uuid {uuid})
+  (paper "A4")
+  (lib_symbols
+  )
+{sheets}  (sheet_instances
+    (path "/" (page "1"))
+  )
+)
+"""
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tests')
+sheet = sys.argv[1] if len(sys.argv) > 1 else os.path.join(TESTS, 'board_samples', 'kicad_7', 'light_control.kicad_sch')
+n_sheets = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+jobs = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+GS.ki5 = GS.ki8 = False
+GS.ki6 = GS.ki7 = True
+GS.global_date_time_format = GS.global_date_format = '%Y-%m-%d'
+
+
+def load(fname, jobs):
+    GS.jobs = jobs
+    start = perf_counter()
+    sch = SchematicV6()
+    sch.load(fname, 'bench')
+    return sch, perf_counter()-start
+
+
+with open(sheet, 'rt') as f:
+    content = f.read()
+# The root uses the same UUID, so we just need to add the sheet UUID to the paths of the instances
+uuid = re.search(r'\(uuid ([^)]+)\)', content).group(1)
+with tempfile.TemporaryDirectory() as tmp:
+    for n in range(n_sheets):
+        with open(os.path.join(tmp, 'sub_{}.kicad_sch'.format(n)), 'wt') as f:
+            f.write(content.replace('(path "/{}"'.format(uuid), '(path "/{}/00000000-0000-0000-0000-{:012x}"'.format(uuid, n)))
+    fname = os.path.join(tmp, 'bench.kicad_sch')
+    with open(fname, 'wt') as f:
+        f.write(ROOT.format(uuid=uuid, sheets=''.join(SHEET.format(n=n, x=10+25*n) for n in range(n_sheets))))
+    # Warm-up: load the modules, compile the regexs, etc.
+    load(fname, 1)
+    serial, t_serial = load(fname, 1)
+    parallel, t_parallel = load(fname, jobs)
+comps = [(c.ref, c.sheet_path_h) for c in serial.get_components()]
+ok = comps == [(c.ref, c.sheet_path_h) for c in parallel.get_components()]
+print('Sub-sheets:        {}'.format(n_sheets))
+print('Components:        {}'.format(len(comps)))
+print('Sequential:        {:.3f} s'.format(t_serial))
+print('Parallel ({:>2} jobs): {:.3f} s ({:.2f}x)'.format(jobs, t_parallel, t_serial/t_parallel))
+if not ok:
+    print('Different components!')
+sys.exit(0 if ok else 1)
@@ -10,12 +10,15 @@
 Usage:
   kibot [-b BOARD] [-e SCHEMA] [-c CONFIG] [-d OUT_DIR] [-s PRE] [-D]
          [-q | -v...] [-L LOGFILE] [-C | -i | -n] [-m MKFILE] [-A] [-g DEF] ...
-         [-E DEF] ... [-w LIST] [--banner N] [TARGET...]
+         [-E DEF] ... [-w LIST] [-j JOBS] [-I] [--profile FILE] [--mem-profile]
+         [--sch-cache] [--banner N] [TARGET...]
   kibot [-v...] [-b BOARD] [-e SCHEMA] [-c PLOT_CONFIG] [--banner N]
          [-E DEF] ... [--config-outs] [--only-pre|--only-groups] [--only-names]
          [--output-name-first] --list
   kibot [-v...] [-c PLOT_CONFIG] [--banner N] [-E DEF] ... [--only-names]
          --list-variants
+  kibot [-q | -v...] [-b BOARD] [-e SCHEMA] [-c CONFIG] [-d OUT_DIR] [-L LOGFILE]
+         [-A] [-g DEF] ... [-E DEF] ... [-w LIST] [-I] --serve SOCKET
   kibot [-v...] [-b BOARD] [-d OUT_DIR] [-p | -P] [--banner N] --example
   kibot [-v...] [--start PATH] [-d OUT_DIR] [--dry] [--banner N]
          [-t, --type TYPE]... --quick-start
@@ -28,6 +31,7 @@ Usage:
   kibot [-v...] --help-preflights
   kibot [-v...] --help-variants
   kibot [-v...] --help-banners
+  kibot [-v...] --precompile
   kibot -h | --help
   kibot --version
 
@@ -47,6 +51,10 @@ Options:
   -E DEF, --define DEF             Define preprocessor value (VAR=VAL)
   -g DEF, --global-redef DEF       Overwrite a global value (VAR=VAL)
   -i, --invert-sel                 Generate the outputs not listed as targets
+  -I, --incremental                Skip outputs whose inputs and options didn't
+                                   change since the last run
+  -j JOBS, --jobs JOBS             Generate up to JOBS outputs in parallel.
+                                   Use 0 for the number of CPUs [default: 1]
   -l, --list                       List available outputs, preflights and
                                    groups (in the config file).
                                    You don't need to specify an SCH/PCB unless
@@ -55,6 +63,8 @@ Options:
   -L, --log LOGFILE                Log to LOGFILE using maximum debug level.
                                    Is independent of what is logged to stderr
   -m MKFILE, --makefile MKFILE     Generate a Makefile (no targets created)
+  --mem-profile                    Measure the memory used by each preflight
+                                   and output. Included in the --profile FILE
   -n, --no-priority                Don't sort targets by priority
   -p, --copy-options               Copy plot options from the PCB file
   --only-names                     Print only the names. Note that for --list
@@ -64,8 +74,16 @@ Options:
   --only-pre                       Print only the preflights
   --output-name-first              Use the output name first when listing
   -P, --copy-and-expand            As -p but expand the list of layers
+  --profile FILE                   Measure the time used by each phase, store
+                                   it in FILE (Chrome trace format)
+  --precompile                     Store the bytecode for all the plug-ins
+                                   (for packagers)
   -q, --quiet                      Remove information logs
   -s PRE, --skip-pre PRE           Skip preflights, comma separated or `all`
+  --sch-cache                      Store the loaded schematic in a cache and
+                                   reuse it while the files didn't change
+  --serve SOCKET                   Load the project once and generate outputs
+                                   on demand, jobs are received at SOCKET
   -v, --verbose                    Show debugging information
   -V, --version                    Show program's version number and exit
   -w, --no-warn LIST               Exclude the mentioned warnings (comma sep)
@@ -121,14 +139,18 @@ if os.environ.get('KIAUS_USE_NIGHTLY'):  # pragma: no cover (nightly)
 from .banner import get_banner, BANNERS
 from .gs import GS
 from . import dep_downloader
+from . import incremental
+from . import profiler
+from . import sch_cache
 from .misc import EXIT_BAD_ARGS, W_VARCFG, NO_PCBNEW_MODULE, W_NOKIVER, hide_stderr, TRY_INSTALL_CHECK, W_ONWIN
 from .pre_base import BasePreFlight
 from .error import KiPlotConfigurationError, config_error
 from .config_reader import (CfgYamlReader, print_outputs_help, print_output_help, print_preflights_help, create_example,
                             print_filters_help, print_global_options_help, print_dependencies, print_variants_help)
 from .kiplot import (generate_outputs, load_actions, config_output, generate_makefile, generate_examples, solve_schematic,
-                     solve_board_file, solve_project_file, check_board_file)
+                     solve_board_file, solve_project_file, check_board_file, precompile_plugins, solve_jobs)
 from .registrable import RegOutput
+from .server import serve
 GS.kibot_version = __version__
 
 
@@ -369,6 +391,27 @@ def apply_warning_filter(args):
             sys.exit(EXIT_BAD_ARGS)
 
 
+def read_config(plot_config):
+    cr = CfgYamlReader()
+    outputs = None
+    try:
+        # The Python way ...
+        with gzip.open(plot_config, mode='rt') as cf_file:
+            try:
+                outputs = cr.read(cf_file)
+            except KiPlotConfigurationError as e:
+                config_error(str(e))
+    except OSError:
+        pass
+    if outputs is None:
+        with open(plot_config) as cf_file:
+            try:
+                outputs = cr.read(cf_file)
+            except KiPlotConfigurationError as e:
+                config_error(str(e))
+    return outputs
+
+
 def debug_arguments(args):
     if GS.debug_level > 1:
         logger.debug('Command line arguments:\n'+str(sys.argv))
@@ -403,6 +446,8 @@ def main():
     # The log setup finished, this is our first log message
     logger.debug('KiBot {} verbose level: {} started on {}'.format(__version__, args.verbose, datetime.now()))
     apply_warning_filter(args)
+    if args.profile or args.mem_profile:
+        profiler.start(args.profile, args.mem_profile)
     # Now we have the debug level set we can check (and optionally inform) KiCad info
     detect_kicad()
     detect_windows()
@@ -418,9 +463,19 @@ def main():
     if args.no_auto_download:
         dep_downloader.disable_auto_download = True
 
+    # Skip outputs that are up to date
+    incremental.enabled = args.incremental
+    # Reuse the loaded schematic
+    sch_cache.enabled = args.sch_cache
+
     # Output dir: relative to CWD (absolute path overrides)
     GS.out_dir = os.path.join(os.getcwd(), args.out_dir)
 
+    if args.precompile:
+        # Cache the macro expanded plug-ins
+        precompile_plugins()
+        sys.exit(0)
+
     # Load output and preflight plugins
     load_actions()
 
@@ -483,24 +538,14 @@ def main():
     # Parse preprocessor defines
     parse_defines(args)
 
+    if args.serve:
+        # Keep the project loaded and wait for jobs
+        serve(args.serve, plot_config, read_config)
+        sys.exit(0)
+
     # Read the config file
-    cr = CfgYamlReader()
-    outputs = None
-    try:
-        # The Python way ...
-        with gzip.open(plot_config, mode='rt') as cf_file:
-            try:
-                outputs = cr.read(cf_file)
-            except KiPlotConfigurationError as e:
-                config_error(str(e))
-    except OSError:
-        pass
-    if outputs is None:
-        with open(plot_config) as cf_file:
-            try:
-                outputs = cr.read(cf_file)
-            except KiPlotConfigurationError as e:
-                config_error(str(e))
+    with profiler.phase('load config', 'run'):
+        outputs = read_config(plot_config)
 
     # Is just "list the available targets"?
     if args.list:
@@ -517,8 +562,9 @@ def main():
         generate_makefile(args.makefile, plot_config, outputs)
     else:
         # Do all the job (preflight + outputs)
+        GS.jobs = solve_jobs(args.jobs)
         generate_outputs(outputs, args.target, args.invert_sel, args.skip_pre, args.cli_order, args.no_priority,
-                         dont_stop=args.dont_stop)
+                         dont_stop=args.dont_stop, jobs=GS.jobs)
     # Print total warnings
     logger.log_totals()
 
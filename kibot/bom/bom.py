@@ -117,6 +117,154 @@ def compare_components(c1, c2, cfg):
     return True
 
 
+def get_value_keys(c, cfg):
+    """ Keys for compare_value """
+    value = c.value.strip().lower()
+    if value == '~':
+        value = ''
+    keys = [('s', value)]
+    if c.value_sort:
+        keys.append(('n', str(c.value_sort)))
+    if cfg.group_connectors and 'connector' in c.lib.lower():
+        keys.append(('c',))
+    return keys
+
+
+def get_part_name_keys(c, cfg):
+    """ Keys for compare_part_name """
+    pn = c.name.lower()
+    keys = [('p', pn)]
+    for n, alias in enumerate(cfg.component_aliases):
+        if pn in alias:
+            keys.append(('a', n))
+    return keys
+
+
+def get_field_keys(c, field, cfg):
+    """ Keys for compare_field, None if the field is blank and will be merged """
+    value = c.get_field_value(field).lower()
+    if value == "":
+        if cfg.merge_blank_fields:
+            return None
+        return [('f', value)] if cfg.merge_both_blank else []
+    return [('f', value)]
+
+
+def project_keys(base, fields_keys, fields):
+    """ All the combinations of the keys for the selected fields """
+    keys = [base]
+    for n in fields:
+        keys = [k+(fk,) for k in keys for fk in fields_keys[n]]
+    return keys
+
+
+class GroupsIndex(object):
+    """ Finds the group for a component, the same group we get comparing against the first component of all the
+        groups using compare_components, but without comparing one by one.
+        The components are described using keys for each grouping field. Two components match when they share a key
+        for all the fields, i.e. 3k3 has keys for '3k3' and '3300 Ω', connectors have a key shared by all of them.
+        Blank fields merged with any value (merge_blank_fields) aren't compared, so we keep an index for each
+        combination of blank fields.
+        Components that can't be described this way (empty field with a fallback) are compared one by one. """
+    def __init__(self, cfg):
+        super().__init__()
+        self.cfg = cfg
+        self.groups = []
+        # Keys for the first component of the groups, by blank fields mask
+        self.leaders = {}
+        # Groups for each key, by blank fields mask and compared fields
+        self.indexes = {}
+        # Groups compared one by one
+        self.fuzzy = []
+        # Fields compared for each blank fields mask
+        self.compared_fields = {}
+
+    def get_keys(self, c):
+        """ Returns the base key, the keys for each field and the blank fields mask.
+            None if the component must be compared one by one """
+        cfg = self.cfg
+        base = (c.fitted, c.fixed)
+        if len(cfg.group_fields) == 0:
+            # Do not group components
+            return base+(c.ref,), [], 0
+        fields_keys = []
+        mask = 0
+        for n, field in enumerate(cfg.group_fields):
+            if cfg.group_fields_fallbacks[n] is not None and c.get_field_value(field) == "":
+                # The field we compare depends on the other component
+                return None
+            if field == ColumnList.COL_VALUE_L:
+                keys = get_value_keys(c, cfg)
+            elif field == ColumnList.COL_PART_L:
+                keys = get_part_name_keys(c, cfg)
+            else:
+                keys = get_field_keys(c, field, cfg)
+                if keys is None:
+                    mask |= 1 << n
+            fields_keys.append(keys)
+        return base, fields_keys, mask
+
+    def get_compared_fields(self, mask):
+        fields = self.compared_fields.get(mask)
+        if fields is None:
+            fields = self.compared_fields[mask] = tuple(n for n in range(len(self.cfg.group_fields)) if not (mask >> n) & 1)
+        return fields
+
+    def get_index(self, mask, fields):
+        """ Groups with the `mask` blank fields, indexed by the keys for `fields` """
+        indexes = self.indexes.setdefault(mask, {})
+        index = indexes.get(fields)
+        if index is None:
+            index = indexes[fields] = {}
+            for n_group, base, fields_keys in self.leaders[mask]:
+                for k in project_keys(base, fields_keys, fields):
+                    index.setdefault(k, []).append(n_group)
+        return index
+
+    def find(self, c, keys):
+        """ Index of the first group matching the component, None if no match """
+        best = next((n for n in self.fuzzy if self.groups[n].match_component(c)), None)
+        base, fields_keys, mask = keys
+        # The keys depend on the fields we compare, not on the mask of the groups
+        projected = {}
+        for l_mask in self.leaders.keys():
+            fields = self.get_compared_fields(mask | l_mask)
+            index = self.get_index(l_mask, fields)
+            c_keys = projected.get(fields)
+            if c_keys is None:
+                c_keys = projected[fields] = project_keys(base, fields_keys, fields)
+            for k in c_keys:
+                found = index.get(k)
+                if found and (best is None or found[0] < best):
+                    best = found[0]
+        return best
+
+    def add(self, c):
+        """ Adds the component to its group, creates a new group if needed """
+        keys = self.get_keys(c)
+        if keys is None:
+            n_group = next((n for n, g in enumerate(self.groups) if g.match_component(c)), None)
+        else:
+            n_group = self.find(c, keys)
+        if n_group is not None:
+            self.groups[n_group].add_component(c)
+            return
+        # Create a new group
+        n_group = len(self.groups)
+        g = ComponentGroup(self.cfg)
+        g.add_component(c)
+        self.groups.append(g)
+        if keys is None:
+            self.fuzzy.append(n_group)
+            return
+        base, fields_keys, mask = keys
+        self.leaders.setdefault(mask, []).append((n_group, base, fields_keys))
+        # Add it to the indexes already created
+        for fields, index in self.indexes.get(mask, {}).items():
+            for k in project_keys(base, fields_keys, fields):
+                index.setdefault(k, []).append(n_group)
+
+
 class Joiner:
     def __init__(self):
         self.stack = {}
@@ -424,9 +572,10 @@ def compute_multiple_stats(cfg, groups):
                          format(sch.name, sch.comp_total, sch.comp_fitted, sch.comp_build))
 
 
-def group_components(cfg, components):
-    groups = []
-    # Iterate through each component, and test whether a group for these already exists
+def make_groups(cfg, components):
+    """ Puts the components in groups, without filling the fields """
+    index = GroupsIndex(cfg)
+    # Iterate through each component, and add it to the first group where it matches
     for c in components:
         if not c.included:  # Skip components marked as excluded from BoM
             continue
@@ -435,18 +584,12 @@ def group_components(cfg, components):
             c.value_sort = comp_match(c.value, c.ref_prefix, c.ref)
         else:
             c.value_sort = None
-        # Try to add the component to an existing group
-        found = False
-        for g in groups:
-            if g.match_component(c):
-                g.add_component(c)
-                found = True
-                break
-        if not found:
-            # Create a new group
-            g = ComponentGroup(cfg)
-            g.add_component(c)
-            groups.append(g)
+        index.add(c)
+    return index.groups
+
+
+def group_components(cfg, components):
+    groups = make_groups(cfg, components)
     # Now unify the data from the components of each group
     decimal_point = None
     if cfg.normalize_locale:
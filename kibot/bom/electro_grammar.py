@@ -3,10 +3,17 @@
 # Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
 # License: MIT
 # Project: KiBot (formerly KiPlot)
-
+"""
+Parser for the values of the components, uses the electro-grammar.
+Creating the parser and parsing is slow, so the results are cached in `~/.cache/kibot/electro_grammar.pickle`.
+The cache is discarded when KiBot, the grammar or this file changes, and is limited to CACHE_MAX_SIZE entries (the most
+recently used are kept).
+"""
+import atexit
 from decimal import Decimal
 from lark import Lark, Transformer
 import os
+import pickle
 from ..gs import GS
 from .. import log
 
@@ -25,6 +32,11 @@ TO_IMPERIAL = {'0402': '01005',
                '5025': '2010',
                '6332': '2512'}
 parser = None
+CACHE_VERSION = 1
+CACHE_MAX_SIZE = 20000
+# Results for the parsed texts, loaded on demand
+cache = None
+cache_modified = False
 
 
 class ComponentTransformer(Transformer):
@@ -192,30 +204,106 @@ class ComponentTransformer(Transformer):
         return None
 
 
+def get_grammar_name():
+    return os.path.join(GS.get_resource_path('parsers'), 'electro.lark')
+
+
 def initialize():
     global parser
     if parser is not None:
         return
-    with open(os.path.join(GS.get_resource_path('parsers'), 'electro.lark'), 'rt') as f:
+    with open(get_grammar_name(), 'rt') as f:
         g = f.read()
     parser = Lark(g, start='main')  # , debug=DEBUG)
 
 
-def parse(text, with_extra=False, stronger=False):
+def get_cache_name():
+    from ..kiplot import get_user_cache_dir
+    return os.path.join(get_user_cache_dir(), 'electro_grammar.pickle')
+
+
+def get_stamp(fname):
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_cache_key():
+    # The grammar and the transformer
+    return (CACHE_VERSION, GS.kibot_version, get_stamp(get_grammar_name()), get_stamp(__file__))
+
+
+def load_cache():
+    global cache
+    cache = {}
+    try:
+        with open(get_cache_name(), 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        data = None
+    except Exception as e:
+        # Any problem unpickling means we just parse again
+        logger.debug('Discarding the electro-grammar cache: '+str(e))
+        data = None
+    if isinstance(data, dict) and data.get('key') == get_cache_key():
+        cache = data['values']
+        logger.debug('Loaded {} values from the electro-grammar cache'.format(len(cache)))
+    atexit.register(save_cache)
+
+
+def save_cache():
+    if not cache_modified:
+        return
+    values = cache
+    if len(values) > CACHE_MAX_SIZE:
+        # Keep the most recently used
+        values = dict(list(values.items())[-CACHE_MAX_SIZE:])
+    cache_name = get_cache_name()
+    tmp_name = cache_name+'.{}.tmp'.format(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+        with open(tmp_name, 'wb') as f:
+            pickle.dump({'key': get_cache_key(), 'values': values}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, cache_name)
+    except (OSError, pickle.PicklingError) as e:
+        # Not fatal, just slower
+        logger.debug('Failed to save the electro-grammar cache: '+str(e))
+        if os.path.isfile(tmp_name):
+            os.remove(tmp_name)
+
+
+def do_parse(text):
+    """ Returns the parsed values and the extra information """
     initialize()
-    if stronger:
-        text = text.replace('+/-', ' +/-')
-        text = text.replace(' - ', ' ')
     try:
         tree = parser.parse(text)
     except Exception as e:
         logger.debugl(2, str(e))
-        return {}
+        return {}, {}
     logger.debugl(3, tree.pretty())
     res_o = ComponentTransformer()
     res = res_o.transform(tree)
     logger.debugl(3, res)
-    res = res_o.parsed
+    return res_o.parsed, res_o.extra
+
+
+def parse(text, with_extra=False, stronger=False):
+    global cache_modified
+    if stronger:
+        text = text.replace('+/-', ' +/-')
+        text = text.replace(' - ', ' ')
+    if cache is None:
+        load_cache()
+    res = cache.pop(text, None)
+    if res is None:
+        res = do_parse(text)
+        cache_modified = True
+    # Move it to the end, the most recently used
+    cache[text] = res
+    parsed, extra = res
+    res = dict(parsed)
     if with_extra:
-        res.update(res_o.extra)
+        res.update(extra)
     return res
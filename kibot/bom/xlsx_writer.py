@@ -94,6 +94,25 @@ def bg_color(col):
     return 2
 
 
+class HeadWriter(object):
+    """ Collects the cells for the page head (logo, title and info) and writes them sorted by row.
+        The info is written by columns, but the constant memory mode needs the rows written in order """
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.ops = []
+
+    def __getattr__(self, name):
+        def record(*args):
+            # insert_image uses an A1 style cell, we only use it for A1
+            self.ops.append((0 if isinstance(args[0], str) else args[0], name, args))
+        return record
+
+    def flush(self):
+        for _, name, args in sorted(self.ops, key=lambda op: op[0]):
+            getattr(self.worksheet, name)(*args)
+        self.ops = []
+
+
 def add_info(worksheet, column_widths, row, col_offset, formats, text, value):
     worksheet.write_string(row, col_offset, text, formats[0])
     if isinstance(value, (int, float)):
@@ -339,15 +358,14 @@ def adjust_widths(worksheet, column_widths, max_width, levels):
             worksheet.set_column(i, i, width, None, {'level': levels[i]})
 
 
-def adjust_heights(worksheet, rows, max_width, head_size):
-    for rn, r in enumerate(rows):
-        max_h = 1
-        for c in r:
-            if len(c) > max_width:
-                h = len(wrap(c, max_width))
-                max_h = max(h, max_h)
-        if max_h > 1:
-            worksheet.set_row(head_size+rn, 15.0*max_h)
+def adjust_height(worksheet, row, max_width, row_count):
+    max_h = 1
+    for c in row:
+        if len(c) > max_width:
+            h = len(wrap(c, max_width))
+            max_h = max(h, max_h)
+    if max_h > 1:
+        worksheet.set_row(row_count, 15.0*max_h)
 
 
 def write_info(cfg, r_info_start, worksheet, column_widths, col1, fmt_info, fmt_subtitle, compact=False):
@@ -730,7 +748,9 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
     link_mouser = cfg.xlsx.mouser_link
     hl_empty = cfg.xlsx.highlight_empty
 
-    workbook = Workbook(filename)
+    # Write the rows as soon as we have them. Not for KiCost, it doesn't write the cells in order
+    constant_memory = cfg.xlsx.constant_memory and not cfg.xlsx.kicost
+    workbook = Workbook(filename, {'constant_memory': constant_memory})
     ws_names = ['BoM', 'DNF']
     row_headings = head_names
 
@@ -771,17 +791,29 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
 
         worksheet = workbook.add_worksheet(ws_names[ws])
         row_count = head_size
+        column_widths = [0]*max(len(col_fields), 6)
+
+        # Page head
+        # The rows must be written in order, so we write it first
+        head = HeadWriter(worksheet)
+        # Logo
+        col1 = insert_logo(head, image_data, cfg.xlsx.logo_scale)
+        # Title
+        do_title(cfg, head, col1, len(column_widths)-1, fmt_title, fmt_info[0] if fmt_info else None)
+        # PCB & Stats Info
+        if not (cfg.xlsx.hide_pcb_info and cfg.xlsx.hide_stats_info):
+            write_info(cfg, r_info_start, head, column_widths, col1, fmt_info, fmt_subtitle)
+        head.flush()
 
         # Headings
         # Create the head titles
-        column_widths = [0]*max(len(col_fields), 6)
-        rows = [row_headings]
         for i in range(len(row_headings)):
             # Title for this column
-            column_widths[i] = len(row_headings[i]) + 10
+            column_widths[i] = max(len(row_headings[i]) + 10, column_widths[i])
             worksheet.write_string(row_count, i, row_headings[i], fmt_head)
             if cfg.column_comments[i]:
                 worksheet.write_comment(row_count, i, cfg.column_comments[i])
+        adjust_height(worksheet, row_headings, max_width, row_count)
 
         # Body
         row_count += 1
@@ -790,7 +822,7 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
                 continue
             # Get the data row
             row = group.get_row(col_fields)
-            rows.append(row)
+            adjust_height(worksheet, row, max_width, row_count)
             if link_datasheet != -1:
                 datasheet = group.get_field(ColumnList.COL_DATASHEET_L)
             # Fill the row
@@ -817,18 +849,8 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
                     column_widths[i] = len(cell) + 5
             row_count += 1
 
-        # Page head
-        # Logo
-        col1 = insert_logo(worksheet, image_data, cfg.xlsx.logo_scale)
-        # Title
-        do_title(cfg, worksheet, col1, len(column_widths)-1, fmt_title, fmt_info[0] if fmt_info else None)
-        # PCB & Stats Info
-        if not (cfg.xlsx.hide_pcb_info and cfg.xlsx.hide_stats_info):
-            write_info(cfg, r_info_start, worksheet, column_widths, col1, fmt_info, fmt_subtitle)
-
-        # Adjust cols and rows
+        # Adjust cols
         adjust_widths(worksheet, column_widths, max_width, cfg.column_levels)
-        adjust_heights(worksheet, rows, max_width, head_size)
 
         worksheet.freeze_panes(head_size+1, 0)
         worksheet.repeat_rows(head_size+1)
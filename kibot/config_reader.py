@@ -282,6 +282,7 @@ class CfgYamlReader(object):
                 update_dict(gb, self.imported_globals)
             logger.debug("Global options + imported: {}".format(gb))
         # Parse all keys inside it
+        GS.globals_tree = gb
         glb = GS.class_for_global_opts()
         glb.set_tree(gb)
         try:
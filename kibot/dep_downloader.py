@@ -874,6 +874,24 @@ def check_tool_dep(context, dep, fatal=False):
     return cmd
 
 
+def get_tools_versions(context):
+    """ Returns a dict with the versions of the tools used by `context`.
+        Only installed tools are reported, nothing is downloaded here """
+    global disable_auto_download
+    old_disable = disable_auto_download
+    disable_auto_download = True
+    versions = {}
+    try:
+        prefix = context+':'
+        for k, dep in used_deps.items():
+            if k.startswith(prefix):
+                cmd, ver = check_tool_python(dep) if dep.is_python else check_tool_binary(dep)
+                versions[dep.name] = ver if cmd is not None else None
+    finally:
+        disable_auto_download = old_disable
+    return versions
+
+
 # Avoid circular deps. Optionable can use it.
 GS.check_tool_dep = check_tool_dep
 GS.check_tool_dep_get_ver = check_tool_dep_get_ver
@@ -113,8 +113,15 @@ class MultiFilter(Registrable):
         self.comment = 'Multi-filter'
         self.filters = filters
         self._is_transform = is_transform
+        # Only logic filters used for logic: just a chain of tests
+        self._only_logic = not is_transform and not any(f._is_transform for f in filters)
 
     def filter(self, comp):
+        if self._only_logic:
+            for f in self.filters:
+                if not f.filter(comp):
+                    return False
+            return True
         comps = [comp]
         # We support logic and transform filters mixed
         # Apply all the filters
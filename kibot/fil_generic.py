@@ -4,6 +4,7 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 # Description: Implements the KiBoM and IBoM filters.
+from operator import attrgetter
 from re import compile, IGNORECASE
 from .optionable import Optionable
 from .bom.columnlist import ColumnList
@@ -120,114 +121,165 @@ class Generic(BaseFilter):  # noqa: F821
         # exclude_refs
         if isinstance(self.exclude_refs, type):
             self.exclude_refs = None
+        # Compiled on the first use, the LCSC field name needs the schematic
+        self._tests = None
 
-    def test_reg_include(self, c):
-        """ Reject components that doesn't match the provided regex.
-            So we include only the components that matches any of the regexs. """
-        if not self.include_only:  # Nothing to match against, means include all
-            return True
-        for reg in self.include_only:
-            reg.column = Optionable.solve_field_name(reg.column)
-            if reg.skip_if_no_field and not c.is_field(reg.column):
-                # Skip the check if the field doesn't exist
-                continue
-            if reg.match_if_field and c.is_field(reg.column):
-                return True
-            if reg.match_if_no_field and not c.is_field(reg.column):
-                return True
-            field_value = c.get_field_value(reg.column)
-            res = reg.regex.search(field_value)
-            if reg.invert:
-                res = not res
-            if res:
-                if GS.debug_level > 1:
-                    logger.debug("Including '{ref}': Field '{field}' ({value}) matched '{re}'".format(
-                                 ref=c.ref, field=reg.column, value=field_value, re=reg.regex))
-                # Found a match
-                return True
-        # Default, could not find a match
-        return False
-
-    def test_reg_exclude(self, c):
-        """ Test if this part should be included, based on any regex expressions provided in the preferences """
-        if not self.exclude_any:  # Nothing to match against, means don't exclude any
-            return False
-        for reg in self.exclude_any:
-            reg.column = Optionable.solve_field_name(reg.column)
-            if reg.skip_if_no_field and not c.is_field(reg.column):
-                # Skip the check if the field doesn't exist
+    @staticmethod
+    def _add_to(names, name):
+        """ Adds a name to the list of data used by the tests, returns its index """
+        try:
+            return names.index(name)
+        except ValueError:
+            names.append(name)
+            return len(names)-1
+
+    def _compile_regexs(self, regexs):
+        """ Returns a function that tells if any of the regexs matches.
+            The simple regexs applied to the same field are combined in just one regex """
+        simple = {}
+        matchers = []
+        for reg in regexs:
+            column = Optionable.solve_field_name(reg.column)
+            value = self._add_to(self._fields, column.lower())
+            if (not (reg.skip_if_no_field or reg.match_if_field or reg.match_if_no_field or reg.invert) and
+               reg.regex.groups == 0 and '(?' not in reg.regex.pattern):
+                simple.setdefault(value, []).append(reg.regex)
                 continue
-            if reg.match_if_field and c.is_field(reg.column):
-                return True
-            if reg.match_if_no_field and not c.is_field(reg.column):
-                return True
-            field_value = c.get_field_value(reg.column)
-            res = reg.regex.search(field_value)
-            if reg.invert:
-                res = not res
-            if res:
-                if GS.debug_level > 1:
-                    logger.debug("Excluding '{ref}': Field '{field}' ({value}) matched '{re}'".format(
-                                 ref=c.ref, field=reg.column, value=field_value, re=reg.regex))
-                # Found a match
-                return True
-        # Default, could not find any matches
-        return False
 
-    def filter(self, comp):
-        exclude = self.invert
-        value = comp.value.strip().lower()
+            def match(a, f, reg=reg, column=column, value=value, lower=column == column.lower()):
+                # Missing fields are stored as None, but is_field() is case sensitive
+                present = lower and f[value] is not None
+                if reg.skip_if_no_field and not present:
+                    # Skip the check if the field doesn't exist
+                    return None
+                if reg.match_if_field and present:
+                    return "field '{}' exists".format(column)
+                if reg.match_if_no_field and not present:
+                    return "field '{}' doesn't exist".format(column)
+                text = f[value] or ''
+                res = reg.regex.search(text)
+                if reg.invert:
+                    res = not res
+                return "field '{}' ({}) matched '{}'".format(column, text, reg.regex.pattern) if res else None
+            matchers.append(match)
+        for value, regs in simple.items():
+            regex = regs[0] if len(regs) == 1 else compile('|'.join('(?:'+r.pattern+')' for r in regs), flags=IGNORECASE)
+
+            def match(a, f, value=value, regex=regex):
+                text = f[value] or ''
+                if regex.search(text):
+                    return "field '{}' ({}) matched '{}'".format(self._fields[value], text, regex.pattern)
+                return None
+            matchers.append(match)
+
+        def any_match(a, f):
+            for match in matchers:
+                res = match(a, f)
+                if res is not None:
+                    return res
+            return None
+        return any_match
+
+    def _compile(self):
+        """ Creates the list of tests for the enabled options.
+            The data used by the tests is collected from the component: attributes and field values (None if the field
+            doesn't exist). Each test gets this data and returns why the component is excluded, or None.
+            The results are stored using this data, so we don't need to test the same data again (i.e. other outputs) """
+        self._attrs = []
+        self._fields = []
+        self._results = {}
+        tests = []
+
+        def attr(name):
+            return self._add_to(self._attrs, name)
         # Exclude components with empty 'Value'
-        if self.exclude_empty_val and (value == '' or value == '~'):
-            return exclude
+        if self.exclude_empty_val:
+            value = attr('value')
+            tests.append(lambda a, f: 'empty value' if a[value].strip() in ('', '~') else None)
         # Exclude all ref == #*
-        if self.exclude_all_hash_ref and comp.ref and comp.ref[0] == '#':
-            return exclude
+        if self.exclude_all_hash_ref:
+            ref = attr('ref')
+            tests.append(lambda a, f: 'reference starting with #' if a[ref] and a[ref][0] == '#' else None)
         # KiCad 5 PCB classification
-        if self.exclude_virtual and comp.virtual:
-            return exclude
-        if self.exclude_smd and comp.smd:
-            return exclude
-        if self.exclude_tht and comp.tht:
-            return exclude
-        if self.exclude_top and not comp.bottom:
-            return exclude
-        if self.exclude_bottom and comp.bottom:
-            return exclude
-        if self.exclude_not_in_bom and not (comp.in_bom and comp.in_bom_pcb):
-            return exclude
-        if self.exclude_not_on_board and not comp.on_board:
-            return exclude
+        for enabled, name, val, reason in ((self.exclude_virtual, 'virtual', True, 'virtual'),
+                                           (self.exclude_smd, 'smd', True, 'SMD'),
+                                           (self.exclude_tht, 'tht', True, 'THT'),
+                                           (self.exclude_top, 'bottom', False, 'on top'),
+                                           (self.exclude_bottom, 'bottom', True, 'on bottom'),
+                                           (self.exclude_not_on_board, 'on_board', False, 'excluded from board')):
+            if enabled:
+                tests.append(lambda a, f, index=attr(name), val=val, reason=reason: reason if bool(a[index]) == val else None)
+        if self.exclude_not_in_bom:
+            in_bom = attr('in_bom')
+            in_bom_pcb = attr('in_bom_pcb')
+            tests.append(lambda a, f: 'excluded from BoM' if not (a[in_bom] and a[in_bom_pcb]) else None)
         # List of references to be excluded
-        if self.exclude_refs and (comp.ref in self.exclude_refs or comp.ref_prefix+'*' in self.exclude_refs):
-            return exclude
+        if self.exclude_refs:
+            ref = attr('ref')
+            ref_prefix = attr('ref_prefix')
+            refs = set(self.exclude_refs)
+            tests.append(lambda a, f: 'excluded reference' if a[ref] in refs or a[ref_prefix]+'*' in refs else None)
         # All stuff where keys are involved
-        if self.keys:
+        keys = set(self.keys) if self.keys else None
+        if keys and self.exclude_value:
             # Exclude components if their 'Value' is any of the keys
-            if self.exclude_value and value in self.keys:
-                return exclude
+            value = attr('value')
+            tests.append(lambda a, f: 'value is a key' if a[value].strip().lower() in keys else None)
+        if keys and self.exclude_field:
             # Exclude components if a field is named as any of the keys
-            if self.exclude_field:
-                for k in self.keys:
-                    if k in comp.dfields:
-                        return exclude
+            fields = [self._add_to(self._fields, k) for k in keys]
+            tests.append(lambda a, f: 'field named as a key' if any(f[k] is not None for k in fields) else None)
+        if keys and self.exclude_config:
             # Exclude components containing a key value in the config field.
-            if self.exclude_config:
-                config = comp.get_field_value(self.config_field).strip().lower()
-                if self.config_separators:
+            config = self._add_to(self._fields, self.config_field)
+            separators = self.config_separators
+
+            def test_config(a, f):
+                value = (f[config] or '').strip().lower()
+                if separators:
                     # Try with all the separators
-                    for sep in self.config_separators:
-                        opts = config.split(sep)
+                    for sep in separators:
                         # Try with all the extracted values
-                        for opt in opts:
-                            if opt.strip() in self.keys:
-                                return exclude
-                else:  # No separator
-                    if config in self.keys:
-                        return exclude
+                        for opt in value.split(sep):
+                            if opt.strip() in keys:
+                                return "'{}' in the config field".format(opt.strip())
+                elif value in keys:  # No separator
+                    return "'{}' in the config field".format(value)
+                return None
+            tests.append(test_config)
         # Regular expressions
-        if not self.test_reg_include(comp):
-            return exclude
-        if self.test_reg_exclude(comp):
-            return exclude
-        return not exclude
+        if self.include_only:
+            # Include only the components that matches any of the regexs
+            include = self._compile_regexs(self.include_only)
+            tests.append(lambda a, f: "doesn't match `include_only`" if include(a, f) is None else None)
+        if self.exclude_any:
+            tests.append(self._compile_regexs(self.exclude_any))
+        # How to get the attributes as a tuple
+        if len(self._attrs) == 1:
+            get_attr = attrgetter(self._attrs[0])
+            self._get_attrs = lambda c: (get_attr(c),)
+        elif self._attrs:
+            self._get_attrs = attrgetter(*self._attrs)
+        else:
+            self._get_attrs = lambda c: ()
+        self._tests = tests
+
+    def filter(self, comp):
+        if self._tests is None:
+            self._compile()
+        dfields = comp.dfields
+        data = (self._get_attrs(comp), tuple([dfields[f].value if f in dfields else None for f in self._fields]))
+        try:
+            reason = self._results[data]
+        except KeyError:
+            reason = None
+            for test in self._tests:
+                reason = test(*data)
+                if reason is not None:
+                    break
+            self._results[data] = reason
+        if reason is None:
+            return not self.invert
+        if GS.debug_level > 1:
+            logger.debug("Filter `{}` excluding '{}': {}".format(self.name, comp.ref, reason))
+        return self.invert
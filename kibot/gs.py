@@ -70,9 +70,18 @@ class GS(object):
     # Main output dir
     out_dir = None
     out_dir_in_cmd_line = False
+    # Number of processes we can use (-j)
+    jobs = 1
     filter_file = None
     board = None
+    # Incremented each time the PCB is loaded or modified for good, used as part of the key for the PCBs with variants
+    board_loads = 0
+    # Incremented each time the PCB in memory changes, even temporarily (i.e. sub-PCBs).
+    # Used to invalidate data computed from the board
+    board_geometry = 0
     sch = None
+    # Incremented each time the schematic is loaded, used to invalidate data computed from the schematic
+    sch_loads = 0
     debug_enabled = False
     debug_level = 0
     kibot_version = None
@@ -126,6 +135,8 @@ class GS(object):
     def_global_output = '%f-%i%I%v.%x'
     # The class that controls the global options
     class_for_global_opts = None
+    # The `global` section, used to detect changes
+    globals_tree = None
     global_cache_3d_resistors = None
     global_castellated_pads = None
     global_colored_tht_resistors = None
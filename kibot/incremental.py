@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Incremental builds support.
+We keep a manifest in the output directory containing a fingerprint for each generated output.
+The fingerprint is computed using:
+- The content of the input files (PCB, schematic sheets and project)
+- The content of the 3D models and the variables used to find them (3D outputs)
+- The options for the output, the global options, filters, variants and preflights
+- The version of KiBot, KiCad and the tools used by the output
+- The fingerprint of the outputs used as inputs
+If the fingerprint didn't change and the targets are still there we can skip the output.
+"""
+from hashlib import sha256
+import json
+import os
+import re
+from .gs import GS
+from .kicad.config import KiConf
+from .registrable import RegOutput
+from .optionable import BaseOptions
+from .pre_base import BasePreFlight
+from .dep_downloader import get_tools_versions
+from . import log
+
+logger = log.get_logger()
+MANIFEST = '.kibot_manifest.json'
+MANIFEST_VERSION = 1
+# KiCad variables used to locate the 3D models
+VARS_3D = re.compile(r'KICAD\d*_3DMODEL_DIR|KISYS3DMOD')
+# Enabled from the command line
+enabled = False
+# Loaded manifest (name -> fingerprint)
+manifest = None
+# Entries changed during this run
+updated = {}
+# Caches for this run
+files_hashes = {}
+fingerprints = {}
+
+
+def get_manifest_name():
+    return os.path.join(GS.out_dir, MANIFEST)
+
+
+def load():
+    global manifest
+    manifest = {}
+    fname = get_manifest_name()
+    if not os.path.isfile(fname):
+        return
+    try:
+        with open(fname, 'rt') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.debug('Discarding manifest `{}`: {}'.format(fname, e))
+        return
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        logger.debug('Discarding manifest `{}`: wrong version'.format(fname))
+        return
+    manifest = data.get('outputs', {})
+
+
+def save():
+    if not enabled or not updated:
+        return
+    if manifest is None:
+        load()
+    for name, fp in updated.items():
+        if fp is None:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = fp
+    updated.clear()
+    fname = get_manifest_name()
+    logger.debug('Saving manifest `{}`'.format(fname))
+    os.makedirs(GS.out_dir, exist_ok=True)
+    tmp_name = fname+'.tmp'
+    with open(tmp_name, 'wt') as f:
+        json.dump({'version': MANIFEST_VERSION, 'outputs': manifest}, f, indent=2, sort_keys=True)
+    os.replace(tmp_name, fname)
+
+
+def hash_file(fname):
+    """ SHA256 for the content of a file, None if the file isn't there """
+    h = files_hashes.get(fname)
+    if h is None and fname and os.path.isfile(fname):
+        h = sha256()
+        with open(fname, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                h.update(chunk)
+        h = files_hashes[fname] = h.hexdigest()
+    return h
+
+
+def get_input_files(out):
+    files = set(out.get_dependencies())
+    # PCB outputs using variants/filters read the schematic, and the schematic components get data from the PCB
+    uses_comps = isinstance(out.options, BaseOptions) and out.options.uses_sch_components()
+    if (out.is_sch() or uses_comps) and GS.sch_file:
+        GS.load_sch()
+        files.update(GS.sch.get_files())
+    if (out.is_pcb() or uses_comps) and GS.pcb_file:
+        files.add(GS.pcb_file)
+    if GS.pro_file:
+        files.add(GS.pro_file)
+    files.discard(None)
+    return {os.path.abspath(f) for f in files}
+
+
+def hash_input_files(out):
+    """ Hashes for the input files, using relative names so we get the same result for another checkout """
+    files = sorted(get_input_files(out))
+    if not files:
+        return {}
+    base = os.path.dirname(os.path.commonpath(files)) if len(files) == 1 else os.path.commonpath(files)
+    return {os.path.relpath(f, base): hash_file(f) for f in files}
+
+
+def hash_3d_models(models):
+    """ Hashes for the 3D models, the ones inside the project use relative names """
+    res = {}
+    for f in models:
+        name = os.path.relpath(f, GS.pcb_dir) if GS.pcb_dir and f.startswith(GS.pcb_dir+os.path.sep) else f
+        res[name] = hash_file(f)
+    return res
+
+
+def get_3d_vars():
+    """ Values for the variables used to locate the 3D models, using the same priority used to expand them """
+    sources = [GS.load_pro_variables(), KiConf.kicad_env]
+    if GS.global_use_os_env_for_expand:
+        sources.insert(0, os.environ)
+    res = {}
+    for vars in sources:
+        res.update({k: v for k, v in vars.items() if VARS_3D.fullmatch(k)})
+    return res
+
+
+def get_fingerprint(out):
+    """ Computes a hash that changes if something that can affect the output changes """
+    fp = fingerprints.get(out.name)
+    if fp is not None:
+        return fp
+    # Avoid infinite recursion for circular references
+    fingerprints[out.name] = ''
+    deps = {}
+    for name in out.get_output_dependencies():
+        dep = RegOutput.get_output(name)
+        if dep is not None and dep is not out:
+            deps[name] = get_fingerprint(dep)
+    data = {'kibot': GS.kibot_version,
+            'kicad': GS.kicad_version,
+            'name': out.name,
+            'type': out.type,
+            'dir': out.dir,
+            'options': out._tree,
+            'globals': GS.globals_tree,
+            'cli_globals': GS.cli_global_defs,
+            'variants': {k: v._tree for k, v in RegOutput.get_variants().items()},
+            'filters': {k: v._tree for k, v in RegOutput.get_filters().items()},
+            'preflights': {p._name: p._value for p in BasePreFlight.get_in_use_objs() if p._enabled},
+            'tools': get_tools_versions(out.type),
+            'files': hash_input_files(out),
+            'outputs': deps}
+    models = out.options.get_3d_models() if isinstance(out.options, BaseOptions) else []
+    if models:
+        data['3d_models'] = hash_3d_models(models)
+        data['3d_vars'] = get_3d_vars()
+    fp = sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    logger.debugl(2, 'Fingerprint for `{}`: {}'.format(out.name, fp))
+    fingerprints[out.name] = fp
+    return fp
+
+
+def is_up_to_date(out, targets):
+    """ True if the output was generated using the same inputs and all the targets are there """
+    if manifest is None:
+        load()
+    old_fp = manifest.get(out.name)
+    if old_fp is None or not targets:
+        return False
+    missing = next((t for t in targets if not os.path.exists(t)), None)
+    if missing:
+        logger.debug('Output `{}` must be generated, missing `{}`'.format(out.name, missing))
+        return False
+    return old_fp == get_fingerprint(out)
+
+
+def start(out):
+    """ Invalidate the entry, in case we fail.
+        Also compute the fingerprint before running, the output could alter the inputs """
+    updated[out.name] = None
+    get_fingerprint(out)
+
+
+def done(out):
+    """ Memorize the fingerprint for a successfully generated output """
+    updated[out.name] = get_fingerprint(out)
+
+
+def merge(entries):
+    """ Add the entries computed by another process """
+    updated.update(entries)
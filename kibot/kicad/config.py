@@ -10,12 +10,16 @@ In particular:
 - kicad_common to know about the 'environment' variables
 - The `sym-lib-table` files to map library aliases
 
+The resolved library tables are cached in `~/.cache/kibot/lib_tables/`. The entry is valid if the tables, the
+environment variables and the system libraries dir (used when we don't have a global table) didn't change.
+
 Notes about coverage:
 I'm excluding all the Darwin and Windows code from coverage.
 I'm not even sure the values are correct.
 """
 import csv
 from glob import glob
+from hashlib import sha256
 from io import StringIO
 import json
 import os
@@ -45,6 +49,7 @@ FP_LIB_TABLE = 'fp-lib-table'
 KICAD_COMMON = 'kicad_common'
 MAXDEPTH = 20
 SUP_VERSION = 7
+LIB_TABLES_CACHE_VERSION = 1
 reported = set()
 
 
@@ -80,6 +85,15 @@ def parse_len_str(val):
     return value
 
 
+def hash_lib_table(fname):
+    """ SHA256 for the content of a lib table, None if the file isn't there """
+    try:
+        with open(fname, 'rb') as f:
+            return sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
 def expand_env(val, env, extra_env, used_extra=None):
     """ Expand KiCad environment variables """
     if used_extra is None:
@@ -498,11 +512,9 @@ class KiConf(object):
                 logger.warning(W_LIBTUNK+"Unknown lib table entry `{}`".format(e_type))
         return True
 
-    def load_all_lib_aliases(table_name, sys_dir, pattern):
-        # Load the default symbol libs table.
-        # This is the list of libraries enabled by the user.
-        loaded = False
-        lib_aliases = {}
+    def get_lib_tables(table_name):
+        """ The global tables we try, in order, and the project table """
+        tables = []
         if KiConf.config_dir:
             conf_dir = KiConf.config_dir
             if 'KICAD_CONFIG_HOME' in KiConf.kicad_env:
@@ -510,9 +522,20 @@ class KiConf(object):
                 # https://forum.kicad.info/t/kicad-config-home-inconsistencies-and-detail/26875
                 conf_dir = KiConf.kicad_env['KICAD_CONFIG_HOME']
                 logger.debug('Redirecting symbols lib table to '+conf_dir)
-            loaded = KiConf.load_lib_aliases(os.path.join(conf_dir, table_name), lib_aliases)
-        if not loaded and 'KICAD_TEMPLATE_DIR' in KiConf.kicad_env:
-            loaded = KiConf.load_lib_aliases(os.path.join(KiConf.kicad_env['KICAD_TEMPLATE_DIR'], table_name), lib_aliases)
+            tables.append(os.path.join(conf_dir, table_name))
+        if 'KICAD_TEMPLATE_DIR' in KiConf.kicad_env:
+            tables.append(os.path.join(KiConf.kicad_env['KICAD_TEMPLATE_DIR'], table_name))
+        return tables, os.path.join(KiConf.dirname, table_name)
+
+    def load_all_lib_aliases(tables, project_table, sys_dir, pattern):
+        # Load the default symbol libs table.
+        # This is the list of libraries enabled by the user.
+        loaded = False
+        lib_aliases = {}
+        for table in tables:
+            loaded = KiConf.load_lib_aliases(table, lib_aliases)
+            if loaded:
+                break
         if not loaded:
             logger.warning(W_NODEFSYMLIB + 'Missing default symbol library table')
             # No default symbol libs table, try to create one
@@ -525,7 +548,67 @@ class KiConf(object):
                         logger.debug('Detected lib alias '+str(alias))
                     lib_aliases[alias.name] = alias
         # Load the project's table
-        KiConf.load_lib_aliases(os.path.join(KiConf.dirname, table_name), lib_aliases)
+        KiConf.load_lib_aliases(project_table, lib_aliases)
+        return lib_aliases
+
+    def get_lib_tables_cache_name(table_name):
+        from ..kiplot import get_user_cache_dir
+        key = sha256(json.dumps([os.path.abspath(KiConf.dirname), table_name]).encode()).hexdigest()
+        return os.path.join(get_user_cache_dir(), 'lib_tables', key+'.json')
+
+    def get_lib_tables_key(tables, sys_dir, pattern):
+        tables = [os.path.abspath(t) for t in tables]
+        try:
+            # Adding or removing libraries changes it, only used when we don't have a global table
+            sys_dir_mtime = os.path.getmtime(sys_dir) if sys_dir else None
+        except OSError:
+            sys_dir_mtime = None
+        data = {'version': LIB_TABLES_CACHE_VERSION,
+                'kibot': GS.kibot_version,
+                'ki6': GS.ki6,
+                'tables': [(t, hash_lib_table(t)) for t in tables],
+                'env': KiConf.kicad_env,
+                'os_env': dict(os.environ) if GS.global_use_os_env_for_expand else None,
+                'sys_dir': (sys_dir, sys_dir_mtime, pattern)}
+        return sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load_cached_lib_aliases(table_name, sys_dir, pattern):
+        """ Same as load_all_lib_aliases, but using the cache """
+        tables, project_table = KiConf.get_lib_tables(table_name)
+        cache_name = KiConf.get_lib_tables_cache_name(table_name)
+        key = KiConf.get_lib_tables_key(tables+[project_table], sys_dir, pattern)
+        try:
+            with open(cache_name, 'rt') as f:
+                data = json.load(f)
+            if data.get('key') == key:
+                logger.debug('Using cached `{}` aliases'.format(table_name))
+                for msg in data['warnings']:
+                    logger.warning(msg)
+                lib_aliases = {}
+                for name, attrs in data['aliases'].items():
+                    alias = lib_aliases[name] = LibAlias()
+                    alias.__dict__.update(attrs)
+                return lib_aliases
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            pass
+        collector = log.start_collecting()
+        try:
+            lib_aliases = KiConf.load_all_lib_aliases(tables, project_table, sys_dir, pattern)
+        finally:
+            warnings = log.stop_collecting(collector)
+        if collector.errors:
+            # Don't hide the errors in the next runs
+            return lib_aliases
+        tmp_name = cache_name+'.{}.tmp'.format(os.getpid())
+        try:
+            os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+            with open(tmp_name, 'wt') as f:
+                json.dump({'key': key, 'warnings': warnings, 'aliases': {k: v.__dict__ for k, v in lib_aliases.items()}},
+                          f, indent=1)
+            os.replace(tmp_name, cache_name)
+        except (OSError, TypeError, ValueError) as e:
+            # Not fatal, just slower
+            logger.debug('Failed to cache the `{}` aliases: {}'.format(table_name, e))
         return lib_aliases
 
     def get_sym_lib_aliases(fname=None):
@@ -534,7 +617,7 @@ class KiConf(object):
                 fname = GS.sch_file
             KiConf.init(fname)
             pattern = '*.kicad_sym' if GS.ki6 else '*.lib'
-            KiConf.lib_aliases = KiConf.load_all_lib_aliases(SYM_LIB_TABLE, KiConf.sym_lib_dir, pattern)
+            KiConf.lib_aliases = KiConf.load_cached_lib_aliases(SYM_LIB_TABLE, KiConf.sym_lib_dir, pattern)
         return KiConf.lib_aliases
 
     def get_fp_lib_aliases(fname=None):
@@ -542,9 +625,22 @@ class KiConf(object):
             if fname is None:
                 fname = GS.pcb_file
             KiConf.init(fname)
-            KiConf.fp_aliases = KiConf.load_all_lib_aliases(FP_LIB_TABLE, KiConf.footprint_dir, '*.pretty')
+            KiConf.fp_aliases = KiConf.load_cached_lib_aliases(FP_LIB_TABLE, KiConf.footprint_dir, '*.pretty')
         return KiConf.fp_aliases
 
+    def get_lib_alias(kind, name, fname=None):
+        """ Resolves a library nickname.
+            kind is 'sym', 'fp' or '3d'.
+            Returns a LibAlias for 'sym' and 'fp', the path for '3d'. None if unknown. """
+        if kind == 'sym':
+            return KiConf.get_sym_lib_aliases(fname).get(name)
+        if kind == 'fp':
+            return KiConf.get_fp_lib_aliases(fname).get(name)
+        if kind == '3d':
+            KiConf.init(fname or GS.pcb_file or GS.sch_file)
+            return KiConf.aliases_3D.get(name)
+        raise AssertionError('Unknown library kind `{}`'.format(kind))
+
     def load_3d_aliases():
         if not KiConf.config_dir:
             return
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Index for the KiCad 5 libraries (.lib and .dcm).
+The KiCad 5 libraries are big and a schematic uses just a few of their components, so we store where each
+component is located (byte offsets) and then read only the needed entries.
+The index is stored in `~/.cache/kibot/lib_index/` and is valid while the modification time and size of the library
+are the same.
+The scan function returns None when the file has something the index can't handle, in this case the library is
+fully parsed, so we get the same errors and warnings.
+"""
+from hashlib import sha256
+import json
+import os
+from ..gs import GS
+from .. import log
+
+logger = log.get_logger()
+INDEX_VERSION = 1
+# Indexes already used in this run
+_indexes = {}
+
+
+def get_index_name(fname):
+    from ..kiplot import get_user_cache_dir
+    return os.path.join(get_user_cache_dir(), 'lib_index', sha256(fname.encode()).hexdigest()+'.json')
+
+
+def load_index(fname, stamp):
+    try:
+        with open(get_index_name(fname), 'rt') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    if (not isinstance(data, dict) or data.get('version') != INDEX_VERSION or data.get('kibot') != GS.kibot_version or
+       data.get('file') != fname or data.get('stamp') != stamp):
+        return False, None
+    return True, data.get('entries')
+
+
+def save_index(fname, stamp, entries):
+    name = get_index_name(fname)
+    try:
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        tmp_name = name+'.{}.tmp'.format(os.getpid())
+        with open(tmp_name, 'wt') as f:
+            json.dump({'version': INDEX_VERSION, 'kibot': GS.kibot_version, 'file': fname, 'stamp': stamp,
+                       'entries': entries}, f)
+        os.replace(tmp_name, name)
+    except (OSError, TypeError, ValueError) as e:
+        # Not fatal, just slower
+        logger.debug('Failed to save the index for `{}`: {}'.format(fname, e))
+
+
+def get_index(fname, scan):
+    """ Returns the entries for the library, None if the library must be fully parsed.
+        `scan` is used to create the index, gets the file opened in binary mode """
+    fname = os.path.abspath(fname)
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    stamp = [st.st_mtime_ns, st.st_size]
+    cached = _indexes.get(fname)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    found, entries = load_index(fname, stamp)
+    if found:
+        logger.debug('Using the index for `{}`'.format(fname))
+    else:
+        logger.debug('Creating the index for `{}`'.format(fname))
+        try:
+            with open(fname, 'rb') as f:
+                entries = scan(f)
+        except OSError:
+            return None
+        save_index(fname, stamp, entries)
+    _indexes[fname] = (stamp, entries)
+    return entries
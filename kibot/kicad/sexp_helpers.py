@@ -8,6 +8,8 @@ from .sexpdata import Symbol
 
 
 class Point(object):
+    __slots__ = ('x', 'y')
+
     def __init__(self, items):
         super().__init__()
         self.x = _check_float(items, 1, 'x coord')
@@ -45,6 +45,10 @@ See the source code for more information.
 # Copyright (c) 2022 Instituto Nacional de Tecnología Industrial
 # - Adapted to KiCad
 # - Added sexp_iter
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# - Added FastParser
+# - Added StreamDumper
 
 # Redistribution and use in source and binary forms, with or without
 # modification, are permitted provided that the following conditions are
@@ -86,6 +90,8 @@ from string import whitespace
 import functools
 
 BRACKETS = {'(': ')', '[': ']'}
+# Use FastParser, the original Parser is kept for validation
+use_fast_parser = True
 
 
 # ** Generic errors
@@ -331,6 +337,79 @@ def dumps(obj, **kwds):
     return tosexp(obj, **kwds)
 
 
+class StreamDumper(object):
+    """
+    Writes a list as an S-expression, one element at a time.
+    The result is the same we get from `dump`, but we don't need the whole list in memory and we don't create its
+    string. Supports `append`, `extend` and `pop` (only for the last appended element).
+    Use `close` to finish the list.
+
+    >>> import io
+    >>> fp = io.StringIO()
+    >>> d = StreamDumper(fp)
+    >>> d.extend([Symbol('a'), Sep(), [Symbol('b'), 1]])
+    >>> d.close()
+    >>> fp.getvalue() == dumps([Symbol('a'), Sep(), [Symbol('b'), 1]])
+    True
+
+    """
+    def __init__(self, filelike, **kwds):
+        self.write = filelike.write
+        self.kwds = kwds
+        # Last element, not yet written, so we can pop it
+        self.last = self.empty = object()
+        # Trailing spaces not yet written, they are removed before a new line
+        self.spaces = ''
+        self.last_chr = '('
+        self.first = True
+        self.write('(')
+
+    def _dump(self, obj):
+        # Children of the first level are indented using 1 space
+        v = tosexp(obj, indent=1, **self.kwds)
+        if self.first:
+            self.first = False
+        else:
+            self.spaces += ' '
+        if v[0] == '\n':
+            # Avoid spaces at the end of lines
+            self.spaces = ''
+        stripped = v.rstrip(' ')
+        if stripped:
+            self.write(self.spaces+stripped)
+            self.last_chr = stripped[-1]
+            self.spaces = v[len(stripped):]
+        else:
+            self.spaces += v
+
+    def append(self, obj):
+        if self.last is not self.empty:
+            self._dump(self.last)
+        self.last = obj
+
+    def extend(self, objs):
+        for obj in objs:
+            self.append(obj)
+
+    def pop(self):
+        obj = self.last
+        if obj is self.empty:
+            raise IndexError('pop from empty StreamDumper')
+        self.last = self.empty
+        return obj
+
+    def close(self):
+        if self.last is not self.empty:
+            self._dump(self.last)
+            self.last = self.empty
+        # Same as `tosexp`: the closing bracket goes one space to the left
+        if len(self.spaces) > 1:
+            self.spaces = self.spaces[:-1]
+        elif self.spaces == ' ' and self.last_chr == '\n':
+            self.spaces = ''
+        self.write(self.spaces+')')
+
+
 def car(obj):
     """
     Alias of ``obj[0]``.
@@ -697,6 +776,136 @@ class Parser(object):
         return sexp
 
 
+class FastParser(Parser):
+    """
+    Same results as Parser, but:
+    - Uses one regex to split the tokens
+    - Iterative, so deeply nested expressions doesn't hit the recursion limit
+    - Atoms are converted only once, so equal symbols share the same object
+    - Atoms starting with a letter aren't tried as numbers
+    Errors are reported using Parser, so we get the same exceptions.
+    """
+    _scanners = {}
+    _escape_re = re.compile(r'\\.', re.DOTALL)
+    # Letters that can't start a number (int/float also accept inf, infinity and nan)
+    _not_number = set('abcdefghjklmopqrstuvwxyzABCDEFGHJKLMOPQRSTUVWXYZ')
+
+    def __init__(self, string, **kwds):
+        super(FastParser, self).__init__(string, **kwds)
+        self.scanner = self.get_scanner(self.line_comment)
+
+    @classmethod
+    def get_scanner(cls, line_comment):
+        scanner = cls._scanners.get(line_comment)
+        if scanner is None:
+            # The groups are: brackets, string, atom and anything else (quote or error).
+            # Whitespace is skipped and comments don't fill any group.
+            ws = re.escape(whitespace)
+            lc = re.escape(line_comment) if line_comment else ''
+            atom_chr = r'[^{ws}()\[\]"\'\\{lc}]'.format(ws=ws, lc=lc)
+            regex = (r'[{ws}]*(?:([()\[\]])'
+                     r'|("[^"\\]*(?:\\.[^"\\]*)*")'
+                     r'|((?:{atom_chr}|\\.){atom_chr}*(?:\\.{atom_chr}*)*)'.format(ws=ws, atom_chr=atom_chr))
+            if lc:
+                regex += r'|{}[^\n]*'.format(lc)
+            regex += r'|([^{ws}]))'.format(ws=ws)
+            scanner = cls._scanners[line_comment] = re.compile(regex, re.DOTALL)
+        return scanner
+
+    def parse(self):
+        try:
+            return self._parse()
+        except SExpData:
+            # Use the original parser to get a detailed error
+            return Parser.parse(self)
+
+    def _parse(self):
+        string_to = self.string_to
+        escape_sub = self._escape_re.sub
+        not_number = self._not_number
+        nil = self.nil
+        true = self.true
+        false = self.false
+        atoms = {}
+        # Repeated strings (field names, footprints, etc.) are shared
+        strings = {}
+        # Each level is: list, expected closing bracket, pending quotes
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        sexp = []
+        close = None
+        quotes = 0
+        for br, st, token, other in self.scanner.findall(self.string):
+            if token:
+                try:
+                    val = atoms[token]
+                except KeyError:
+                    atom = escape_sub(lambda e: Symbol.unquote(e.group()), token) if '\\' in token else token
+                    if atom == nil:
+                        # Mutable, can't be shared
+                        val = []
+                    else:
+                        if atom == true:
+                            val = True
+                        elif atom == false:
+                            val = False
+                        elif atom[0] in not_number:
+                            val = Symbol(atom)
+                        else:
+                            try:
+                                val = int(atom)
+                            except ValueError:
+                                try:
+                                    val = float(atom)
+                                except ValueError:
+                                    val = Symbol(atom)
+                        atoms[token] = val
+            elif br:
+                if br == '(':
+                    push((sexp, close, quotes))
+                    sexp = []
+                    close = ')'
+                    quotes = 0
+                    continue
+                if br == '[':
+                    push((sexp, close, quotes))
+                    sexp = []
+                    close = ']'
+                    quotes = 0
+                    continue
+                if br != close or quotes:
+                    raise SExpData('Wrong closing bracket')
+                val = sexp if close == ')' else Bracket(sexp, '[')
+                sexp, close, quotes = pop()
+            elif st:
+                try:
+                    val = strings[st]
+                except KeyError:
+                    val = st[1:-1]
+                    if '\\' in val:
+                        val = escape_sub(lambda e: String.unquote(e.group()), val)
+                    val = string_to(val)
+                    if val.__class__ is str:
+                        # Immutable, can be shared
+                        strings[st] = val
+            elif other:
+                if other != "'":
+                    raise SExpData('Unexpected character')
+                quotes += 1
+                continue
+            else:
+                # Comment
+                continue
+            while quotes:
+                val = Quoted(val)
+                quotes -= 1
+            sexp.append(val)
+        if close is not None or quotes:
+            raise SExpData('Missing closing bracket')
+        return sexp
+
+
 def parse(string, **kwds):
     r"""
     Parse s-expression.
@@ -711,7 +920,7 @@ def parse(string, **kwds):
     [[Symbol('a'), Quoted([Symbol('b')])]]
 
     """
-    return Parser(string, **kwds).parse()
+    return (FastParser if use_fast_parser else Parser)(string, **kwds).parse()
 
 
 def sexp_iter(vect, path):
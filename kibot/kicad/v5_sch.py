@@ -9,6 +9,7 @@ A basic implementation of the .sch file format.
 Currently oriented to collect the components for the BoM.
 """
 # Encapsulate file/line
+import io
 import re
 import os
 from xml.etree.ElementTree import Element, SubElement, tostring
@@ -18,6 +19,7 @@ from copy import deepcopy
 from collections import OrderedDict
 from .config import KiConf, un_quote
 from .error import SchError, SchFileError, SchLibError
+from .lib_index import get_index
 from ..gs import GS
 from ..misc import (W_BADPOLI, W_POLICOORDS, W_BADSQUARE, W_BADCIRCLE, W_BADARC, W_BADTEXT, W_BADPIN, W_BADCOMP, W_BADDRAW,
                     W_UNKDCM, W_UNKAR, W_ARNOPATH, W_ARNOREF, W_MISCFLD, W_EXTRASPC, W_NOLIB, W_INCPOS, W_NOANNO, W_MISSLIB,
@@ -128,6 +130,9 @@ class LibComponentField(object):
                           r'([LRCBT]\s*[IN]\s*[BN])\s*'  # 8 VJustify+Italic+Bold
                           r'("(?:[^\\]|(?:\\.))*")?')    # 9 Name for user fields
 
+    __slots__ = ('number', 'value', 'x', 'y', 'size', 'horizontal', 'visible', 'hjustify', 'vjustify', 'italic', 'bold',
+                 'name')
+
     def __init__(self):
         super().__init__()
 
@@ -184,6 +189,8 @@ class DrawPoligon(object):
                         r'((?:-?\d+\s+)+)'  # 4 The points
                         r'([NFf])')         # 5 Normal, Filled
 
+    __slots__ = ('points', 'sub_part', 'convert', 'thickness', 'fill', 'coords')
+
     def __init__(self):
         super().__init__()
 
@@ -239,6 +246,8 @@ class DrawRectangle(object):
                         r'(\d+)\s+'     # 6 Thickness
                         r'([NFf])')     # 7 Normal, Filled
 
+    __slots__ = ('start_x', 'start_y', 'end_x', 'end_y', 'sub_part', 'convert', 'thickness', 'fill')
+
     def __init__(self):
         super().__init__()
 
@@ -282,6 +291,8 @@ class DrawCircle(object):
                         r'(\d+)\s+'     # 5 Thickness
                         r'([NFf])')     # 6 Normal, Filled
 
+    __slots__ = ('pos_x', 'pos_y', 'radius', 'sub_part', 'convert', 'thickness', 'fill')
+
     def __init__(self):
         super().__init__()
 
@@ -330,6 +341,9 @@ class DrawArc(object):
                         r'(-?\d+)\s+'   # 11 End Pos X
                         r'(-?\d+)')     # 12 End Pos Y
 
+    __slots__ = ('pos_x', 'pos_y', 'radius', 'start', 'end', 'sub_part', 'convert', 'thickness', 'fill', 'start_x', 'start_y',
+                 'end_x', 'end_y')
+
     def __init__(self):
         super().__init__()
 
@@ -385,6 +399,9 @@ class DrawText(object):
                         r'([CLR])\s+'                # 10 HJustify
                         r'([CBT])')                  # 11 VJustify
 
+    __slots__ = ('orientation', 'pos_x', 'pos_y', 'size', 'type', 'sub_part', 'convert', 'text', 'italic', 'bold', 'hjustify',
+                 'vjustify')
+
     def __init__(self):
         super().__init__()
 
@@ -436,6 +453,9 @@ class Pin(object):
     type2name = {'I': 'input', 'O': 'output', 'B': 'BiDi', 'T': '3state', 'P': 'passive', 'U': 'unspc',
                  'W': 'power_in', 'w': 'power_out', 'C': 'openCol', 'E': 'openEm', 'N': 'NotConnected'}
 
+    __slots__ = ('name', 'number', 'pos_x', 'pos_y', 'len', 'dir', 'size_name', 'size_num', 'sub_part', 'convert', 'type',
+                 'gtype')
+
     def __init__(self):
         super().__init__()
 
@@ -643,6 +663,13 @@ class SymLib(object):
         self.comps = OrderedDict()
         self.alias = {}
 
+    @staticmethod
+    def _is_needed(id, lib, needed, translate):
+        if lib is None:
+            # From a cache
+            return id in translate
+        return lib+':'+id in needed or 'None:'+id in needed
+
     @staticmethod
     def _check_add(o, id, lib, needed, translate):
         if lib is None:
@@ -662,9 +689,93 @@ class SymLib(object):
                 return True
         return False
 
+    def _add(self, o, lib_alias, needed, translate):
+        # Only add components we need
+        if self._check_add(o, o.name, lib_alias, needed, translate):
+            self.comps[o.name] = o
+        if o.alias and lib_alias is not None:
+            for a in o.alias:
+                if self._check_add(o, a, lib_alias, needed, translate):
+                    self.alias[a] = o
+
+    @staticmethod
+    def scan(fh):
+        """ Creates the index for the library: [name, aliases, start, end, line] for each component.
+            Returns None if the file needs a full parse, i.e. has errors """
+        entries = []
+        pos = line_n = 0
+        signature = False
+        state = entry = None
+        for line in fh:
+            start = pos
+            pos += len(line)
+            line_n += 1
+            line = line.rstrip()
+            if line.startswith(b'#End Library') or line.startswith(b'# End Library'):
+                return entries if signature and state is None else None
+            if line.startswith(b'#'):
+                continue
+            if not signature:
+                if not line.startswith(b'EESchema-LIBRARY'):
+                    return None
+                signature = True
+            elif state is None:
+                if not line.startswith(b'DEF'):
+                    return None
+                try:
+                    m = LibComponent.def_re.match(line.decode())
+                except UnicodeDecodeError:
+                    return None
+                if not m:
+                    return None
+                name = m.group(1)
+                entry = [name[1:] if name[0] == '~' else name, None, start, None, line_n]
+                state = 'def'
+            elif state == 'def':
+                if line.startswith(b'ENDDEF'):
+                    entry[3] = pos
+                    entries.append(entry)
+                    state = None
+                elif line.startswith(b'ALIAS'):
+                    try:
+                        entry[1] = _split_space(line[6:].decode())
+                    except UnicodeDecodeError:
+                        return None
+                elif line.startswith(b'$FPLIST'):
+                    state = 'fplist'
+                elif line.startswith(b'DRAW'):
+                    state = 'draw'
+            elif state == 'fplist':
+                if line.startswith(b'$ENDFPLIST'):
+                    state = 'def'
+            elif line.startswith(b'ENDDRAW'):
+                state = 'def'
+            elif not line:
+                return None
+        # Missing end of library comment
+        return None
+
     def load(self, file, lib_alias, needed):
         """ Populates the class, file must exist """
         logger.debug('Loading library `{}`'.format(file))
+        translate = {k.replace(':', '_'): k for k, v in needed.items() if v is None} if lib_alias is None else None
+        index = get_index(file, self.scan)
+        if index is None:
+            self.load_all(file, lib_alias, needed, translate)
+            return
+        with open(file, 'rb') as fh:
+            for name, alias, start, end, line in index:
+                if not (self._is_needed(name, lib_alias, needed, translate) or
+                        (alias and lib_alias is not None and
+                         any(self._is_needed(a, lib_alias, needed, translate) for a in alias))):
+                    continue
+                fh.seek(start)
+                f = LibLineReader(io.TextIOWrapper(io.BytesIO(fh.read(end-start))), file)
+                f.line = line-1
+                self._add(LibComponent(f.get_line(), f, file), lib_alias, needed, translate)
+
+    def load_all(self, file, lib_alias, needed, translate):
+        """ Parses the whole library """
         with open(file, 'rt') as fh:
             f = LibLineReader(fh, file)
             line = f.get_line()
@@ -673,18 +784,11 @@ class SymLib(object):
                     raise SchLibError('Mixing KiCad 5 and KiCad 6 files is not allowed', line, f)
                 raise SchLibError('Missing library signature', line, f)
             line = f.get_line()
-            translate = {k.replace(':', '_'): k for k, v in needed.items() if v is None} if lib_alias is None else None
             while not (line.startswith('#End Library') or line.startswith('# End Library')):
                 if line.startswith('DEF'):
                     o = LibComponent(line, f, file)
                     if o.name:
-                        # Only add components we need
-                        if self._check_add(o, o.name, lib_alias, needed, translate):
-                            self.comps[o.name] = o
-                        if o.alias and lib_alias is not None:
-                            for a in o.alias:
-                                if self._check_add(o, a, lib_alias, needed, translate):
-                                    self.alias[a] = o
+                        self._add(o, lib_alias, needed, translate)
                 else:
                     raise SchLibError('Unknown library entry', line, f)
                 try:
@@ -727,9 +831,68 @@ class DocLib(object):
         super().__init__()
         self.comps = OrderedDict()
 
-    def load(self, file):
-        """ Populates the class, file must exist """
+    @staticmethod
+    def scan(fh):
+        """ Creates the index for the doc-lib: [name, start, end, line] for each entry.
+            Returns None if the file needs a full parse, i.e. has errors """
+        entries = []
+        pos = line_n = 0
+        signature = False
+        entry = None
+        for line in fh:
+            start = pos
+            pos += len(line)
+            line_n += 1
+            line = line.rstrip()
+            if line.startswith(b'#End Doc Library'):
+                return entries if signature and entry is None else None
+            if line.startswith(b'#'):
+                continue
+            if not signature:
+                if not line.startswith(b'EESchema-DOCLIB'):
+                    return None
+                signature = True
+            elif entry is None:
+                if not line.startswith(b'$CMP'):
+                    return None
+                try:
+                    entry = [line[5:].decode().lstrip(), start, None, line_n]
+                except UnicodeDecodeError:
+                    return None
+            elif line.startswith(b'$ENDCMP'):
+                entry[2] = pos
+                entries.append(entry)
+                entry = None
+            elif line[:1] not in (b'D', b'K', b'F'):
+                # Let the parser report it
+                return None
+        # Missing end of library comment
+        return None
+
+    def add(self, o):
+        self.comps[o.name] = o
+        if GS.debug_level > 1:
+            logger.debug('- '+repr(o))
+
+    def load(self, file, needed=None):
+        """ Populates the class, file must exist.
+            When `needed` is a set of names we just load these entries """
         logger.debug('Loading doc-lib `{}`'.format(file))
+        index = get_index(file, self.scan) if needed is not None else None
+        if index is None:
+            self.load_all(file)
+            return
+        with open(file, 'rb') as fh:
+            for name, start, end, line in index:
+                if name not in needed:
+                    continue
+                fh.seek(start)
+                f = DCMLineReader(io.BytesIO(fh.read(end-start)), file)
+                f.line = line-1
+                self.add(DocLibEntry(f.get_line()[5:].lstrip(), f))
+
+    def load_all(self, file):
+        """ Parses the whole doc-lib """
         with open(file, 'rb') as fh:
             f = DCMLineReader(fh, file)
             line = f.get_line()
@@ -738,10 +901,7 @@ class DocLib(object):
             line = f.get_line()
             while not line.startswith('#End Doc Library'):
                 if line.startswith('$CMP'):
-                    o = DocLibEntry(line[5:].lstrip(), f)
-                    self.comps[o.name] = o
-                    if GS.debug_level > 1:
-                        logger.debug('- '+repr(o))
+                    self.add(DocLibEntry(line[5:].lstrip(), f))
                 else:
                     raise SchLibError('Unknown DCM entry', line, f)
                 line = f.get_line()
@@ -752,6 +912,8 @@ class SchematicField(object):
     field_re = re.compile(r'F\s*(\d+)\s+"((?:[^\\]|(?:\\.))*)"\s+([HV])\s+(-?\d+)\s+(-?\d+)\s+(\d+)\s+(\d+)'
                           r'\s+([LRCBT])\s+([LRCBT][IN][BN])\s*("(?:[^\\]|(?:\\.))*")?')
 
+    __slots__ = ('number', 'value', 'horizontal', 'x', 'y', 'size', 'flags', 'hjustify', 'vjustify', 'italic', 'bold', 'name')
+
     def __init__(self):
         super().__init__()
         self.horizontal = True  # H -> True, V -> False
@@ -1205,6 +1367,8 @@ class SchematicComponent(object):
 class SchematicConnection(object):
     conn_re = re.compile(r'\s*~\s+(-?\d+)\s+(-?\d+)')
 
+    __slots__ = ('connect', 'x', 'y')
+
     def __init__(self):
         super().__init__()
 
@@ -1227,6 +1391,8 @@ class SchematicText(object):
     label_re = re.compile(r'Text\s+(Notes|HLabel|GLabel|Label)\s+(-?\d+)\s+(-?\d+)\s+(\d)\s+(\d+)\s+(\S+)')
     TYPES = ['Notes', 'HLabel', 'GLabel', 'Label']
 
+    __slots__ = ('type', 'x', 'y', 'orient', 'size', 'shape', 'italic', 'thickness', 'text')
+
     def __init__(self):
         super().__init__()
 
@@ -1282,6 +1448,8 @@ class SchematicWire(object):
     ENTRIES = {'Wire': ENTRY_WIRE, 'Bus': ENTRY_BUS}
     NAMES = ['Wire Wire Line', 'Wire Bus Line', 'Wire Notes Line', 'Entry Wire Line', 'Entry Bus Bus']
 
+    __slots__ = ('type', 'x', 'y', 'ex', 'ey', 'width', 'style', 'rgb')
+
     def __init__(self, width=None, style=None, rgb=None):
         super().__init__()
         self.width = width
@@ -1406,6 +1574,8 @@ class SchematicBitmap(object):
 class SchematicPort(object):
     port_re = re.compile(r'(\d+)\s+"(.*?)"\s+([IOBTU])\s+([RLTB])\s+(-?\d+)\s+(-?\d+)\s+(\d+)$')
 
+    __slots__ = ('number', 'name', 'form', 'side', 'x', 'y', 'size')
+
     def __init__(self):
         super().__init__()
 
@@ -1724,7 +1894,12 @@ class Schematic(object):
             else:
                 logger.warning(W_MISSLIB + 'Missing library `{}`'.format(k))
         # Create a hash with all the used components
-        self.comps_data = {'{}:{}'.format(c.lib, c.name): None for c in self.get_components(exclude_power=False)}
+        comps = self.get_components(exclude_power=False)
+        self.comps_data = {'{}:{}'.format(c.lib, c.name): None for c in comps}
+        # Names used from each library, to load only the needed doc-lib entries
+        names = {}
+        for c in comps:
+            names.setdefault(c.lib, set()).add(c.name)
         if GS.debug_level > 1:
             logger.debug("Components before loading: "+str(self.comps_data))
         # Load the libraries and descriptions
@@ -1741,8 +1916,13 @@ class Schematic(object):
                 # Load doc-lib
                 file = os.path.splitext(v)[0]+'.dcm'
                 if os.path.isfile(file):
+                    needed = names.get(k, set())
+                    lib = self.lib_comps[k]
+                    if lib:
+                        # The components loaded using an alias use its name
+                        needed = needed | lib.comps.keys() | lib.alias.keys()
                     o = DocLib()
-                    o.load(file)
+                    o.load(file, needed)
                 else:
                     o = None
                 self.dcms[k] = o
@@ -11,14 +11,17 @@ Documentation: https://dev-docs.kicad.org/en/file-formats/sexpr-schematic/
 """
 # Encapsulate file/line
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from copy import deepcopy
+from multiprocessing import get_context
 import os
 import re
+import sys
 from ..gs import GS
 from .. import log
-from ..misc import W_NOLIB, W_UNKFLD, W_MISSCMP
+from ..misc import W_NOLIB, W_UNKFLD, W_MISSCMP, CORRUPTED_SCH
 from .error import SchError
-from .sexpdata import load, SExpData, Symbol, dumps, Sep
+from .sexpdata import load, SExpData, Symbol, Sep, StreamDumper
 from .sexp_helpers import (_check_is_symbol_list, _check_len, _check_len_total, _check_symbol, _check_hide, _check_integer,
                            _check_float, _check_str, _check_symbol_value, _check_symbol_float, _check_symbol_int,
                            _check_symbol_str, _get_offset, _get_yes_no, _get_at, _get_size, _get_xy, _get_points)
@@ -31,6 +34,42 @@ version = None
 KICAD_7_VER = 20230121
 SHEET_FILE = {'Sheet file', 'Sheetfile'}
 SHEET_NAME = {'Sheet name', 'Sheetname'}
+# Parse the graphics, pins and units of the lib_symbols only when needed
+lazy_lib_symbols = True
+# Shared instances for the small objects repeated a lot (font effects, strokes, fills and colors)
+_interned = {}
+
+
+def _intern(obj, *values):
+    """ Returns a shared instance for the objects of the same class and values.
+        The class of the values is part of the key, 1 and 1.0 are written in a different way.
+        The shared instances must not be modified, use a copy. """
+    key = (obj.__class__,)+tuple((v.__class__, v) for v in values)
+    return _interned.setdefault(key, obj)
+
+
+def _parse_file(fname):
+    """ Parse a sub-sheet in a worker process. Errors are reported later, by the sequential load.
+        Note: some of the parser exceptions can't be pickled, so we must catch all of them here """
+    try:
+        with open(fname, 'rt') as fh:
+            return load(fh)[0]
+    except Exception:
+        return None
+
+
+def _get_sheet_files(sch, fname):
+    """ Names of the sub-sheets, taken directly from the S-expressions """
+    base = os.path.dirname(fname)
+    files = []
+    for e in sch[1:]:
+        if not isinstance(e, list) or not e or not isinstance(e[0], Symbol) or e[0].value() != 'sheet':
+            continue
+        for p in e[1:]:
+            if (isinstance(p, list) and len(p) > 2 and isinstance(p[0], Symbol) and p[0].value() == 'property' and
+               p[1] in SHEET_FILE and isinstance(p[2], str)):
+                files.append(os.path.abspath(os.path.join(base, p[2])))
+    return files
 
 
 def path_join(*args):
@@ -82,6 +121,8 @@ def find_our_project(obj, default, exp_hierarchy):
 
 
 class PointXY(object):
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         super().__init__()
         self.x = x
@@ -89,6 +130,8 @@ class PointXY(object):
 
 
 class Box(object):
+    __slots__ = ('x1', 'y1', 'x2', 'y2', 'set')
+
     def __init__(self, points=None):
         self.x1 = self.y1 = self.x2 = self.y2 = 0
         self.set = False
@@ -127,7 +170,10 @@ class Box(object):
 
 
 class FontEffects(object):
-    """ Class used to describe text attributes """
+    """ Class used to describe text attributes.
+        The parsed objects are shared, don't modify them. """
+    __slots__ = ('hide', 'w', 'h', 'thickness', 'bold', 'italic', 'hjustify', 'vjustify', 'mirror', 'color', 'href', 'face')
+
     def __init__(self):
         super().__init__()
         self.hide = False
@@ -209,6 +255,14 @@ class FontEffects(object):
                     o.href = _check_str(i, 1, 'font effect')
                 else:
                     raise SchError('Unknown font effect attribute `{}`'.format(i))
+        c = o.color
+        return _intern(o, o.hide, o.w, o.h, o.thickness, o.bold, o.italic, o.hjustify, o.vjustify, o.mirror, o.href,
+                       o.face, *((None,) if c is None else (c.r, c.g, c.b, c.a)))
+
+    def copy(self):
+        o = FontEffects()
+        for attr in FontEffects.__slots__:
+            setattr(o, attr, getattr(self, attr))
         return o
 
     def write_font(self):
@@ -252,6 +306,8 @@ class FontEffects(object):
 
 
 class Color(object):
+    __slots__ = ('r', 'g', 'b', 'a')
+
     def __init__(self, items=None):
         super().__init__()
         if items:
@@ -265,13 +321,16 @@ class Color(object):
 
     @staticmethod
     def parse(items):
-        return Color(items)
+        c = Color(items)
+        return _intern(c, c.r, c.g, c.b, c.a)
 
     def write(self):
         return _symbol('color', [self.r, self.g, self.b, self.a])
 
 
 class Stroke(object):
+    __slots__ = ('width', 'type', 'color')
+
     def __init__(self):
         super().__init__()
         self.width = 0
@@ -291,7 +350,8 @@ class Stroke(object):
                 stroke.color = Color.parse(i)
             else:
                 raise SchError('Unknown stroke attribute `{}`'.format(i))
-        return stroke
+        c = stroke.color
+        return _intern(stroke, stroke.width, stroke.type, c.r, c.g, c.b, c.a)
 
     def write(self):
         data = [_symbol('width', [self.width])]
@@ -303,6 +363,8 @@ class Stroke(object):
 
 
 class Fill(object):
+    __slots__ = ('type', 'color')
+
     def __init__(self):
         super().__init__()
         self.type = None
@@ -320,7 +382,8 @@ class Fill(object):
                 fill.color = Color.parse(i)
             else:
                 raise SchError('Unknown fill attribute `{}`'.format(i))
-        return fill
+        c = fill.color
+        return _intern(fill, fill.type, *((None,) if c is None else (c.r, c.g, c.b, c.a)))
 
     def write(self):
         data = []
@@ -332,6 +395,8 @@ class Fill(object):
 
 
 class DrawArcV6(object):
+    __slots__ = ('start', 'mid', 'end', 'stroke', 'fill', 'uuid', 'box')
+
     def __init__(self):
         super().__init__()
         self.start = None
@@ -375,6 +440,8 @@ class DrawArcV6(object):
 
 
 class DrawCircleV6(object):
+    __slots__ = ('center', 'radius', 'stroke', 'fill', 'uuid', 'box')
+
     def __init__(self):
         super().__init__()
         self.center = None
@@ -416,6 +483,8 @@ class DrawCircleV6(object):
 
 
 class DrawRectangleV6(object):
+    __slots__ = ('start', 'end', 'stroke', 'fill', 'uuid', 'box')
+
     def __init__(self):
         super().__init__()
         self.start = None
@@ -456,6 +525,8 @@ class DrawRectangleV6(object):
 
 class DrawCurve(object):
     """ Qubic Bezier """
+    __slots__ = ('points', 'stroke', 'fill', 'box')
+
     def __init__(self):
         super().__init__()
         self.points = []
@@ -490,6 +561,8 @@ class DrawCurve(object):
 
 
 class DrawPolyLine(object):
+    __slots__ = ('points', 'stroke', 'fill', 'box')
+
     def __init__(self):
         super().__init__()
         self.points = []
@@ -524,6 +597,8 @@ class DrawPolyLine(object):
 
 
 class DrawTextV6(object):
+    __slots__ = ('text', 'x', 'y', 'ang', 'effects', 'box')
+
     def __init__(self):
         super().__init__()
         self.text = None
@@ -551,6 +626,8 @@ def _get_effects(items, pos, name):
 
 
 class PinAlternate(object):
+    __slots__ = ('name', 'type', 'gtype')
+
     def __init__(self):
         super().__init__()
 
@@ -573,6 +650,9 @@ def _get_alternate(items, pos, name):
 
 
 class PinV6(object):
+    __slots__ = ('type', 'gtype', 'name', 'number', 'pos_x', 'pos_y', 'ang', 'len', 'name_effects',
+                 'number_effects', 'hide', 'box', 'alternate')
+
     def __init__(self):
         super().__init__()
         self.type = self.gtype = self.name = self.number = ''
@@ -649,6 +729,8 @@ class SchematicFieldV6(object):
     # 2 Footprint
     # 3 Datasheet
     # Reserved names: ki_keywords, ki_description, ki_locked, ki_fp_filters
+    __slots__ = ('name', 'value', 'number', 'x', 'y', 'ang', 'effects', 'do_not_autoplace', 'show_name')
+
     def __init__(self, name='', value='', id=0, x=0, y=0, ang=0):
         super().__init__()
         self.name = name
@@ -662,7 +744,9 @@ class SchematicFieldV6(object):
         self.show_name = False
 
     def visible(self, v):
-        self.effects.hide = not v
+        if self.effects.hide == v:
+            self.effects = self.effects.copy()
+            self.effects.hide = not v
 
     def is_visible(self):
         return not self.effects.hide
@@ -677,7 +761,8 @@ class SchematicFieldV6(object):
     def set_xy(self, x, y, hjustify=None):
         self.x = x
         self.y = y
-        if hjustify:
+        if hjustify and self.effects.hjustify != hjustify:
+            self.effects = self.effects.copy()
             self.effects.hjustify = hjustify
 
     @staticmethod
@@ -734,9 +819,16 @@ class LibComponent(object):
     cross_stroke.color = cross_color
     cross_fill = Fill()
     cross_fill.type = 'none'
+    # Attributes computed from the body (graphics, pins and units)
+    BODY_ATTRS = {'draw', 'box', 'units', 'pins', 'all_pins', 'unit_count'}
+    BODY_TYPES = {'arc', 'circle', 'bezier', 'polyline', 'rectangle', 'text', 'pin', 'symbol'}
 
     def __init__(self):
         super().__init__()
+        self._init_header()
+        self._init_body()
+
+    def _init_header(self):
         self.pin_numbers_hide = None
         self.pin_names_hide = None
         self.pin_names_offset = None
@@ -744,16 +836,39 @@ class LibComponent(object):
         self.on_board = True
         self.is_power = False
         self.unit = 0
-        self.draw = []
         self.fields = []
         self.dfields = {}
-        self.box = Box()
         self.alias = None
         self.dcm = None
         self.fp_list = None
         # This member is used to generate crossed components (DNF).
         # When defined means we need to add a cross in this box and then reset the box.
         self.cross_box = None
+        # The body (S-expression) when we didn't parse it yet
+        self._body = None
+
+    def _init_body(self):
+        self.draw = []
+        self.box = Box()
+        self.units = []
+        self.pins = []
+        self.all_pins = []
+        self.unit_count = 1
+
+    def __getattr__(self, name):
+        """ Only called for missing attributes, we use it to parse the body on demand """
+        body = self.__dict__.get('_body')
+        if body is None or name not in LibComponent.BODY_ATTRS:
+            raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+        logger.debugl(3, 'Parsing the body of `{}`'.format(self.lib_id))
+        self._body = None
+        self._init_body()
+        try:
+            self._load_body(body)
+        except SchError as e:
+            # Same as a problem found while loading the schematic
+            GS.exit_with_error(('While loading the `{}` library symbol'.format(self.lib_id), str(e)), CORRUPTED_SCH)
+        return getattr(self, name)
 
     def get_field_value(self, field):
         field = field.lower()
@@ -762,14 +877,19 @@ class LibComponent(object):
         return ''
 
     @staticmethod
-    def load(c, project, parent=None):  # noqa: C901
+    def load(c, project, parent=None, lazy=False):
+        """ Load a library symbol. When `lazy` is True the body (graphics, pins and units) is parsed only when used """
         if not isinstance(c, list):
             raise SchError('Library component definition is not a list')
         if len(c) < 3:
             raise SchError('Truncated library component definition (len<3)')
         if not isinstance(c[0], Symbol) or c[0].value() != 'symbol':
             raise SchError('Library component definition is of wrong type')
-        comp = LibComponent()
+        if lazy:
+            comp = LibComponent.__new__(LibComponent)
+            comp._init_header()
+        else:
+            comp = LibComponent()
         comp.project = project
         # First argument is the LIB:NAME
         comp.lib_id = comp.name = _check_str(c, 1, 'name')
@@ -786,15 +906,11 @@ class LibComponent(object):
         else:
             if parent is None:
                 logger.warning(W_NOLIB + "Component `{}` with more than one `:`".format(comp.name))
-        comp.units = []
-        comp.pins = []
-        comp.all_pins = []
-        comp.unit_count = 1
         field_id = 0
+        body = []
         # Variable list
         for i in c[2:]:
             i_type = _check_is_symbol_list(i)
-            vis_obj = None
             if i_type == 'pin_numbers':
                 comp.pin_numbers_hide = _check_hide(i, 1, i_type)
             elif i_type == 'pin_names':
@@ -822,29 +938,44 @@ class LibComponent(object):
                 field_id += 1
                 comp.fields.append(field)
                 comp.dfields[field.name.lower()] = field
+            elif i_type in LibComponent.BODY_TYPES:
+                body.append(i)
+            else:
+                raise SchError('Unknown symbol attribute `{}`'.format(i))
+        if lazy:
+            comp._body = body
+        else:
+            comp._load_body(body, parent)
+        return comp
+
+    def _load_body(self, body, parent=None):
+        """ Parse the graphics, pins and units """
+        for i in body:
+            i_type = i[0].value()
+            vis_obj = None
             # GRAPHIC_ITEMS...
-            elif i_type == 'arc':
+            if i_type == 'arc':
                 vis_obj = DrawArcV6.parse(i)
-                comp.draw.append(vis_obj)
+                self.draw.append(vis_obj)
             elif i_type == 'circle':
                 vis_obj = DrawCircleV6.parse(i)
-                comp.draw.append(vis_obj)
+                self.draw.append(vis_obj)
             elif i_type == 'bezier':
                 # Wrongly documented, not implemented in the GUI 2022/06/10
                 vis_obj = DrawCurve.parse(i)
-                comp.draw.append(vis_obj)
+                self.draw.append(vis_obj)
             elif i_type == 'polyline':
                 vis_obj = DrawPolyLine.parse(i)
-                comp.draw.append(vis_obj)
+                self.draw.append(vis_obj)
             elif i_type == 'rectangle':
                 vis_obj = DrawRectangleV6.parse(i)
-                comp.draw.append(vis_obj)
+                self.draw.append(vis_obj)
             elif i_type == 'text':
-                comp.draw.append(DrawTextV6.parse(i))
+                self.draw.append(DrawTextV6.parse(i))
             # PINS...
             elif i_type == 'pin':
                 vis_obj = PinV6.parse(i)
-                comp.pins.append(vis_obj)
+                self.pins.append(vis_obj)
                 if parent:
                     parent.all_pins.append(vis_obj)
             # UNITS...
@@ -858,18 +989,15 @@ class LibComponent(object):
                 #    - If the unit has alternative drawing they are *_N_1 and *_N_2
                 #    - If the unit doesn't have alternative we have *_N_x x starts from 0
                 #      Pins and drawings can be in _N_0 and/or _N_1
-                vis_obj = LibComponent.load(i, project, parent=comp if parent is None else parent)
-                comp.units.append(vis_obj)
+                vis_obj = LibComponent.load(i, self.project, parent=self if parent is None else parent)
+                self.units.append(vis_obj)
                 m = LibComponent.unit_regex.search(vis_obj.lib_id)
                 if m is None:
                     raise SchError('Malformed unit id `{}`'.format(vis_obj.lib_id))
                 unit = int(m.group(2))
-                comp.unit_count = max(unit, comp.unit_count)
-            else:
-                raise SchError('Unknown symbol attribute `{}`'.format(i))
+                self.unit_count = max(unit, self.unit_count)
             if vis_obj:
-                comp.box.union(vis_obj.box)
-        return comp
+                self.box.union(vis_obj.box)
 
     def assign_crosses(self):
         """ Compute the box for the crossed components """
@@ -952,6 +1080,8 @@ class LibComponent(object):
 
 
 class SymbolInstance(object):
+    __slots__ = ('path', 'reference', 'unit', 'value', 'footprint', 'component')
+
     def __init__(self):
         super().__init__()
         # Doesn't exist on v7
@@ -1265,6 +1395,8 @@ def add_uuid(data, uuid, no_sep=False):
 
 
 class Junction(object):
+    __slots__ = ('pos_x', 'pos_y', 'ang', 'diameter', 'color', 'uuid')
+
     @staticmethod
     def parse(items):
         if len(items) != 5:
@@ -1299,6 +1431,8 @@ class BusAlias(object):
 
 
 class NoConnect(object):
+    __slots__ = ('pos_x', 'pos_y', 'ang', 'uuid')
+
     @staticmethod
     def parse(items):
         if len(items) != 3:
@@ -1315,6 +1449,8 @@ class NoConnect(object):
 
 
 class BusEntry(object):
+    __slots__ = ('pos_x', 'pos_y', 'ang', 'size', 'stroke', 'uuid')
+
     @staticmethod
     def parse(items):
         if len(items) != 5:
@@ -1335,6 +1471,8 @@ class BusEntry(object):
 
 
 class SchematicWireV6(object):
+    __slots__ = ('type', 'points', 'stroke', 'uuid')
+
     @staticmethod
     def parse(items, name):
         if len(items) != 4:
@@ -1388,6 +1526,8 @@ class SchematicBitmapV6(object):
 
 
 class Text(object):
+    __slots__ = ('name', 'text', 'pos_x', 'pos_y', 'ang', 'effects', 'uuid', 'exclude_from_sim')
+
     @staticmethod
     def parse(items, name):
         text = Text()
@@ -1420,6 +1560,8 @@ class Text(object):
 
 
 class TextBox(object):
+    __slots__ = ('name', 'text', 'pos_x', 'pos_y', 'ang', 'size', 'stroke', 'fill', 'effects', 'uuid')
+
     @staticmethod
     def parse(items, name):
         text = TextBox()
@@ -1444,6 +1586,9 @@ class TextBox(object):
 
 
 class GlobalLabel(object):
+    __slots__ = ('text', 'shape', 'fields_autoplaced', 'pos_x', 'pos_y', 'ang', 'effects', 'uuid', 'properties', 'name',
+                 'length')
+
     def __init__(self):
         super().__init__()
         self.text = ''
@@ -1501,24 +1646,32 @@ class GlobalLabel(object):
 
 
 class Label(GlobalLabel):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'label'
 
 
 class HierarchicalLabel(GlobalLabel):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'hierarchical_label'
 
 
 class NetClassFlag(GlobalLabel):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.name = 'netclass_flag'
 
 
 class HSPin(object):
+    __slots__ = ('name', 'type', 'pos_x', 'pos_y', 'ang', 'effects', 'uuid')
+
     """ Hierarchical Sheet Pin """
     # TODO base class with HierarchicalLabel
     @staticmethod
@@ -1838,7 +1991,7 @@ class SchematicV6(Schematic):
         if not isinstance(comps, list):
             raise SchError('The lib symbols is not a list')
         for c in comps[1:]:
-            obj = LibComponent.load(c, self.project)
+            obj = LibComponent.load(c, self.project, lazy=lazy_lib_symbols)
             self.lib_symbols.append(obj)
             self.lib_symbol_names[obj.lib_id] = obj
 
@@ -1917,86 +2070,16 @@ class SchematicV6(Schematic):
             fname = os.path.join(dest_dir, fname)
         # Save the sheet
         if fname not in saved:
-            sch = [Symbol('kicad_sch')]
-            sch.append(_symbol('version', [self.version]))
-            sch.append(_symbol('generator', [Symbol(self.generator)]))
-            sch.append(Sep())
-            sch.append(Sep())
-            add_uuid(sch, self.uuid, no_sep=True)
-            sch.extend(self.write_paper())
-            sch.extend(self.write_title_block())
-            sch.extend(self.write_lib_symbols(cross))
-            # Bus aliases
-            _add_items(self.bus_alias, sch)
-            # Connections (aka Junctions)
-            _add_items(self.junctions, sch, pre_sep=(len(self.bus_alias) == 0))
-            # No connect
-            _add_items(self.no_conn, sch)
-            # Bus entry
-            _add_items(self.bus_entry, sch)
-            # Lines (wire, bus and polyline)
-            if self.wires:
-                old_type = 'none'
-                for e in self.wires:
-                    if e.type != old_type and old_type != 'wire':
-                        sch.append(Sep())
-                    sch.append(e.write())
-                    old_type = e.type
-                    sch.append(Sep())
-            # Arcs
-            _add_items(self.arcs, sch)
-            # Circles
-            _add_items(self.circles, sch)
-            # Rectangles
-            _add_items(self.rectangles, sch)
-            # Images
-            _add_items(self.bitmaps, sch)
-            # Text Boxes
-            _add_items(self.text_boxes, sch)
-            # Texts
-            _add_items(self.texts, sch, pre_sep=False)
-            # Labels
-            _add_items(self.labels, sch)
-            # Global Labels
-            _add_items(self.glabels, sch)
-            # Hierarchical Labels
-            _add_items(self.hlabels, sch)
-            # Net Class Flags
-            _add_items(self.net_class_flags, sch)
-            # Symbols
-            _add_items(self.symbols, sch, sep=True, cross=cross, exp_hierarchy=exp_hierarchy)
-            # Sheets
-            _add_items(self.sheets, sch, sep=True, exp_hierarchy=exp_hierarchy)
-            # Sheet instances
-            instances = self.sheet_instances
-            if exp_hierarchy and base_sheet == self:
-                # We are saving a expanded hierarchy, so we must fix the root page instances
-                instances = deepcopy(self.sheet_instances)
-                for ins in instances:
-                    ins.path = self.sheet_paths[ins.path].sheet_path
-            if base_sheet == self or not exp_hierarchy:
-                _add_items_list('sheet_instances', instances, sch)
-            # Symbol instances
-            if version < KICAD_7_VER:
-                instances = self.symbol_instances
-                if exp_hierarchy and base_sheet == self:
-                    # We are saving a expanded hierarchy, so we must fix the instances
-                    instances = deepcopy(self.symbol_instances)
-                    for s in instances:
-                        c = s.component
-                        if c.uuid != c.uuid_ori:
-                            # UUID changed to make it different
-                            # s.path = path_join(os.path.dirname(s.path), c.uuid)
-                            s.path = path_join(c.path, c.uuid)
-                if base_sheet == self or not exp_hierarchy:
-                    _add_items_list('symbol_instances', instances, sch)
             logger.debug('Saving schematic: `{}`'.format(fname))
             # Keep a back-up of existing files
             if os.path.isfile(fname):
                 bkp = fname+'-bak'
                 os.replace(fname, bkp)
             with open(fname, 'wt') as f:
-                f.write(dumps(sch))
+                # The elements are written as soon as we add them, no need to keep the whole file in memory
+                sch = StreamDumper(f)
+                self.write_sch(sch, base_sheet, cross, exp_hierarchy)
+                sch.close()
                 f.write('\n')
             saved.add(fname)
         for sch in self.sheets:
@@ -2004,6 +2087,82 @@ class SchematicV6(Schematic):
                 sch.sch.save(sch.flat_file if exp_hierarchy else sch.file, dest_dir, base_sheet, saved, cross=cross,
                              exp_hierarchy=exp_hierarchy)
 
+    def write_sch(self, sch, base_sheet, cross, exp_hierarchy):
+        """ Adds the elements of this sheet to `sch` (a list or a StreamDumper) """
+        sch.append(Symbol('kicad_sch'))
+        sch.append(_symbol('version', [self.version]))
+        sch.append(_symbol('generator', [Symbol(self.generator)]))
+        sch.append(Sep())
+        sch.append(Sep())
+        add_uuid(sch, self.uuid, no_sep=True)
+        sch.extend(self.write_paper())
+        sch.extend(self.write_title_block())
+        sch.extend(self.write_lib_symbols(cross))
+        # Bus aliases
+        _add_items(self.bus_alias, sch)
+        # Connections (aka Junctions)
+        _add_items(self.junctions, sch, pre_sep=(len(self.bus_alias) == 0))
+        # No connect
+        _add_items(self.no_conn, sch)
+        # Bus entry
+        _add_items(self.bus_entry, sch)
+        # Lines (wire, bus and polyline)
+        if self.wires:
+            old_type = 'none'
+            for e in self.wires:
+                if e.type != old_type and old_type != 'wire':
+                    sch.append(Sep())
+                sch.append(e.write())
+                old_type = e.type
+                sch.append(Sep())
+        # Arcs
+        _add_items(self.arcs, sch)
+        # Circles
+        _add_items(self.circles, sch)
+        # Rectangles
+        _add_items(self.rectangles, sch)
+        # Images
+        _add_items(self.bitmaps, sch)
+        # Text Boxes
+        _add_items(self.text_boxes, sch)
+        # Texts
+        _add_items(self.texts, sch, pre_sep=False)
+        # Labels
+        _add_items(self.labels, sch)
+        # Global Labels
+        _add_items(self.glabels, sch)
+        # Hierarchical Labels
+        _add_items(self.hlabels, sch)
+        # Net Class Flags
+        _add_items(self.net_class_flags, sch)
+        # Symbols
+        _add_items(self.symbols, sch, sep=True, cross=cross, exp_hierarchy=exp_hierarchy)
+        # Sheets
+        _add_items(self.sheets, sch, sep=True, exp_hierarchy=exp_hierarchy)
+        # Sheet instances
+        instances = self.sheet_instances
+        if exp_hierarchy and base_sheet == self:
+            # We are saving a expanded hierarchy, so we must fix the root page instances
+            instances = deepcopy(self.sheet_instances)
+            for ins in instances:
+                ins.path = self.sheet_paths[ins.path].sheet_path
+        if base_sheet == self or not exp_hierarchy:
+            _add_items_list('sheet_instances', instances, sch)
+        # Symbol instances
+        if version < KICAD_7_VER:
+            instances = self.symbol_instances
+            if exp_hierarchy and base_sheet == self:
+                # We are saving a expanded hierarchy, so we must fix the instances
+                instances = deepcopy(self.symbol_instances)
+                for s in instances:
+                    c = s.component
+                    if c.uuid != c.uuid_ori:
+                        # UUID changed to make it different
+                        # s.path = path_join(os.path.dirname(s.path), c.uuid)
+                        s.path = path_join(c.path, c.uuid)
+            if base_sheet == self or not exp_hierarchy:
+                _add_items_list('symbol_instances', instances, sch)
+
     def save_variant(self, dest_dir):
         fname = os.path.basename(self.fname)
         self.save(fname, dest_dir, cross=True, exp_hierarchy=self.check_exp_hierarchy())
@@ -2109,6 +2268,70 @@ class SchematicV6(Schematic):
             for sy, c in s.symbol_uuids.items():
                 logger.debug(f"  - {sy} -> {c}")
 
+    def _load_sexp(self, fname):
+        """ Parse the file, or reuse the result if we already parsed it (repeated sheets).
+            The S-expressions are only read, so we can share them """
+        cache = self.root_sheet._sexp_cache
+        key = os.path.abspath(fname)
+        sch = cache.get(key)
+        if sch is not None:
+            logger.debug("- Reusing the already parsed "+fname)
+            return sch
+        with open(fname, 'rt') as fh:
+            error = None
+            try:
+                sch = load(fh)[0]
+            except SExpData as e:
+                error = str(e)
+            if error:
+                raise SchError(error)
+        cache[key] = sch
+        return sch
+
+    def _sexp_needed(self, key):
+        """ Other instances of the file, or of a file that instantiates it, are waiting to be built """
+        root = self.root_sheet
+        return root._sexp_uses.get(key, 0) > 0 or any(self._sexp_needed(p) for p in root._sexp_includers.get(key, ()))
+
+    def _release_sexp(self, fname):
+        """ The sheet is built, we can drop its S-expressions, unless they will be used again """
+        root = self.root_sheet
+        key = os.path.abspath(fname)
+        if key in root._sexp_uses:
+            root._sexp_uses[key] -= 1
+        if not self._sexp_needed(key):
+            root._sexp_cache.pop(key, None)
+
+    def _preload_sheets(self, fname, sch):
+        """ Parse the sub-sheets using a pool of processes (-j).
+            We just fill the S-expressions cache, the objects are created by the sequential load, so the UUIDs,
+            paths and pages are assigned in the same order """
+        cache = self._sexp_cache
+        pending = set()
+
+        def new_files(sch, fname):
+            files = [f for f in _get_sheet_files(sch, fname) if f not in cache and f not in pending and os.path.isfile(f)]
+            pending.update(files)
+            return files
+
+        files = new_files(sch, fname)
+        if len(files) < 2:
+            return
+        logger.debug('Parsing the sub-sheets using {} processes'.format(GS.jobs))
+        with ProcessPoolExecutor(GS.jobs, mp_context=get_context('fork')) as pool:
+            running = {pool.submit(_parse_file, f): f for f in files}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    f = running.pop(fut)
+                    sch = fut.result()
+                    if sch is None or not isinstance(sch, list):
+                        # Let the sequential load report the error
+                        continue
+                    cache[f] = sch
+                    for sub in new_files(sch, f):
+                        running[pool.submit(_parse_file, sub)] = sub
+
     def load(self, fname, project, parent=None):  # noqa: C901
         """ Load a v6.x KiCad Schematic.
             The caller must be sure the file exists.
@@ -2125,6 +2348,11 @@ class SchematicV6(Schematic):
             self.sheet_names = {}
             self.all_sheets = []
             self.root_sheet = self
+            # Parsed files, so sheets instantiated many times are parsed once
+            self._sexp_cache = {}
+            # How many instances of each file are waiting to be built, and which files instantiate it
+            self._sexp_uses = {}
+            self._sexp_includers = {}
             UUID_Validator.reset()
         else:
             self.fields = parent.fields
@@ -2163,16 +2391,12 @@ class SchematicV6(Schematic):
         self.symbol_uuids = {}
         if not os.path.isfile(fname):
             raise SchError('Missing subsheet: '+fname)
-        with open(fname, 'rt') as fh:
-            error = None
-            try:
-                sch = load(fh)[0]
-            except SExpData as e:
-                error = str(e)
-            if error:
-                raise SchError(error)
+        sch = self._load_sexp(fname)
         if not isinstance(sch, list) or sch[0].value() != 'kicad_sch':
             raise SchError('No kicad_sch signature')
+        # Note: ProcessPoolExecutor needs Python 3.7 to use fork (mp_context), otherwise we just load them sequentially
+        if parent is None and GS.jobs > 1 and not GS.on_windows and sys.version_info >= (3, 7):
+            self._preload_sheets(fname, sch)
         for e in sch[1:]:
             e_type = _check_is_symbol_list(e)
             obj = None
@@ -2252,13 +2476,22 @@ class SchematicV6(Schematic):
                 raise SchError('Unknown kicad_sch attribute `{}`'.format(e))
         if not self.title:
             self._fill_missing_title_block()
+        self._release_sexp(fname)
         # Load sub-sheets
+        uses = self.root_sheet._sexp_uses
+        includers = self.root_sheet._sexp_includers
+        for sch in self.sheets:
+            key = os.path.abspath(os.path.join(os.path.dirname(fname), sch.file))
+            uses[key] = uses.get(key, 0)+1
+            includers.setdefault(key, set()).add(os.path.abspath(fname))
         for sch in self.sheets:
             sch.sch = sch.load_sheet(project, fname, self)
         # Assign the page numbers
         if parent is not None:
             # Here we finished for sub-sheets
             return
+        # The S-expressions are no longer needed
+        self._sexp_cache = self._sexp_uses = self._sexp_includers = None
         # On the main sheet analyze the sheet and symbol instances
         # Solve the sheet pages: assign the page numbers.
         # KiCad 6: for all pages
@@ -9,16 +9,21 @@
 Main KiBot code
 """
 
+import ast
+from functools import partial
+import json
 import os
 import re
+import sys
 from sys import exit
 from sys import path as sys_path
 import shlex
 from shutil import which, copy2
 from subprocess import run, PIPE, STDOUT, Popen, CalledProcessError
 from glob import glob
-from importlib.util import spec_from_file_location, module_from_spec
-from collections import OrderedDict
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_file_location, module_from_spec, cache_from_source
+from collections import OrderedDict, namedtuple
 
 from .gs import GS
 from .registrable import RegOutput
@@ -26,22 +31,35 @@ from .misc import (PLOT_ERROR, CORRUPTED_PCB, EXIT_BAD_ARGS, CORRUPTED_SCH, vers
                    EXIT_BAD_CONFIG, WRONG_INSTALL, UI_SMD, UI_VIRTUAL, TRY_INSTALL_CHECK, MOD_SMD, MOD_THROUGH_HOLE,
                    MOD_VIRTUAL, W_PCBNOSCH, W_NONEEDSKIP, W_WRONGCHAR, name2make, W_TIMEOUT, W_KIAUTO, W_VARSCH,
                    NO_SCH_FILE, NO_PCB_FILE, W_VARPCB, NO_YAML_MODULE, WRONG_ARGUMENTS, FAILED_EXECUTE,
-                   MOD_EXCLUDE_FROM_POS_FILES, MOD_EXCLUDE_FROM_BOM, MOD_BOARD_ONLY, hide_stderr)
+                   MOD_EXCLUDE_FROM_POS_FILES, MOD_EXCLUDE_FROM_BOM, MOD_BOARD_ONLY, hide_stderr, W_NOPARALLEL)
 from .error import PlotError, KiPlotConfigurationError, config_error
 from .config_reader import CfgYamlReader
 from .pre_base import BasePreFlight
+from .registrable import RegVariant, RegFilter
 from .dep_downloader import register_deps
 import kibot.dep_downloader as dep_downloader
 from .kicad.v5_sch import Schematic, SchFileError, SchError
 from .kicad.v6_sch import SchematicV6
 from .kicad.config import KiConfError
 from . import log
+from . import incremental
+from . import output_cache
+from . import profiler
+from . import sch_cache
 
 logger = log.get_logger()
 # Cache to avoid running external many times to check their versions
 script_versions = {}
 actions_loaded = False
+PLUGINS_INDEX = 'plugins_index.json'
+# Decorators used to register plug-ins and where they register
+PLUGIN_DECORATORS = {'output_class': RegOutput, 'pre_class': BasePreFlight, 'variant_class': RegVariant,
+                     'filter_class': RegFilter}
 needed_imports = {}
+# Data from the PCB footprints, collected once for each loaded board
+FootprintData = namedtuple('FootprintData', ['ref', 'value', 'package', 'attrs', 'bottom', 'rot', 'x', 'y', 'w', 'h'])
+fps_data = None
+fps_data_geometry = None
 
 try:
     import yaml
@@ -57,17 +75,24 @@ def cased_path(path):
     return r and r[0] or path
 
 
+def load_deps_data(doc, name):
+    """ Dependencies data from the docstring of a plug-in """
+    if not doc:
+        return None
+    try:
+        return yaml.safe_load(doc)
+    except yaml.YAMLError as e:
+        logger.error('While loading plug-in `{}`:'.format(name))
+        config_error("Error loading YAML "+str(e))
+
+
 def try_register_deps(mod, name):
-    if mod.__doc__:
-        try:
-            data = yaml.safe_load(mod.__doc__)
-        except yaml.YAMLError as e:
-            logger.error('While loading plug-in `{}`:'.format(name))
-            config_error("Error loading YAML "+str(e))
+    data = load_deps_data(mod.__doc__, name)
+    if data is not None:
         register_deps(name, data)
 
 
-def _import(name, path):
+def _import(name, path, register=True):
     # Python 3.4+ import mechanism
     spec = spec_from_file_location("kibot."+name, path)
     mod = module_from_spec(spec)
@@ -77,45 +102,185 @@ def _import(name, path):
         GS.exit_with_error(('Unable to import plug-ins: '+str(e),
                             'Make sure you used `--no-compile` if you used pip for installation',
                             'Python path: '+str(sys_path)), WRONG_INSTALL)
-    try_register_deps(mod, name)
+    if register:
+        try_register_deps(mod, name)
+
+
+def _import_lazy(name, path):
+    """ Import a plug-in when one of its classes is needed """
+    logger.debug("- Importing "+name)
+    from kibot.mcpyrate import activate
+    if 'deactivate' in activate.__dict__:
+        activate.activate()
+    try:
+        # The dependencies were registered using the index
+        with profiler.phase(name, 'import'):
+            _import(name, path, register=False)
+    finally:
+        if 'deactivate' in activate.__dict__:
+            activate.deactivate()
+
+
+def get_user_cache_dir():
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'kibot')
+
 
+def get_plugins_index_name():
+    return os.path.join(get_user_cache_dir(), PLUGINS_INDEX)
 
-def _load_actions(path, load_internals=False):
-    logger.debug("Importing from "+path)
+
+def load_plugins_index():
+    fname = get_plugins_index_name()
+    try:
+        with open(fname, 'rt') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        logger.debug('No plug-ins index, doing a full scan')
+        return {}
+    if not isinstance(index, dict) or index.get('version') != GS.kibot_version:
+        logger.debug('Plug-ins index from other KiBot version, doing a full scan')
+        return {}
+    return index.get('plugins', {})
+
+
+def save_plugins_index(index):
+    fname = get_plugins_index_name()
+    logger.debug('Saving the plug-ins index to '+fname)
+    try:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        tmp_name = fname+'.{}.tmp'.format(os.getpid())
+        with open(tmp_name, 'wt') as f:
+            json.dump({'version': GS.kibot_version, 'plugins': index}, f, indent=1, sort_keys=True)
+        os.replace(tmp_name, fname)
+    except (OSError, TypeError, ValueError) as e:
+        # Not fatal, just slower
+        logger.debug('Failed to save the plug-ins index: '+str(e))
+
+
+def scan_plugin(path, name):
+    """ Look for the classes registered by a plug-in, without importing it """
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), path)
+    classes = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            for d in node.decorator_list:
+                if isinstance(d, ast.Name) and d.id in PLUGIN_DECORATORS:
+                    classes.append((d.id, node.name.lower()))
+    return {'classes': classes, 'deps': load_deps_data(ast.get_docstring(tree, clean=False), name)}
+
+
+def _load_actions(path, index, load_internals=False):
+    logger.debug("Indexing plug-ins from "+path)
     lst = glob(os.path.join(path, 'out_*.py')) + glob(os.path.join(path, 'pre_*.py'))
     lst += glob(os.path.join(path, 'var_*.py')) + glob(os.path.join(path, 'fil_*.py'))
-    if load_internals:
-        lst += [os.path.join(path, 'globals.py')]
+    modified = False
     for p in sorted(lst):
         name = os.path.splitext(os.path.basename(p))[0]
-        logger.debug("- Importing "+name)
-        _import(name, p)
+        st = os.stat(p)
+        stamp = [st.st_mtime_ns, st.st_size]
+        data = index.get(p)
+        if data is None or data['stamp'] != stamp:
+            logger.debug("- Scanning "+name)
+            data = scan_plugin(p, name)
+            data['stamp'] = stamp
+            index[p] = data
+            modified = True
+        if data['deps'] is not None:
+            register_deps(name, data['deps'])
+        for decorator, cl_name in data['classes']:
+            # Import the plug-in only if we need one of its classes
+            PLUGIN_DECORATORS[decorator].register_lazy(cl_name, partial(_import_lazy, name, p))
+    if load_internals:
+        _import('globals', os.path.join(path, 'globals.py'))
+    return modified
+
+
+def get_plugins_dirs():
+    dirs = [os.path.abspath(os.path.dirname(__file__))]
+    home = os.environ.get('HOME')
+    if home:
+        dirs.append(os.path.join(home, '.config', 'kiplot', 'plugins'))
+        dirs.append(os.path.join(home, '.config', 'kibot', 'plugins'))
+    return dirs
+
+
+def set_bytecode_cache(dir):
+    """ The macro expanded plug-ins are cached as bytecode (`.pyc`), but Python can't write them for read-only
+        installations. In this case we use the user cache dir """
+    if getattr(sys, 'pycache_prefix', '') is not None or sys.dont_write_bytecode:
+        # Python < 3.8, or the user already selected a place, or disabled
+        return
+    pycache = os.path.join(dir, '__pycache__')
+    if os.access(pycache if os.path.isdir(pycache) else dir, os.W_OK):
+        return
+    sys.pycache_prefix = os.path.join(get_user_cache_dir(), 'pycache')
+    logger.debug('Using {} for the bytecode cache'.format(sys.pycache_prefix))
+
+
+def precompile_plugins():
+    """ Store the macro expanded bytecode for all the plug-ins.
+        Intended for packagers, so the users don't pay the expansion cost. """
+    if sys.dont_write_bytecode:
+        logger.error('Python was asked to not write bytecode (-B or PYTHONDONTWRITEBYTECODE)')
+        exit(EXIT_BAD_ARGS)
+    # Make sure the macros are expanded
+    from kibot.mcpyrate import activate
+    activate.activate()
+    n = 0
+    for dir in get_plugins_dirs():
+        for p in sorted(glob(os.path.join(dir, '*.py'))):
+            with open(p, 'rt') as f:
+                if 'import macros' not in f.read():
+                    continue
+            name = 'kibot.'+os.path.splitext(os.path.basename(p))[0]
+            logger.debug('- Compiling '+name)
+            # Remove the old bytecode, it could be compiled without expanding the macros (i.e. pip without --no-compile)
+            # and get_code() would just use it
+            try:
+                os.remove(cache_from_source(p))
+            except FileNotFoundError:
+                pass
+            # get_code() expands the macros, compiles and writes the cache
+            SourceFileLoader(name, p).get_code(name)
+            n += 1
+    logger.info('{} plug-ins precompiled'.format(n))
 
 
 def load_actions():
-    """ Load all the available outputs and preflights """
+    """ Load all the available outputs and preflights.
+        The plug-ins are imported on demand, we just create an index """
     global actions_loaded
     if actions_loaded:
         return
     actions_loaded = True
     try_register_deps(dep_downloader, 'global')
+    dirs = get_plugins_dirs()
+    set_bytecode_cache(dirs[0])
     from kibot.mcpyrate import activate
     # activate.activate()
-    _load_actions(os.path.abspath(os.path.dirname(__file__)), True)
-    home = os.environ.get('HOME')
-    if home:
-        dir = os.path.join(home, '.config', 'kiplot', 'plugins')
-        if os.path.isdir(dir):
-            _load_actions(dir)
-        dir = os.path.join(home, '.config', 'kibot', 'plugins')
-        if os.path.isdir(dir):
-            _load_actions(dir)
+    with profiler.phase('index plug-ins', 'run'):
+        _index_actions(dirs)
     # de_activate in old mcpy
     if 'deactivate' in activate.__dict__:
         logger.debug('Deactivating macros')
         activate.deactivate()
 
 
+def _index_actions(dirs):
+    index = load_plugins_index()
+    new_index = {}
+    modified = False
+    for c, dir in enumerate(dirs):
+        if os.path.isdir(dir):
+            dir_index = {k: v for k, v in index.items() if os.path.dirname(k) == dir}
+            modified |= _load_actions(dir, dir_index, c == 0)
+            new_index.update(dir_index)
+    if modified or len(new_index) != len(index):
+        save_plugins_index(new_index)
+
+
 def extract_errors(text):
     in_error = in_warning = False
     msg = ''
@@ -150,7 +315,8 @@ def debug_output(res):
 
 
 def _run_command(command, change_to):
-    return run(command, check=True, stdout=PIPE, stderr=STDOUT, cwd=change_to)
+    with profiler.phase(os.path.basename(command[0]), 'command', cmd=shlex.join(command)):
+        return run(command, check=True, stdout=PIPE, stderr=STDOUT, cwd=change_to)
 
 
 def run_command(command, change_to=None, just_raise=False, use_x11=False):
@@ -182,7 +348,8 @@ def exec_with_retry(cmd, exit_with=None):
         logger.debug('Command line: '+str(cmd))
     retry = 2
     while retry:
-        result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        with profiler.phase(os.path.basename(cmd[0]), 'command', cmd=cmd_str):
+            result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
         ret = result.returncode
         retry -= 1
         if ret != 16 and (ret > 0 and ret < 128 and retry):
@@ -210,7 +377,7 @@ def load_board(pcb_file=None, forced=False):
         GS.check_pcb()
         pcb_file = GS.pcb_file
     try:
-        with hide_stderr():
+        with hide_stderr(), profiler.phase('load_board', 'load'):
             board = pcbnew.LoadBoard(pcb_file)
         if GS.global_invalidate_pcb_text_cache == 'yes' and GS.ki6:
             logger.debug('Current PCB text variables cache: {}'.format(board.GetProperties().items()))
@@ -232,6 +399,8 @@ def load_board(pcb_file=None, forced=False):
                     dr.SetUnitsMode(forced_units)
                     dr.Update()
         GS.board = board
+        GS.board_loads += 1
+        GS.board_geometry += 1
     except OSError as e:
         logger.error('Error loading PCB file. Corrupted?')
         logger.error(e)
@@ -247,6 +416,11 @@ def ki_conf_error(e):
 
 
 def load_any_sch(file, project):
+    if sch_cache.enabled:
+        sch = sch_cache.load(file, project)
+        if sch is not None:
+            return sch
+        collector = sch_cache.start()
     if file[-9:] == 'kicad_sch':
         sch = SchematicV6()
         load_libs = False
@@ -259,6 +433,8 @@ def load_any_sch(file, project):
             sch.load_libs(file)
         if GS.debug_level > 1:
             logger.debug('Schematic dependencies: '+str(sch.get_files()))
+        if sch_cache.enabled:
+            sch_cache.store(file, project, sch, sch_cache.stop(collector))
     except SchFileError as e:
         GS.exit_with_error(('At line {} of `{}`: {}'.format(e.line, e.file, e.msg),
                             'Line content: `{}`'.format(e.code)), CORRUPTED_SCH)
@@ -266,6 +442,9 @@ def load_any_sch(file, project):
         GS.exit_with_error(('While loading `{}`'.format(file), str(e)), CORRUPTED_SCH)
     except KiConfError as e:
         ki_conf_error(e)
+    finally:
+        if sch_cache.enabled:
+            sch_cache.stop(collector)
     return sch
 
 
@@ -273,7 +452,30 @@ def load_sch():
     if GS.sch:  # Already loaded
         return
     GS.check_sch()
-    GS.sch = load_any_sch(GS.sch_file, GS.sch_basename)
+    with profiler.phase('load_sch', 'load'):
+        GS.sch = load_any_sch(GS.sch_file, GS.sch_basename)
+    GS.sch_loads += 1
+
+
+def get_footprints_data():
+    """ Information about the footprints, we collect it from the PCB only once.
+        Used by the BoM (get_board_comps_data) and the position output.
+        Outputs doesn't move the footprints or change their attributes, so we just invalidate it when the board is
+        loaded or changed (GS.board_geometry) """
+    global fps_data
+    global fps_data_geometry
+    if fps_data is not None and fps_data_geometry == GS.board_geometry:
+        return fps_data
+    with profiler.phase('footprints data', 'load'):
+        fps_data = []
+        for m in GS.get_modules():
+            center = GS.get_center(m)
+            w, h = GS.get_fp_size(m)
+            fps_data.append(FootprintData(m.GetReference(), m.GetValue(), str(m.GetFPID().GetLibItemName()),
+                                          m.GetAttributes(), m.IsFlipped(), m.GetOrientationDegrees(), center.x, center.y,
+                                          w, h))
+    fps_data_geometry = GS.board_geometry
+    return fps_data
 
 
 def get_board_comps_data(comps):
@@ -289,20 +491,20 @@ def get_board_comps_data(comps):
         cur_list = comps_hash.get(c.ref, [])
         cur_list.append(c)
         comps_hash[c.ref] = cur_list
-    for m in GS.get_modules():
-        ref = m.GetReference()
-        attrs = m.GetAttributes()
+    for m in get_footprints_data():
+        ref = m.ref
+        attrs = m.attrs
         if ref not in comps_hash:
             if not (attrs & MOD_BOARD_ONLY):
                 logger.warning(W_PCBNOSCH + '`{}` component in board, but not in schematic'.format(ref))
             continue
         for c in comps_hash[ref]:
-            c.bottom = m.IsFlipped()
-            c.footprint_rot = m.GetOrientationDegrees()
-            center = GS.get_center(m)
-            c.footprint_x = center.x
-            c.footprint_y = center.y
-            (c.footprint_w, c.footprint_h) = GS.get_fp_size(m)
+            c.bottom = m.bottom
+            c.footprint_rot = m.rot
+            c.footprint_x = m.x
+            c.footprint_y = m.y
+            c.footprint_w = m.w
+            c.footprint_h = m.h
             c.has_pcb_info = True
             if GS.ki5:
                 # KiCad 5
@@ -378,7 +580,8 @@ def config_output(out, dry=False, dont_stop=False):
             load_sch()
     ok = True
     try:
-        out.config(None)
+        with profiler.phase(out.name, 'config'):
+            out.config(None)
     except KiPlotConfigurationError as e:
         msg = "In section '"+out.name+"' ("+out.type+"): "+str(e)
         if dont_stop:
@@ -414,9 +617,29 @@ def run_output(out, dont_stop=False):
             pre.apply()
             load_board()
     GS.current_output = out.name
+    targets = None
+    if incremental.enabled or output_cache.enabled:
+        targets = out.get_targets(get_output_dir(out.dir, out, dry=True))
+    if incremental.enabled:
+        if incremental.is_up_to_date(out, targets):
+            logger.info('  - Up to date, skipping')
+            out._done = True
+            return
+        incremental.start(out)
+    if output_cache.enabled and output_cache.restore(out, targets):
+        logger.info('  - Restored from the cache')
+        out._done = True
+        if incremental.enabled:
+            incremental.done(out)
+        return
     try:
-        out.run(get_output_dir(out.dir, out))
+        with profiler.phase(out.name, 'output', type=out.type):
+            out.run(get_output_dir(out.dir, out))
         out._done = True
+        if incremental.enabled:
+            incremental.done(out)
+        if output_cache.enabled:
+            output_cache.store(out, targets)
     except PlotError as e:
         logger.error("In output `"+str(out)+"`: "+str(e))
         if not dont_stop:
@@ -452,7 +675,105 @@ def look_for_output(name, op_name, parent, valids):
     return out
 
 
-def _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority, dont_stop):
+def _run_output_forked(out, dont_stop, queue):
+    """ Runs an output in a child process and informs the result to the parent """
+    warn_cnt = log.MyLogger.warn_cnt
+    warn_tcnt = log.MyLogger.warn_tcnt
+    n_filtered = log.MyLogger.n_filtered
+    n_events = len(profiler.events)
+    from .out_base import VariantOptions
+    # The PCBs created by the parent belongs to the parent, we just remove the ones we create
+    VariantOptions._variant_boards_files = []
+    try:
+        run_output(out, dont_stop)
+    finally:
+        VariantOptions.remove_variant_boards()
+        queue.put((out.name, out._done, log.MyLogger.warn_cnt-warn_cnt, log.MyLogger.warn_tcnt-warn_tcnt,
+                   log.MyLogger.n_filtered-n_filtered, incremental.updated, profiler.events[n_events:]))
+
+
+def _run_outputs_parallel(targets, jobs, dont_stop):
+    """ Runs the outputs using up to `jobs` processes.
+        Each output runs in a forked process, so it has its own copy of the board.
+        Outputs that needs the results from other outputs wait for them.
+        The order of the targets is used to solve ties. """
+    from multiprocessing import get_context
+    from multiprocessing.connection import wait
+    ctx = get_context('fork')
+    queue = ctx.SimpleQueue()
+    names = {out.name for out in targets}
+    # Pending outputs and the outputs they need, in priority order
+    pending = []
+    for out in targets:
+        deps = set(out.get_output_dependencies()) & names
+        deps.discard(out.name)
+        logger.debug('Output `{}` needs {}'.format(out.name, sorted(deps) if deps else 'nothing'))
+        pending.append((out, deps))
+    finished = set()
+    running = {}
+    error = None
+
+    def collect_results():
+        nonlocal error
+        for sentinel in wait(list(running.keys())):
+            p, out = running.pop(sentinel)
+            p.join()
+            if p.exitcode and error is None and not dont_stop:
+                error = p.exitcode if p.exitcode > 0 else PLOT_ERROR
+            finished.add(out.name)
+        while not queue.empty():
+            name, done, warn_cnt, warn_tcnt, n_filtered, updated, events = queue.get()
+            RegOutput.get_output(name)._done = done
+            incremental.merge(updated)
+            profiler.events.extend(events)
+            log.MyLogger.warn_cnt += warn_cnt
+            log.MyLogger.warn_tcnt += warn_tcnt
+            log.MyLogger.n_filtered += n_filtered
+
+    while (pending and error is None) or running:
+        # Look for the first output that can be created now
+        # Outputs that must run alone wait until the running ones finish
+        ready = next((p for p in pending if p[1] <= finished and (not running or p[0]._parallel_safe)), None)
+        if ready is None and pending and not running:
+            # Circular dependency? just use the priority
+            ready = pending[0]
+        if ready is None or error is not None or len(running) >= jobs:
+            collect_results()
+            continue
+        pending.remove(ready)
+        out = ready[0]
+        logger.info('- '+str(out))
+        if not out._parallel_safe:
+            # Must be created alone, and we can do it here
+            logger.debug('Creating `{}` in the main process'.format(out.name))
+            try:
+                run_output(out, dont_stop)
+            except SystemExit as e:
+                error = e.code or PLOT_ERROR
+            finished.add(out.name)
+            continue
+        p = ctx.Process(target=_run_output_forked, args=(out, dont_stop, queue), name=out.name)
+        p.start()
+        running[p.sentinel] = (p, out)
+    if error is not None:
+        exit(error)
+
+
+def solve_jobs(jobs):
+    """ Validates the -j/--jobs value, 0 means one job for each CPU """
+    try:
+        n_jobs = int(jobs)
+    except (ValueError, TypeError):
+        n_jobs = -1
+    if n_jobs < 0:
+        logger.error('-j/--jobs must be a non-negative integer, 0 means all the CPUs ({})'.format(jobs))
+        exit(EXIT_BAD_ARGS)
+    if n_jobs == 0:
+        n_jobs = os.cpu_count() or 1
+    return n_jobs
+
+
+def _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority, dont_stop, jobs=1):
     logger.debug("Starting outputs for board {}".format(GS.pcb_file))
     # Make a list of target outputs
     n = len(targets)
@@ -504,12 +825,25 @@ def _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority
             targets = new_targets
     logger.debug('Outputs before preflights: {}'.format([t.name for t in targets]))
     # Run the preflights
-    preflight_checks(skip_pre, targets)
+    with profiler.phase('preflights', 'run'):
+        preflight_checks(skip_pre, targets)
     logger.debug('Outputs after preflights: {}'.format([t.name for t in targets]))
     if not cli_order and not no_priority:
         # Sort by priority
         targets = sorted(targets, key=lambda o: o.priority, reverse=True)
         logger.debug('Outputs after sorting: {}'.format([t.name for t in targets]))
+    if jobs > 1 and GS.on_windows:
+        logger.warning(W_NOPARALLEL+'Parallel generation of outputs is not supported on Windows')
+        jobs = 1
+    if jobs > 1 and GS.global_set_text_variables_before_output:
+        logger.warning(W_NOPARALLEL+'Parallel generation of outputs is incompatible with '
+                       '`set_text_variables_before_output`')
+        jobs = 1
+    if jobs > 1:
+        # Configure all the outputs, so the workers inherit the loaded PCB/SCH
+        targets = [out for out in targets if config_output(out, dont_stop=dont_stop)]
+        _run_outputs_parallel(targets, jobs, dont_stop)
+        return
     # Configure and run the outputs
     for out in targets:
         if config_output(out, dont_stop=dont_stop):
@@ -517,15 +851,20 @@ def _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority
             run_output(out, dont_stop)
 
 
-def generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority, dont_stop=False):
+def generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority, dont_stop=False, jobs=1):
     setup_resources()
     prj = None
     if GS.global_restore_project:
         # Memorize the project content to restore it at exit
         prj = GS.read_pro()
     try:
-        _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority, dont_stop)
+        _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority, dont_stop, jobs)
     finally:
+        # Memorize the outputs we generated
+        incremental.save()
+        # Remove the PCBs shared by the outputs
+        from .out_base import VariantOptions
+        VariantOptions.remove_variant_boards()
         # Restore the project file
         GS.write_pro(prj)
 
@@ -626,7 +965,8 @@ def generate_makefile(makefile, cfg_file, outputs, kibot_sys=False):
         if GS.pcb_file:
             f.write('PCB={}\n'.format(os.path.relpath(GS.pcb_file)))
         f.write('DEST={}\n'.format(os.path.relpath(GS.out_dir)))
-        f.write('KIBOT_CMD=$(KIBOT) $(DEBUG) -c $(CONFIG) -e $(SCH) -b $(PCB) -d $(DEST)\n')
+        f.write('KIBOT_CMD=$(KIBOT) $(DEBUG) -c $(CONFIG) -e $(SCH) -b $(PCB) -d $(DEST){}\n'.
+                format(' --sch-cache' if sch_cache.enabled else ''))
         f.write('LOGFILE?=kibot_error.log\n')
         f.write('\n')
         # Configure all outputs
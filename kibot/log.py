@@ -268,3 +268,29 @@ def set_file_log(fname):
 
 def remove_file_log(fh):
     root_logger.removeHandler(fh)
+
+
+class WarningsCollector(logging.Handler):
+    """ Collects the warnings, used by the caches to report them again """
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.msgs = []
+        self.errors = 0
+
+    def emit(self, record):
+        if record.levelno == logging.WARNING:
+            self.msgs.append(record.getMessage())
+        elif record.levelno > logging.WARNING:
+            self.errors += 1
+
+
+def start_collecting():
+    """ Start collecting the warnings """
+    collector = WarningsCollector()
+    logging.getLogger(domain).addHandler(collector)
+    return collector
+
+
+def stop_collecting(collector):
+    logging.getLogger(domain).removeHandler(collector)
+    return collector.msgs
@@ -543,6 +543,14 @@ class BaseOptions(Optionable):
         """ Set attributes from a PCB_PLOT_PARAMS (plot options) """
         return
 
+    def uses_sch_components(self):
+        """ True if the output reads the components from the schematic, and their data from the PCB """
+        return False
+
+    def get_3d_models(self):
+        """ 3D models used by the output, even the missing ones """
+        return []
+
     def ensure_tool(self, name):
         """ Looks for a mandatory dependency """
         return GS.check_tool_dep(self._parent.type, name, fatal=True)
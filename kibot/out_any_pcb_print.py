@@ -55,14 +55,13 @@ class Any_PCB_PrintOptions(VariantOptions):
     def filter_components(self):
         if not self.will_filter_pcb_components() and self.title == '':
             return GS.pcb_file
-        self.filter_pcb_components()
-        self.set_title(self.title)
-        # Save the PCB to a temporal dir
-        fname, pcb_dir = self.save_tmp_dir_board('pdf_pcb_print')
-        self.restore_title()
-        self.unfilter_pcb_components()
-        self._files_to_remove.append(pcb_dir)
-        return fname
+
+        def save():
+            # Save the PCB to a temporal dir
+            fname, pcb_dir = self.save_tmp_dir_board('pdf_pcb_print')
+            return fname, [pcb_dir]
+
+        return self.save_variant_board('dir', self.title, False, save)
 
     def get_targets(self, out_dir):
         return [self._parent.expand_filename(out_dir, self.output)]
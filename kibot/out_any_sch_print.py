@@ -4,7 +4,6 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 import os
-from tempfile import mkdtemp
 from .gs import GS
 from .out_base import VariantOptions
 from .macros import macros, document, output_class  # noqa: F401
@@ -41,15 +40,9 @@ class Any_SCH_PrintOptions(VariantOptions):
     def run(self, name):
         super().run(name)
         command = self.ensure_tool('KiAuto')
-        if self.title:
-            self.set_title(self.title, sch=True)
         if self._comps or self.title:
-            # Save it to a temporal dir
-            sch_dir = mkdtemp(prefix='tmp-kibot-'+self._expand_ext+'_sch_print-')
-            GS.copy_project_sch(sch_dir)
-            fname = GS.sch.save_variant(sch_dir)
-            sch_file = os.path.join(sch_dir, fname)
-            self._files_to_remove.append(sch_dir)
+            # Save it to a temporal dir, shared with other outputs using the same variant
+            sch_file = self.save_variant_sch(self.title)
         else:
             sch_file = GS.sch_file
         fmt = 'hpgl' if self._expand_ext == 'plt' else self._expand_ext
@@ -70,5 +63,3 @@ class Any_SCH_PrintOptions(VariantOptions):
             cmd.extend(['--hpgl_pen_size', str(self.pen_size)])
         cmd.extend([sch_file, os.path.dirname(name)])
         self.exec_with_retry(self.add_extra_options(cmd), self._exit_error)
-        if self.title:
-            self.restore_title(sch=True)
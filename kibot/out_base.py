@@ -97,6 +97,8 @@ class BaseOutput(RegOutput):
         self._unknown_is_error = True
         self._done = False
         self._category = None
+        # Outputs that can't be created while other outputs are running (i.e. git checkouts)
+        self._parallel_safe = True
 
     @staticmethod
     def attr2longopt(attr):
@@ -125,6 +127,11 @@ class BaseOutput(RegOutput):
             return [GS.sch_file]
         return [GS.pcb_file]
 
+    def get_output_dependencies(self):
+        """ Returns a list with the names of the outputs that must be created before this output.
+            Used to schedule the outputs when running in parallel """
+        return []
+
     def get_extension(self):
         return self.options._expand_ext
 
@@ -229,6 +236,12 @@ class BoMRegex(Optionable):
 
 class VariantOptions(BaseOptions):
     """ BaseOptions plus generic support for variants. """
+    # PCBs already saved with a variant applied, shared by all the outputs
+    _variant_boards = {}
+    _variant_boards_files = []
+    # Same for the schematics
+    _variant_schs = {}
+
     def __init__(self):
         with document:
             self.variant = ''
@@ -278,6 +291,11 @@ class VariantOptions(BaseOptions):
     def help_only_sub_pcbs(self):
         self.add_to_doc('variant', 'Used for sub-PCBs')
 
+    def uses_sch_components(self):
+        """ Variants and filters are applied to the components from the schematic, see run() """
+        return bool(self.variant or self.dnf_filter or self.pre_transform or
+                    not getattr(self, '_show_all_components', True))
+
     # Here just to avoid pulling pcbnew for this
     @staticmethod
     def to_mm(val):
@@ -841,6 +859,8 @@ class VariantOptions(BaseOptions):
                     data = old_value
                 self.sch_fields_to_pcb_bkp[ref] = data
         self._has_GetFPIDAsString = has_GetFPIDAsString
+        # The values and footprints changed
+        GS.board_geometry += 1
 
     def restore_sch_fields_to_pcb(self, board):
         """ Undo sch_fields_to_pcb() """
@@ -856,11 +876,10 @@ class VariantOptions(BaseOptions):
                         m.SetFPIDAsString(data[2])
                 else:
                     m.SetValue(data)
+        GS.board_geometry += 1
 
-    def save_tmp_board(self, dir=None):
-        """ Save the PCB to a temporal file.
-            Advantage: all relative paths inside the file remains valid
-            Disadvantage: the name of the file gets altered """
+    @staticmethod
+    def _save_tmp_board(dir=None):
         if dir is None:
             dir = GS.pcb_dir
         with NamedTemporaryFile(mode='w', suffix='.kicad_pcb', delete=False, dir=dir) as f:
@@ -868,22 +887,90 @@ class VariantOptions(BaseOptions):
         logger.debug('Storing modified PCB to `{}`'.format(fname))
         GS.board.Save(fname)
         GS.copy_project(fname)
-        self._files_to_remove.extend(GS.get_pcb_and_pro_names(fname))
+        return fname, GS.get_pcb_and_pro_names(fname)
+
+    def save_tmp_board(self, dir=None):
+        """ Save the PCB to a temporal file.
+            Advantage: all relative paths inside the file remains valid
+            Disadvantage: the name of the file gets altered """
+        fname, files = self._save_tmp_board(dir)
+        self._files_to_remove.extend(files)
         return fname
 
-    def save_tmp_board_if_variant(self, new_title='', dir=None, do_3D=False):
-        """ If we have a variant apply it and save the PCB to a file """
-        if not self.will_filter_pcb_components() and not new_title:
-            return GS.pcb_file
+    def get_variant_id(self):
+        """ Identifies the variant, sub-PCB variants (var[sub]) share the name of the variant """
+        if not self.variant:
+            return None
+        sub_pcb = self.variant._sub_pcb
+        return (self.variant.name, sub_pcb.name if sub_pcb else None)
+
+    def get_variant_board_key(self, kind, new_title, do_3D):
+        """ Things that affects the PCB we get after applying the variant """
+        return (GS.board_loads, kind, self.get_variant_id(),
+                getattr(self.dnf_filter, 'name', None), getattr(self.pre_transform, 'name', None),
+                getattr(self, 'hide_excluded', False), do_3D, self.expand_filename_pcb(new_title) if new_title else '')
+
+    def save_variant_board(self, kind, new_title, do_3D, save):
+        """ Applies the variant and saves the PCB using `save`.
+            The result is reused by other outputs asking for the same variant, filters and title """
+        key = self.get_variant_board_key(kind, new_title, do_3D)
+        fname = VariantOptions._variant_boards.get(key)
+        if fname is not None and os.path.isfile(fname):
+            logger.debug('- Reusing modified PCB: '+fname)
+            return fname
         logger.debug('Creating modified PCB')
         self.filter_pcb_components(do_3D=do_3D)
         self.set_title(new_title)
-        fname = self.save_tmp_board()
+        fname, files = save()
         self.restore_title()
         self.unfilter_pcb_components(do_3D=do_3D)
         logger.debug('- Modified PCB: '+fname)
+        VariantOptions._variant_boards[key] = fname
+        VariantOptions._variant_boards_files.extend(files)
         return fname
 
+    def get_variant_sch_key(self, new_title):
+        """ Things that affects the schematic we get after applying the variant """
+        return (GS.sch_loads, self.get_variant_id(), getattr(self.dnf_filter, 'name', None),
+                getattr(self.pre_transform, 'name', None), self.expand_filename_pcb(new_title) if new_title else '')
+
+    def save_variant_sch(self, new_title=''):
+        """ Saves the schematic, with the variant applied, to a temporal dir.
+            The result is reused by other outputs asking for the same variant, filters and title """
+        key = self.get_variant_sch_key(new_title)
+        sch_file = VariantOptions._variant_schs.get(key)
+        if sch_file is not None and os.path.isfile(sch_file):
+            logger.debug('- Reusing modified schematic: '+sch_file)
+            return sch_file
+        sch_dir = mkdtemp(prefix='tmp-kibot-variant_sch-')
+        VariantOptions._variant_boards_files.append(sch_dir)
+        self.set_title(new_title, sch=True)
+        GS.copy_project_sch(sch_dir)
+        fname = GS.sch.save_variant(sch_dir)
+        self.restore_title(sch=True)
+        sch_file = os.path.join(sch_dir, fname)
+        logger.debug('- Modified schematic: '+sch_file)
+        VariantOptions._variant_schs[key] = sch_file
+        return sch_file
+
+    @staticmethod
+    def remove_variant_boards():
+        """ Remove the PCBs and schematics created by save_variant_board() and save_variant_sch() """
+        for f in VariantOptions._variant_boards_files:
+            if os.path.isfile(f):
+                os.remove(f)
+            elif os.path.isdir(f):
+                rmtree(f)
+        VariantOptions._variant_boards = {}
+        VariantOptions._variant_schs = {}
+        VariantOptions._variant_boards_files = []
+
+    def save_tmp_board_if_variant(self, new_title='', dir=None, do_3D=False):
+        """ If we have a variant apply it and save the PCB to a file """
+        if not self.will_filter_pcb_components() and not new_title:
+            return GS.pcb_file
+        return self.save_variant_board('file', new_title, do_3D, self._save_tmp_board)
+
     @staticmethod
     def save_tmp_dir_board(id, force_dir=None):
         """ Save the PCB to a temporal dir.
@@ -71,9 +71,10 @@ def do_expand_env(fname, used_extra, extra_debug, lib_nickname):
         ind = fname.index(':')
         alias_name = fname[:ind]
         rest = fname[ind+1:]
-        if alias_name in KiConf.aliases_3D:
+        alias_3d = KiConf.get_lib_alias('3d', alias_name)
+        if alias_3d is not None:
             # Yes, replace the alias
-            fname = os.path.join(KiConf.aliases_3D[alias_name], rest)
+            fname = os.path.join(alias_3d, rest)
             # Make sure the name we created is what kicad2step gets
             force_used_extra = True
             if extra_debug:
@@ -91,8 +92,7 @@ def do_expand_env(fname, used_extra, extra_debug, lib_nickname):
             # Try relative to the footprint lib
             # This was introduced in 7.0.0, but it doesn't work for all things in 7.0.1.
             # I.e. You can't export a VRML when using this feature
-            aliases = KiConf.get_fp_lib_aliases()
-            lib_alias = aliases.get(lib_nickname)
+            lib_alias = KiConf.get_lib_alias('fp', lib_nickname)
             if lib_alias is not None:
                 full_name_lib = os.path.join(lib_alias.uri, fname)
                 if os.path.isfile(full_name_lib):
@@ -530,6 +530,10 @@ class Base3DOptions(VariantOptions):
                     models.add(full_name)
         return list(models)
 
+    def get_3d_models(self):
+        GS.load_board()
+        return self.list_models(even_missing=True)
+
     def filter_components(self, highlight=None, force_wrl=False):
         if not self._comps:
             # No filters, but we need to apply some stuff
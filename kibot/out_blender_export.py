@@ -499,6 +499,12 @@ class Blender_ExportOptions(BaseOptions):
             raise KiPlotConfigurationError('Missing '+pcb3d_file)
         return pcb3d_file
 
+    def get_3d_models(self):
+        if isinstance(self.pcb3d, str):
+            # Used by the output that creates the PCB3D file
+            return []
+        return self.pcb3d.get_3d_models()
+
     def run(self, output):
         if GS.ki5:
             logger.error("`blender_export` needs KiCad 6+")
@@ -621,6 +627,11 @@ class Blender_Export(Base3D):
             files.extend(self.options.pcb3d.list_models())
         return files
 
+    def get_output_dependencies(self):
+        if isinstance(self.options.pcb3d, str):
+            return [self.options.pcb3d]
+        return []
+
     def get_renderer_options(self):
         """ Where are the options for this output when used as a 'renderer' """
         ops = self.options
@@ -332,6 +332,9 @@ class BoMXLSX(BoMLinkable):
                 '_power', '_current', '_voltage', '_frequency', '_temp_coeff', '_manf', '_size' """
             self.logo_scale = 2
             """ Scaling factor for the logo. Note that this value isn't honored by all spreadsheet software """
+            self.constant_memory = False
+            """ Write each row as soon as it's generated (XlsxWriter constant memory mode).
+                Reduces the memory needed for big BoMs. Not used when `kicost` is enabled """
 
     def process_columns_config(self, cols):
         if isinstance(cols, type):
@@ -441,6 +444,10 @@ class BoMOptions(BaseOptions):
             self.variant = ''
             """ Board variant, used to determine which components
                 are output to the BoM. """
+            self.variants = Optionable
+            """ [string|list(string)] List of variants to generate in one run. The components are loaded and
+                grouped only once and we get one BoM for each variant. The `variant` option is ignored.
+                The `output` must contain %v or %V so each variant gets its own file """
             self.output = GS.def_global_output
             """ *filename for the output (%i=bom)"""
             self.format = ''
@@ -608,7 +615,9 @@ class BoMOptions(BaseOptions):
             self.variant.name = 'default'
             # Delegate any filter to the variant
             self.variant.set_def_filters(self.exclude_filter, self.dnf_filter, self.dnc_filter, self.pre_transform)
-            self.exclude_filter = self.dnf_filter = self.dnc_filter = self.pre_transform = None
+            if not self.variants:
+                # When using a list of variants this one isn't used, keep the filters for the real variants
+                self.exclude_filter = self.dnf_filter = self.dnc_filter = self.pre_transform = None
             self.variant.config(self)  # Fill or adjust any detail
 
     def process_columns_config(self, cols, valid_columns, extra_columns, add_all=True):
@@ -698,6 +707,9 @@ class BoMOptions(BaseOptions):
             self.xlsx.config(self)
         # Do title %X and ${var} expansions on the BoMLinkable titles
         # Here because some variables needs our parent
+        # When using a list of variants we expand them for each variant
+        self._html_titles = (self.html.title, self.html.extra_info) if self.format == 'html' else None
+        self._xlsx_titles = (self.xlsx.title, self.xlsx.extra_info) if self.format == 'xlsx' else None
         if self.format == 'html' and self.html.title:
             self.html.title = self.expand_filename_both(self.html.title, make_safe=False)
             self.html.extra_info = [self.expand_filename_both(t, make_safe=False) for t in self.html.extra_info]
@@ -728,7 +740,11 @@ class BoMOptions(BaseOptions):
         self.dnf_filter = BaseFilter.solve_filter(self.dnf_filter, 'dnf_filter')
         self.dnc_filter = BaseFilter.solve_filter(self.dnc_filter, 'dnc_filter')
         # Variants, make it an object
+        self.variants = [RegOutput.check_variant(v) for v in Optionable.force_list(self.variants)]
         self._normalize_variant()
+        if self.variants and '%v' not in self.output and '%V' not in self.output:
+            raise KiPlotConfigurationError("When using `variants` the `output` must contain %v or %V ({})".
+                                           format(self.output))
         # Field names are handled in lowercase
         self.fit_field = self.fit_field.lower()
         # Fields excluded from conflict warnings
@@ -736,9 +752,10 @@ class BoMOptions(BaseOptions):
         if isinstance(self.no_conflict, type):
             no_conflict.add(self.fit_field)
             no_conflict.add('part')
-            var_field = self.variant.get_variant_field()
-            if var_field is not None:
-                no_conflict.add(var_field)
+            for var in self.variants or [self.variant]:
+                var_field = var.get_variant_field()
+                if var_field is not None:
+                    no_conflict.add(var_field)
         else:
             for field in self.no_conflict:
                 no_conflict.add(field.lower())
@@ -874,6 +891,46 @@ class BoMOptions(BaseOptions):
             comps.extend(new_comps)
             prj.source = os.path.basename(prj.file)
 
+    def expand_titles(self):
+        """ Expand the titles again, used when we generate a BoM for each variant """
+        for titles, opts in ((self._html_titles, self.html), (self._xlsx_titles, self.xlsx)):
+            if titles and titles[0]:
+                opts.title = self.expand_filename_both(titles[0], make_safe=False)
+                opts.extra_info = [self.expand_filename_both(t, make_safe=False) for t in titles[1]]
+
+    def filter_components(self, comps):
+        """ Apply all the filters and the current variant """
+        reset_filters(comps)
+        if self.exclude_marked_in_sch:
+            for c in comps:
+                if c.included:
+                    c.included = c.in_bom
+        if self.exclude_marked_in_pcb:
+            for c in comps:
+                if c.included:
+                    c.included = c.in_bom_pcb
+        comps = apply_pre_transform(comps, self.pre_transform)
+        apply_exclude_filter(comps, self.exclude_filter)
+        apply_fitted_filter(comps, self.dnf_filter)
+        apply_fixed_filter(comps, self.dnc_filter)
+        # Apply the variant
+        comps = self.variant.filter(comps)
+        # Now expand the text variables, the user can disable it and insert a customized filter
+        # in the variant or even before.
+        if self.expand_text_vars:
+            comps = apply_pre_transform(comps, BaseFilter.solve_filter('_expand_text_vars', 'KiCad 6 text vars',
+                                                                       is_transform=True))
+        return comps
+
+    def write_bom(self, output, format, comps):
+        try:
+            do_bom(output, format, self.filter_components(comps), self)
+        except BoMError as e:
+            raise KiPlotConfigurationError(str(e))
+
+    def uses_sch_components(self):
+        return True
+
     def run(self, output):
         format = self.format.lower()
         if format == 'xlsx':
@@ -900,27 +957,6 @@ class BoMOptions(BaseOptions):
             c.ref_id = self.ref_id
         # Aggregate components from other projects
         self.aggregate_comps(comps)
-        # Apply all the filters
-        reset_filters(comps)
-        if self.exclude_marked_in_sch:
-            for c in comps:
-                if c.included:
-                    c.included = c.in_bom
-        if self.exclude_marked_in_pcb:
-            for c in comps:
-                if c.included:
-                    c.included = c.in_bom_pcb
-        comps = apply_pre_transform(comps, self.pre_transform)
-        apply_exclude_filter(comps, self.exclude_filter)
-        apply_fitted_filter(comps, self.dnf_filter)
-        apply_fixed_filter(comps, self.dnc_filter)
-        # Apply the variant
-        comps = self.variant.filter(comps)
-        # Now expand the text variables, the user can disable it and insert a customized filter
-        # in the variant or even before.
-        if self.expand_text_vars:
-            comps = apply_pre_transform(comps, BaseFilter.solve_filter('_expand_text_vars', 'KiCad 6 text vars',
-                                                                       is_transform=True))
         # We add the main project to the aggregate list so do_bom sees a complete list
         base_sch = Aggregate()
         base_sch.file = GS.sch_file
@@ -932,10 +968,25 @@ class BoMOptions(BaseOptions):
         # To translate project to ID
         if self.source_by_id:
             self.source_to_id = {prj.name: prj.ref_id for prj in self.aggregate}
-        try:
-            do_bom(output, format, comps, self)
-        except BoMError as e:
-            raise KiPlotConfigurationError(str(e))
+        if self.variants:
+            # One BoM for each variant, all of them using the same components.
+            # filter_components() resets the filters for each variant, this also restores the fields changed by the
+            # previous variant (i.e. KiCost VARIANT:FIELD renames), see back_up_fields().
+            # But transforms like rot_footprint also change the PCB data.
+            rotations = [c.footprint_rot for c in comps]
+            default_variant = self.variant
+            try:
+                for var, target in zip(self.variants, self.get_targets(self._parent.output_dir)):
+                    logger.debug('Generating the BoM for the `{}` variant'.format(var.name))
+                    self.variant = var
+                    for c, rot in zip(comps, rotations):
+                        c.footprint_rot = rot
+                    self.expand_titles()
+                    self.write_bom(target, format, comps)
+            finally:
+                self.variant = default_variant
+        else:
+            self.write_bom(output, format, comps)
         # Undo the reference prefix
         if self.ref_id:
             l_id = len(self.ref_id)
@@ -944,7 +995,15 @@ class BoMOptions(BaseOptions):
                 c.ref_id = ''
 
     def get_targets(self, out_dir):
-        return [self._parent.expand_filename(out_dir, self.output)]
+        if not self.variants:
+            return [self._parent.expand_filename(out_dir, self.output)]
+        targets = []
+        default_variant = self.variant
+        for var in self.variants:
+            self.variant = var
+            targets.append(self._parent.expand_filename(out_dir, self.output))
+        self.variant = default_variant
+        return targets
 
 
 @output_class
@@ -287,3 +287,6 @@ class Compress(BaseOutput):  # noqa: F821
 
     def get_dependencies(self):
         return self.options.get_dependencies()
+
+    def get_output_dependencies(self):
+        return [f.from_output for f in self.options.files if f.from_output]
@@ -269,6 +269,9 @@ class Copy_Files(BaseOutput):  # noqa: F821
     def get_dependencies(self):
         return self.options.get_dependencies()
 
+    def get_output_dependencies(self):
+        return [f.source for f in self.options.files if f.source_type == 'output']
+
     def run(self, output_dir):
         # No output member, just a dir
         self.options.output_dir = output_dir
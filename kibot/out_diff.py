@@ -605,6 +605,23 @@ class Diff(BaseOutput):  # noqa: F821
                 List of PCB layers to use. When empty all available layers are used.
                 Note that if you want to support adding/removing layers you should specify a list here """
 
+    def config(self, parent):
+        super().config(parent)
+        if not isinstance(self.options, type):
+            # The git operations could change the working tree
+            self._parallel_safe = 'git' not in (self.options.old_type, self.options.new_type)
+
+    def get_output_dependencies(self):
+        ops = self.options
+        deps = []
+        if ops.old_type == 'output':
+            deps.append(ops.old)
+        if ops.new_type == 'output':
+            deps.append(ops.new)
+        elif ops.new_type == 'multivar':
+            deps.extend(ops.new)
+        return deps
+
     @staticmethod
     def layer2dict(la):
         return {'layer': la.layer, 'suffix': la.suffix, 'description': la.description}
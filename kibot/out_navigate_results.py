@@ -531,6 +531,10 @@ class Navigate_Results(BaseOutput):  # noqa: F821
         # The help is inherited and already mentions the default priority
         self.fix_priority_help()
 
+    def get_output_dependencies(self):
+        # We link the files generated by all the other outputs
+        return [o.name for o in RegOutput.get_outputs() if o is not self]
+
     @staticmethod
     def get_conf_examples(name, layers):
         outs = BaseOutput.simple_conf_examples(name, 'Web page to browse the results', 'Browse')  # noqa: F821
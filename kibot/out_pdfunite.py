@@ -157,3 +157,8 @@ class PDFUnite(BaseOutput):  # noqa: F821
 
     def get_dependencies(self):
         return self.options.get_dependencies()
+
+    def get_output_dependencies(self):
+        if isinstance(self.options.outputs, type):
+            return []
+        return [f.from_output for f in self.options.outputs if f.from_output]
@@ -10,6 +10,7 @@ from re import compile
 from datetime import datetime
 from collections import OrderedDict
 from .gs import GS
+from .kiplot import get_footprints_data
 from .misc import UI_SMD, UI_VIRTUAL, MOD_THROUGH_HOLE, MOD_SMD, MOD_EXCLUDE_FROM_POS_FILES
 from .optionable import Optionable
 from .out_base import VariantOptions
@@ -196,20 +197,20 @@ class PositionOptions(VariantOptions):
             bothf.close()
 
     @staticmethod
-    def is_pure_smd_5(m):
-        return m.GetAttributes() == UI_SMD
+    def is_pure_smd_5(attrs):
+        return attrs == UI_SMD
 
     @staticmethod
-    def is_pure_smd_6(m):
-        return m.GetAttributes() & (MOD_THROUGH_HOLE | MOD_SMD | MOD_EXCLUDE_FROM_POS_FILES) == MOD_SMD
+    def is_pure_smd_6(attrs):
+        return attrs & (MOD_THROUGH_HOLE | MOD_SMD | MOD_EXCLUDE_FROM_POS_FILES) == MOD_SMD
 
     @staticmethod
-    def is_not_virtual_5(m):
-        return m.GetAttributes() != UI_VIRTUAL
+    def is_not_virtual_5(attrs):
+        return attrs != UI_VIRTUAL
 
     @staticmethod
-    def is_not_virtual_6(m):
-        return not (m.GetAttributes() & MOD_EXCLUDE_FROM_POS_FILES)
+    def is_not_virtual_6(attrs):
+        return not (attrs & MOD_EXCLUDE_FROM_POS_FILES)
 
     @staticmethod
     def get_attr_tests():
@@ -242,10 +243,13 @@ class PositionOptions(VariantOptions):
         if self.use_aux_axis_as_origin:
             (x_origin, y_origin) = GS.get_aux_origin()
             logger.debug('Using auxiliary origin: x={} y={}'.format(x_origin, y_origin))
-        for m in sorted(GS.get_modules(), key=lambda c: _ref_key(c.GetReference())):
-            ref = m.GetReference()
+        for m in sorted(get_footprints_data(), key=lambda c: _ref_key(c.ref)):
+            ref = m.ref
             logger.debug('P&P ref: {}'.format(ref))
             value = None
+            # Here we can't use c.footprint_x/y because this doesn't work for panels
+            center_x = m.x
+            center_y = m.y
             # Apply any filter or variant data
             if comps_hash:
                 c = comps_hash.get(ref, None)
@@ -257,20 +261,15 @@ class PositionOptions(VariantOptions):
                     footprint = c.footprint
                     is_bottom = c.bottom
                     rotation = c.footprint_rot
-                    # Here we can't use c.footprint_x/y because this doesn't work for panels
-                    center = GS.get_center(m)
-                    center_x = center.x
-                    center_y = center.y
             if value is None:
-                value = m.GetValue()
-                footprint = str(m.GetFPID().GetLibItemName())  # pcbnew.UTF8 type
-                is_bottom = m.IsFlipped()
-                rotation = m.GetOrientationDegrees()
-                center = GS.get_center(m)
-                center_x = center.x
-                center_y = center.y
+                value = m.value
+                footprint = m.package
+                is_bottom = m.bottom
+                rotation = m.rot
             # If passed check the position options
-            if (self.only_smd and is_pure_smd(m)) or (not self.only_smd and (is_not_virtual(m) or self.include_virtual)):
+            attrs = m.attrs
+            passed = is_pure_smd(attrs) if self.only_smd else is_not_virtual(attrs) or self.include_virtual
+            if passed:
                 # KiCad: PLACE_FILE_EXPORTER::GenPositionData() in export_footprints_placefile.cpp
                 row = []
                 if self.right_digits != 0:
@@ -299,7 +298,7 @@ class PositionOptions(VariantOptions):
                 modules.append(row)
                 modules_side.append(is_bottom)
             else:
-                logger.debug('- pure_smd: {} not_virtual {}'.format(is_pure_smd(m), is_not_virtual(m)))
+                logger.debug('- pure_smd: {} not_virtual {}'.format(is_pure_smd(attrs), is_not_virtual(attrs)))
         # Find max width for all columns
         maxlengths = []
         for col, name in enumerate(columns):
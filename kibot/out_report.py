@@ -40,6 +40,8 @@ EC_SMALL_OAR = GS.from_mm(0.125)
 # The minimum drill tool
 EC_MIN_DRILL = GS.from_mm(0.1)
 YES_NO = ['no', 'yes']
+# Outputs we link from the report
+LINKED_PRINTS = {'pdf_pcb_print', 'pcb_print', 'svg_pcb_print', 'pdf_sch_print', 'svg_sch_print'}
 
 
 def do_round(v, dig):
@@ -933,6 +935,10 @@ class Report(BaseOutput):  # noqa: F821
             """ *[dict] Options for the `report` output """
         self._category = 'PCB/docs'
 
+    def get_output_dependencies(self):
+        # We add links to the PCB and schematic prints
+        return [o.name for o in RegOutput.get_outputs() if o.type in LINKED_PRINTS]
+
     @staticmethod
     def get_conf_examples(name, layers):
         pandoc = GS.check_tool(name, 'PanDoc')
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Content addressed cache for the generated outputs (ccache style).
+Enabled using the KIBOT_CACHE_DIR environment variable, the size is limited by KIBOT_CACHE_SIZE.
+The key is the fingerprint used for incremental builds, so it depends on the content of the input files, the
+options, variants, filters and tools versions. For the 3D outputs it also depends on the 3D models.
+Each entry is a directory containing the targets and a `manifest.json` file. The modification time of the
+manifest is used to implement the LRU eviction.
+The entries are created in a temporal directory and then renamed. Temporal directories older than an hour are
+partial entries left by a crash.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from .gs import GS
+from .incremental import get_fingerprint
+from . import log
+
+logger = log.get_logger()
+ENTRY_MANIFEST = 'manifest.json'
+DEFAULT_SIZE = 5*1024*1024*1024
+SIZE_MULTS = {'K': 1024, 'M': 1024*1024, 'G': 1024*1024*1024}
+TMP_PREFIX = '.tmp'
+STALE_TMP = 3600
+cache_dir = os.environ.get('KIBOT_CACHE_DIR')
+enabled = bool(cache_dir)
+
+
+def get_max_size():
+    size = os.environ.get('KIBOT_CACHE_SIZE')
+    if not size:
+        return DEFAULT_SIZE
+    size = size.strip().upper().rstrip('B')
+    mult = SIZE_MULTS.get(size[-1:], 1)
+    if mult > 1:
+        size = size[:-1]
+    try:
+        return int(float(size)*mult)
+    except ValueError:
+        logger.warning('Wrong KIBOT_CACHE_SIZE value ({}), using the default'.format(os.environ['KIBOT_CACHE_SIZE']))
+        return DEFAULT_SIZE
+
+
+def get_entry_dir(key):
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def get_relative_targets(targets):
+    """ Targets relative to the output dir, None if we can't cache them """
+    if not targets:
+        return None
+    rel = []
+    for t in targets:
+        r = os.path.relpath(os.path.abspath(t), GS.out_dir)
+        if r.startswith('..') or os.path.isabs(r):
+            # Outside the output dir, we can't restore it in another place
+            return None
+        rel.append(r)
+    return rel
+
+
+def copy_item(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.isdir(src):
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+
+def restore(out, targets):
+    """ Copy the targets from the cache, returns True if we found them """
+    rel = get_relative_targets(targets)
+    if rel is None:
+        return False
+    key = get_fingerprint(out)
+    entry = get_entry_dir(key)
+    manifest = os.path.join(entry, ENTRY_MANIFEST)
+    try:
+        with open(manifest, 'rt') as f:
+            stored = json.load(f)['targets']
+    except (OSError, ValueError, KeyError):
+        logger.debug('Output `{}` not in the cache ({})'.format(out.name, key))
+        return False
+    if sorted(stored) != sorted(rel):
+        logger.debug('Cached targets for `{}` differ'.format(out.name))
+        return False
+    try:
+        for r in rel:
+            copy_item(os.path.join(entry, 'files', r), os.path.join(GS.out_dir, r))
+    except OSError as e:
+        logger.debug('Failed to restore `{}` from the cache: {}'.format(out.name, e))
+        return False
+    # Mark it as recently used
+    os.utime(manifest)
+    return True
+
+
+def store(out, targets):
+    """ Copy the targets to the cache """
+    rel = get_relative_targets(targets)
+    if rel is None:
+        return
+    if not all(os.path.exists(t) for t in targets):
+        logger.debug("Not caching `{}`, some targets weren't generated".format(out.name))
+        return
+    key = get_fingerprint(out)
+    entry = get_entry_dir(key)
+    if os.path.isfile(os.path.join(entry, ENTRY_MANIFEST)):
+        # Already there, just mark it as used
+        os.utime(os.path.join(entry, ENTRY_MANIFEST))
+        return
+    parent = os.path.dirname(entry)
+    tmp = None
+    try:
+        os.makedirs(parent, exist_ok=True)
+        # Create it in a temporal dir and then rename it, so other processes never see a partial entry
+        tmp = tempfile.mkdtemp(dir=parent, prefix=TMP_PREFIX)
+        for r in rel:
+            copy_item(os.path.join(GS.out_dir, r), os.path.join(tmp, 'files', r))
+        with open(os.path.join(tmp, ENTRY_MANIFEST), 'wt') as f:
+            json.dump({'output': out.name, 'type': out.type, 'targets': rel}, f, indent=2)
+        os.rename(tmp, entry)
+    except OSError as e:
+        logger.debug('Failed to cache `{}`: {}'.format(out.name, e))
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return
+    logger.debug('Output `{}` stored in the cache ({})'.format(out.name, key))
+    evict()
+
+
+def get_dir_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                size += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return size
+
+
+def remove_stale_tmp(tmp):
+    """ Remove a temporal entry left by a crash, the recent ones could belong to a running process """
+    try:
+        if time.time()-os.path.getmtime(tmp) < STALE_TMP:
+            return
+    except OSError:
+        return
+    logger.debug('Removing partial cache entry `{}`'.format(tmp))
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def evict():
+    """ Remove the least recently used entries until the cache fits in the maximum size """
+    max_size = get_max_size()
+    entries = []
+    total = 0
+    for sub in os.listdir(cache_dir):
+        sub_dir = os.path.join(cache_dir, sub)
+        if len(sub) != 2 or not os.path.isdir(sub_dir):
+            continue
+        for key in os.listdir(sub_dir):
+            entry = os.path.join(sub_dir, key)
+            if key.startswith(TMP_PREFIX):
+                remove_stale_tmp(entry)
+                continue
+            try:
+                used = os.path.getmtime(os.path.join(entry, ENTRY_MANIFEST))
+            except OSError:
+                # Temporal or broken entry
+                continue
+            size = get_dir_size(entry)
+            total += size
+            entries.append((used, size, entry))
+    if total <= max_size:
+        return
+    entries.sort()
+    for used, size, entry in entries:
+        logger.debug('Removing `{}` from the cache'.format(entry))
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        if total <= max_size:
+            break
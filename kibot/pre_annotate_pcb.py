@@ -224,6 +224,8 @@ class Annotate_PCB(BasePreFlight):  # noqa: F821
             else:
                 changes[old_ref] = m.new_ref_suffix
             m.footprint.SetReference(new_ref)
+        GS.board_loads += 1
+        GS.board_geometry += 1
         logger.debug('- Saving PCB')
         GS.make_bkp(GS.pcb_file)
         GS.board.Save(GS.pcb_file)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Time profiler (--profile).
+Records the wall and CPU time for the phases of the run (config load, plug-ins import, outputs configuration,
+PCB/SCH load, preflights, outputs and external commands).
+The result is a JSON file using the Chrome trace format (chrome://tracing or https://ui.perfetto.dev/).
+A summary is printed at the end of the run.
+
+Memory profiler (--mem-profile).
+Uses tracemalloc snapshots around each preflight and output to find the peak of Python allocations and the call
+sites that allocated more memory. Also reports the peak RSS, which includes the memory allocated by KiCad.
+"""
+import atexit
+from contextlib import contextmanager
+import json
+import os
+import sys
+from time import perf_counter
+from . import log
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+logger = log.get_logger()
+enabled = False
+mem_enabled = False
+file_name = None
+events = []
+# Phases where we take memory snapshots
+MEM_CATEGORIES = {'output', 'preflight'}
+MEM_TOP = 5
+MiB = 1024*1024
+
+
+def cpu_time():
+    """ CPU time for this process and the finished children """
+    t = os.times()
+    return t.user+t.system+t.children_user+t.children_system
+
+
+def start(fname, mem=False):
+    global enabled
+    global mem_enabled
+    global file_name
+    if mem:
+        import tracemalloc
+        tracemalloc.start()
+        mem_enabled = True
+    enabled = True
+    file_name = fname
+    atexit.register(write)
+
+
+def get_peak_rss():
+    if resource is None:
+        return None
+    # Linux reports KiB, macOS bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss*1024
+
+
+def take_snapshot():
+    import tracemalloc
+    # Skip the memory used by the snapshots and the profiler
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                      tracemalloc.Filter(False, __file__)))
+
+
+def mem_start():
+    import tracemalloc
+    if hasattr(tracemalloc, 'reset_peak'):
+        # Python 3.9+
+        tracemalloc.reset_peak()
+    return take_snapshot(), tracemalloc.get_traced_memory()[0]
+
+
+def mem_end(start, args):
+    """ Add the memory information for this phase """
+    import tracemalloc
+    snapshot, start_mem = start
+    current, peak = tracemalloc.get_traced_memory()
+    diff = take_snapshot().compare_to(snapshot, 'lineno')
+    # Peak over the memory already allocated when we started
+    args['mem_peak'] = max(peak-start_mem, 0)
+    args['mem_delta'] = sum(d.size_diff for d in diff)
+    args['rss_peak'] = get_peak_rss()
+    top = sorted(diff, key=lambda x: x.size_diff, reverse=True)[:MEM_TOP]
+    args['mem_top'] = ['{}:{} {:+.1f} KiB ({:+d} blocks)'.format(d.traceback[0].filename, d.traceback[0].lineno,
+                       d.size_diff/1024, d.count_diff) for d in top if d.size_diff > 0]
+    return current
+
+
+@contextmanager
+def phase(name, cat, **kwargs):
+    """ Context manager to measure a phase """
+    if not enabled:
+        yield
+        return
+    mem = mem_start() if mem_enabled and cat in MEM_CATEGORIES else None
+    wall = perf_counter()
+    cpu = cpu_time()
+    try:
+        yield
+    finally:
+        end = perf_counter()
+        args = {'cpu': round(cpu_time()-cpu, 6)}
+        args.update(kwargs)
+        pid = os.getpid()
+        events.append({'name': name, 'cat': cat, 'ph': 'X', 'ts': round(wall*1e6), 'dur': round((end-wall)*1e6),
+                       'pid': pid, 'tid': pid, 'args': args})
+        if mem is not None:
+            current = mem_end(mem, args)
+            # Also a counter, so the memory usage can be plotted
+            events.append({'name': 'memory', 'ph': 'C', 'ts': round(end*1e6), 'pid': pid,
+                           'args': {'python_mib': round(current/MiB, 3), 'rss_peak_mib': round(args['rss_peak']/MiB, 3)
+                                    if args['rss_peak'] else 0}})
+
+
+def summary():
+    """ Total time for each phase, sorted by wall time """
+    totals = {}
+    for e in events:
+        if e['ph'] != 'X':
+            continue
+        key = (e['cat'], e['name'])
+        calls, wall, cpu = totals.get(key, (0, 0, 0))
+        totals[key] = (calls+1, wall+e['dur']/1e6, cpu+e['args']['cpu'])
+    return sorted(((cat, name, calls, wall, cpu) for (cat, name), (calls, wall, cpu) in totals.items()),
+                  key=lambda x: x[3], reverse=True)
+
+
+def print_summary(rows):
+    w_cat = max([len(r[0]) for r in rows]+[8])
+    w_name = min(max([len(r[1]) for r in rows]+[5]), 50)
+    logger.info('Profile summary:')
+    logger.info('{:<{}}  {:<{}}  {:>5}  {:>9}  {:>9}'.format('Category', w_cat, 'Phase', w_name, 'Calls', 'Wall [s]',
+                                                             'CPU [s]'))
+    for cat, name, calls, wall, cpu in rows:
+        if len(name) > w_name:
+            name = name[:w_name-3]+'...'
+        logger.info('{:<{}}  {:<{}}  {:>5}  {:>9.3f}  {:>9.3f}'.format(cat, w_cat, name, w_name, calls, wall, cpu))
+
+
+def mem_summary():
+    """ Memory information for each preflight/output, sorted by peak """
+    rows = [{'category': e['cat'], 'name': e['name'], 'peak': e['args']['mem_peak'], 'delta': e['args']['mem_delta'],
+             'rss_peak': e['args']['rss_peak'], 'top': e['args']['mem_top']} for e in events if 'mem_peak' in e['args']]
+    return sorted(rows, key=lambda x: x['peak'], reverse=True)
+
+
+def print_mem_summary(rows):
+    w_name = min(max([len(r['name']) for r in rows]+[5]), 50)
+    logger.info('Memory summary:')
+    logger.info('{:<10}  {:<{}}  {:>10}  {:>10}  {:>10}  {}'.format('Category', 'Phase', w_name, 'Peak [MiB]',
+                'Delta[MiB]', 'RSS [MiB]', 'Top allocation'))
+    for r in rows:
+        name = r['name']
+        if len(name) > w_name:
+            name = name[:w_name-3]+'...'
+        logger.info('{:<10}  {:<{}}  {:>10.2f}  {:>10.2f}  {:>10}  {}'.format(
+                    r['category'], name, w_name, r['peak']/MiB, r['delta']/MiB,
+                    '{:.1f}'.format(r['rss_peak']/MiB) if r['rss_peak'] else '?', r['top'][0] if r['top'] else ''))
+    logger.info('Peak RSS for the main process: {:.1f} MiB'.format((get_peak_rss() or 0)/MiB))
+
+
+def write():
+    if not events:
+        return
+    rows = summary()
+    mem_rows = mem_summary() if mem_enabled else None
+    data = {'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'summary': [{'category': cat, 'name': name, 'calls': calls, 'wall': wall, 'cpu': cpu}
+                        for cat, name, calls, wall, cpu in rows]}
+    if mem_enabled:
+        data['memory'] = {'rss_peak': get_peak_rss(), 'phases': mem_rows}
+    if file_name:
+        try:
+            with open(file_name, 'wt') as f:
+                json.dump(data, f, indent=1)
+        except OSError as e:
+            logger.error('Unable to write the profile to `{}`: {}'.format(file_name, e))
+    print_summary(rows)
+    if mem_rows:
+        print_mem_summary(mem_rows)
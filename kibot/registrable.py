@@ -28,16 +28,30 @@ class Registrable(object):
     def register(cl, name, aclass):
         cl._registered[name] = aclass
 
+    @classmethod
+    def register_lazy(cl, name, loader):
+        """ Register a function that will register the class when needed """
+        cl._lazy[name] = loader
+
+    @classmethod
+    def _solve_lazy(cl, name):
+        loader = cl._lazy.pop(name, None)
+        if loader is not None:
+            loader()
+
     @classmethod
     def is_registered(cl, name):
-        return name in cl._registered
+        return name in cl._registered or name in cl._lazy
 
     @classmethod
     def get_class_for(cl, name):
+        cl._solve_lazy(name)
         return cl._registered[name]
 
     @classmethod
     def get_registered(cl):
+        for name in list(cl._lazy.keys()):
+            cl._solve_lazy(name)
         return cl._registered
 
     def __str__(self):
@@ -49,6 +63,7 @@ class RegOutput(Optionable, Registrable):
         Used by BaseOutput.
         Here because it doesn't need macros. """
     _registered = {}
+    _lazy = {}
     # Defined filters
     _def_filters = {}
     # Defined variants
@@ -106,6 +121,10 @@ class RegOutput(Optionable, Registrable):
     def add_filters(filters):
         RegOutput._def_filters.update(filters)
 
+    @staticmethod
+    def get_filters():
+        return RegOutput._def_filters
+
     @staticmethod
     def is_filter(name):
         return name in RegOutput._def_filters
@@ -211,6 +230,7 @@ class RegVariant(Optionable, Registrable):
         Used by BaseVariant.
         Here because it doesn't need macros. """
     _registered = {}
+    _lazy = {}
 
     def __init__(self):
         super().__init__()
@@ -221,6 +241,7 @@ class RegFilter(Optionable, Registrable):
         Used by BaseFilter.
         Here because it doesn't need macros. """
     _registered = {}
+    _lazy = {}
 
     def __init__(self):
         super().__init__()
@@ -229,6 +250,7 @@ class RegFilter(Optionable, Registrable):
 class RegDependency(Registrable):
     """ Used to register output tools dependencies """
     _registered = {}
+    _lazy = {}
 
     def __init__(self):
         super().__init__()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Cache for the loaded schematics (--sch-cache).
+Loading a big schematic is slow, and when using a Makefile each target runs in its own KiBot process, so the same
+schematic is loaded again and again.
+We store the loaded schematic using pickle in `~/.cache/kibot/sch/`. The entry is valid if these didn't change:
+- KiBot, KiCad and Python versions
+- Content and modification time of all the files used to load the schematic: sheets, project and, for KiCad 5,
+  the libraries and the libraries tables
+- Global options and KiCad environment variables
+The warnings generated during the load are stored and reported again when we use the cache.
+"""
+from hashlib import sha256
+import json
+import os
+import pickle
+import sys
+from .gs import GS
+from .kicad.config import KiConf, SYM_LIB_TABLE
+from .kicad.v6_sch import SchematicV6
+from .kicad import v6_sch
+from .incremental import hash_file
+from . import log
+
+logger = log.get_logger()
+CACHE_VERSION = 2
+# Enabled from the command line
+enabled = False
+
+
+def get_cache_name(fname, project):
+    from .kiplot import get_user_cache_dir
+    key = sha256(json.dumps([os.path.abspath(fname), project]).encode()).hexdigest()
+    return os.path.join(get_user_cache_dir(), 'sch', key+'.pickle')
+
+
+def get_dependencies(sch, fname):
+    """ All the files used to load the schematic. We include missing files that could change the result """
+    files = set(sch.get_files())
+    base = os.path.splitext(fname)[0]
+    files.add(base+('.kicad_pro' if isinstance(sch, SchematicV6) else '.pro'))
+    if not isinstance(sch, SchematicV6):
+        # KiCad 5: the libraries are loaded from the files pointed by the libs tables
+        for lib in sch.libs.values():
+            if lib:
+                files.add(lib)
+                files.add(os.path.splitext(lib)[0]+'.dcm')
+        files.add(fname.replace('.sch', '-cache.lib'))
+        if KiConf.dirname:
+            files.add(os.path.join(KiConf.dirname, SYM_LIB_TABLE))
+        for d in (KiConf.config_dir, KiConf.kicad_env.get('KICAD_CONFIG_HOME'), KiConf.kicad_env.get('KICAD_TEMPLATE_DIR')):
+            if d:
+                files.add(os.path.join(d, SYM_LIB_TABLE))
+    return sorted(os.path.abspath(f) for f in files)
+
+
+def get_mtime(fname):
+    try:
+        return os.path.getmtime(fname)
+    except OSError:
+        return None
+
+
+def get_key(files):
+    # The modification time is included because it's used when the title block doesn't have a date
+    data = {'version': CACHE_VERSION,
+            'kibot': GS.kibot_version,
+            'kicad': GS.kicad_version,
+            'python': sys.version,
+            'globals': GS.globals_tree,
+            'cli_globals': GS.cli_global_defs,
+            'env': {k: v for k, v in os.environ.items() if k.startswith('KICAD')},
+            'files': {f: (hash_file(f), get_mtime(f)) for f in files}}
+    return sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load(fname, project):
+    """ Returns the schematic from the cache, None if we don't have a valid entry """
+    cache_name = get_cache_name(fname, project)
+    try:
+        with open(cache_name, 'rb') as f:
+            # The first object is the metadata, so we can check it before loading the schematic
+            meta = pickle.load(f)
+            if meta.get('key') != get_key(meta['files']):
+                logger.debug('Cached schematic for `{}` is outdated'.format(fname))
+                return None
+            sch = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Any problem unpickling means we just load the schematic
+        logger.debug('Discarding the cached schematic for `{}`: {}'.format(fname, e))
+        return None
+    logger.debug('Schematic `{}` loaded from the cache'.format(fname))
+    if isinstance(sch, SchematicV6):
+        v6_sch.version = sch.version
+    for msg in meta['warnings']:
+        logger.warning(msg)
+    return sch
+
+
+def start():
+    """ Start collecting the warnings """
+    return log.start_collecting()
+
+
+def stop(collector):
+    return log.stop_collecting(collector)
+
+
+def store(fname, project, sch, warnings):
+    cache_name = get_cache_name(fname, project)
+    files = get_dependencies(sch, fname)
+    meta = {'key': get_key(files), 'files': files, 'warnings': warnings}
+    tmp_name = cache_name+'.{}.tmp'.format(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+        with open(tmp_name, 'wb') as f:
+            pickle.dump(meta, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(sch, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, cache_name)
+    except (OSError, pickle.PicklingError, RecursionError, TypeError, AttributeError) as e:
+        logger.debug('Failed to cache the schematic `{}`: {}'.format(fname, e))
+        if os.path.isfile(tmp_name):
+            os.remove(tmp_name)
+        return
+    logger.debug('Schematic `{}` stored in the cache'.format(fname))
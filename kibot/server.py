@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Server mode (--serve).
+We load the PCB, the schematic and the configuration once and then wait for jobs using a Unix socket.
+Each job is a JSON object in one line, i.e.:
+  {"targets": ["gerbers"], "variant": "production", "out_dir": "fab"}
+Supported keys: targets, variant, out_dir, skip_pre, invert, dont_stop and jobs.
+Each job runs in a forked process, so the loaded data is never altered by the outputs. The messages are sent to
+the client and the last line is `exit: N`, where N is the exit code.
+The files are reloaded when their modification time changes.
+"""
+from datetime import datetime
+import json
+import os
+import socket
+import sys
+from .gs import GS
+from .registrable import RegOutput
+from .pre_base import BasePreFlight
+from .misc import EXIT_BAD_ARGS
+from .error import KiPlotConfigurationError
+from .kiplot import load_board, load_sch, config_output, generate_outputs, solve_jobs
+from . import log
+
+logger = log.get_logger()
+
+
+def exit_code(e):
+    """ The exit code for a SystemExit exception, like the Python interpreter: None is 0 and a message is 1 """
+    if e.code is None:
+        return 0
+    return e.code if isinstance(e.code, int) else 1
+
+
+class KiBotServer(object):
+    def __init__(self, socket_name, plot_config, read_config):
+        self.socket_name = socket_name
+        self.plot_config = plot_config
+        self.read_config = read_config
+        self.mtimes = {}
+
+    @staticmethod
+    def get_mtime(fname):
+        try:
+            return os.path.getmtime(fname)
+        except OSError:
+            return None
+
+    def watched_files(self, kind):
+        if kind == 'config':
+            return [self.plot_config]
+        if kind == 'pcb':
+            return [GS.pcb_file] if GS.pcb_file else []
+        if GS.sch:
+            return GS.sch.get_files()
+        return [GS.sch_file] if GS.sch_file else []
+
+    def memorize_mtimes(self):
+        for kind in ('config', 'pcb', 'sch'):
+            self.mtimes[kind] = {f: self.get_mtime(f) for f in self.watched_files(kind)}
+
+    def changed(self, kind):
+        return any(self.get_mtime(f) != t for f, t in self.mtimes[kind].items())
+
+    def load(self):
+        """ Load the configuration, PCB and schematic, and configure the outputs """
+        GS.board = None
+        GS.sch = None
+        RegOutput.reset()
+        BasePreFlight.reset()
+        self.outputs = self.read_config(self.plot_config)
+        self.configure()
+
+    def configure(self):
+        if GS.pcb_file:
+            load_board()
+        if GS.sch_file:
+            load_sch()
+        for out in RegOutput.get_outputs():
+            out._configured = False
+            # Errors are reported again when the output is used
+            try:
+                config_output(out, dont_stop=True)
+            except SystemExit:
+                pass
+        self.memorize_mtimes()
+
+    def reload(self):
+        """ Reload anything that changed since the last job """
+        if self.changed('config'):
+            logger.info('Configuration changed, reloading')
+            self.load()
+            return
+        reconfig = False
+        if self.changed('pcb'):
+            logger.info('PCB changed, reloading')
+            load_board(forced=True)
+            reconfig = True
+        if self.changed('sch'):
+            logger.info('Schematic changed, reloading')
+            GS.sch = None
+            reconfig = True
+        if reconfig:
+            self.configure()
+
+    def run_job(self, req):
+        """ Runs in the forked process """
+        GS.n = datetime.now()
+        out_dir = req.get('out_dir')
+        if out_dir:
+            GS.out_dir = os.path.join(os.getcwd(), out_dir)
+        variant = req.get('variant')
+        if variant:
+            try:
+                GS.global_variant = variant
+                GS.solved_global_variant = RegOutput.check_variant(variant)
+            except KiPlotConfigurationError as e:
+                logger.error(str(e))
+                return EXIT_BAD_ARGS
+        targets = req.get('targets', [])
+        if isinstance(targets, str):
+            targets = [targets]
+        try:
+            GS.jobs = solve_jobs(req.get('jobs', 1))
+            generate_outputs(self.outputs, targets, req.get('invert', False), req.get('skip_pre'), False, False,
+                             dont_stop=req.get('dont_stop', False), jobs=GS.jobs)
+        except SystemExit as e:
+            return exit_code(e)
+        logger.log_totals()
+        return 0
+
+    def fork_job(self, conn, req):
+        pid = os.fork()
+        if pid == 0:
+            # Child: send the messages to the client
+            ret = 1
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.dup2(conn.fileno(), 1)
+                os.dup2(conn.fileno(), 2)
+                ret = self.run_job(req)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(ret)
+        _, status = os.waitpid(pid, 0)
+        return os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+
+    def serve_client(self, conn):
+        with conn, conn.makefile('rb') as f:
+            line = f.readline()
+            try:
+                req = json.loads(line.decode() or '{}')
+                if not isinstance(req, dict):
+                    raise ValueError('expected a JSON object')
+            except ValueError as e:
+                logger.error('Malformed job `{}`: {}'.format(line, e))
+                conn.sendall('Malformed job: {}\nexit: {}\n'.format(e, EXIT_BAD_ARGS).encode())
+                return
+            logger.debug('New job: {}'.format(req))
+            try:
+                self.reload()
+            except SystemExit as e:
+                # Errors loading the files, we will try again for the next job
+                ret = exit_code(e)
+                conn.sendall('Failed to load the project files, see the server log\nexit: {}\n'.format(ret).encode())
+                return
+            ret = self.fork_job(conn, req)
+            logger.info('Job {} finished with exit code {}'.format(req, ret))
+            conn.sendall('exit: {}\n'.format(ret).encode())
+
+    def serve(self):
+        self.load()
+        if os.path.exists(self.socket_name):
+            os.remove(self.socket_name)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.bind(self.socket_name)
+            s.listen()
+            logger.info('Waiting for jobs at `{}`'.format(self.socket_name))
+            try:
+                while True:
+                    conn, _ = s.accept()
+                    try:
+                        self.serve_client(conn)
+                    except OSError as e:
+                        logger.error('Connection error: {}'.format(e))
+            except KeyboardInterrupt:
+                logger.info('Exiting')
+            finally:
+                os.remove(self.socket_name)
+
+
+def serve(socket_name, plot_config, read_config):
+    if GS.on_windows:
+        logger.error('The server mode is not supported on Windows')
+        sys.exit(EXIT_BAD_ARGS)
+    KiBotServer(socket_name, plot_config, read_config).serve()
@@ -307,6 +307,8 @@ class SubPCBOptions(PanelOptions):
     def apply(self, comps_hash):
         """ Apply the sub-PCB selection. """
         self._excl_by_sub_pcb = set()
+        # The changes are temporal, revert() restores the board, so the PCB is the same for the variants key
+        self._board_loads = GS.board_loads
         if self.tool == 'internal':
             if self.reference:
                 # Get the rectangle containing the board edge pointed by the reference
@@ -319,6 +321,7 @@ class SubPCBOptions(PanelOptions):
         else:
             # Using KiKit:
             self.separate_board(comps_hash)
+        GS.board_geometry += 1
 
     def unload_board(self, comps_hash):
         # Undo the sub-PCB: just reload the PCB
@@ -347,6 +350,8 @@ class SubPCBOptions(PanelOptions):
         logger.debug('Restoring components outside the sub-PCB')
         for c in self._excl_by_sub_pcb:
             comps_hash[c].included = True
+        GS.board_loads = self._board_loads
+        GS.board_geometry += 1
 
 
 class BaseVariant(RegVariant):
@@ -1077,6 +1077,23 @@ def test_int_bom_simple_xlsx_2(test_dir):
     ctx.clean_up()
 
 
+def test_int_bom_simple_xlsx_cm(test_dir):
+    """ Constant memory mode, the rows are written in order """
+    prj = 'kibom-test'
+    ext = 'xlsx'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_simple_xlsx_cm', BOM_DIR)
+    ctx.run()
+    out = prj + '-bom.' + ext
+    rows, header, sh_head = ctx.load_xlsx(out)
+    check_head_xlsx(sh_head, KIBOM_PRJ_INFO, KIBOM_STATS)
+    assert header == KIBOM_TEST_HEAD
+    ref_column = header.index(REF_COLUMN_NAME)
+    status_column = header.index(STATUS_COLUMN_NAME)
+    check_kibom_test_netlist(rows, ref_column, KIBOM_TEST_GROUPS, KIBOM_TEST_EXCLUDE, KIBOM_TEST_COMPONENTS)
+    check_dnc(rows, 'R7', ref_column, status_column)
+    ctx.clean_up()
+
+
 def test_int_bom_simple_xlsx_3(test_dir):
     """ No logo """
     prj = 'kibom-test'
@@ -1310,6 +1327,36 @@ def test_int_bom_variant_t1(test_dir):
     ctx.clean_up()
 
 
+def test_int_bom_variant_t1_multi(test_dir):
+    """ All the variants from one output, the components are loaded only once """
+    prj = 'kibom-variante'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_var_t1_multi_csv', BOM_DIR)
+    ctx.run()
+    ctx.dont_expect_out_file(os.path.join(BOM_DIR, prj+'-bom.csv'))
+    # V1
+    rows, header, info = ctx.load_csv(prj+'-bom_(V1).csv')
+    ref_column = header.index(REF_COLUMN_NAME)
+    check_kibom_test_netlist(rows, ref_column, 2, ['R3', 'R4'], ['R1', 'R2'])
+    VARIANTE_PRJ_INFO[1] = 't1_v1'
+    check_csv_info(info, VARIANTE_PRJ_INFO, [4, 20, 2, 1, 2])
+    # V2
+    rows, header, info = ctx.load_csv(prj+'-bom_(V2).csv')
+    check_kibom_test_netlist(rows, ref_column, 1, ['R2', 'R4'], ['R1', 'R3'])
+    VARIANTE_PRJ_INFO[1] = 't1_v2'
+    check_csv_info(info, VARIANTE_PRJ_INFO, [3, 20, 2, 1, 2])
+    # V3
+    rows, header, info = ctx.load_csv(prj+'-bom_V3.csv')
+    check_kibom_test_netlist(rows, ref_column, 1, ['R2', 'R3'], ['R1', 'R4'])
+    VARIANTE_PRJ_INFO[1] = 't1_v3'
+    check_csv_info(info, VARIANTE_PRJ_INFO, [3, 20, 2, 1, 2])
+    # V1,V3
+    rows, header, info = ctx.load_csv(prj+'-bom_bla_bla.csv')
+    check_kibom_test_netlist(rows, ref_column, 1, ['R2', 'R3'], ['R1', 'R4'])
+    VARIANTE_PRJ_INFO[1] = 'bla bla'
+    check_csv_info(info, VARIANTE_PRJ_INFO, [3, 20, 2, 1, 2])
+    ctx.clean_up()
+
+
 def check_value(rows, r_col, ref, v_col, val):
     for r in rows:
         refs = r[r_col].split(' ')
@@ -1453,6 +1500,28 @@ def test_int_bom_variant_t2kf(test_dir):
     ctx.clean_up()
 
 
+def test_int_bom_variant_t2k_multi(test_dir):
+    """ KiCost variants, all from one output.
+        The `test` variant changes the R1 value and the C1 DNP field (also changed by `default`).
+        The changes must not leak to the other variants, we must get the same result we get using one output for
+        each variant (test_int_bom_variant_t2kf). """
+    prj = 'kibom-variant_kicost'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_var_t2k_multi_csv', BOM_DIR)
+    ctx.run()
+    rows, header, info = ctx.load_csv(prj+'-bom_(test).csv')
+    ref_column = header.index(REF_COLUMN_NAME)
+    val_column = header.index(VALUE_COLUMN_NAME)
+    check_kibom_test_netlist(rows, ref_column, 2, ['R2'], ['R1', 'C1', 'C2'])
+    check_value(rows, ref_column, 'R1', val_column, '3k3')
+    rows, header, info = ctx.load_csv(prj+'-bom_(production).csv')
+    check_kibom_test_netlist(rows, ref_column, 2, ['C1'], ['R1', 'R2', 'C2'])
+    check_value(rows, ref_column, 'R1', val_column, '1k')
+    rows, header, info = ctx.load_csv(prj+'-bom.csv')
+    check_kibom_test_netlist(rows, ref_column, 1, ['C1', 'C2'], ['R1', 'R2'])
+    check_value(rows, ref_column, 'R1', val_column, '1k')
+    ctx.clean_up()
+
+
 def test_int_bom_wrong_variant(test_dir):
     ctx = context.TestContextSCH(test_dir, 'links', 'int_bom_wrong_variant', '')
     ctx.run(EXIT_BAD_CONFIG)
@@ -23,6 +23,11 @@ Tests miscellaneous stuff.
   - already exists
   - Copying
 - Load plugin
+- --precompile
+- --serve
+  - Jobs
+  - Configuration reload
+  - Malformed jobs
 
 For debug information use:
 pytest-3 --log-cli-level debug
@@ -35,9 +40,11 @@ import logging
 import pytest
 import subprocess
 import json
+import socket
+import sys
 from . import context
 from kibot.misc import (EXIT_BAD_ARGS, EXIT_BAD_CONFIG, NO_PCB_FILE, NO_SCH_FILE, EXAMPLE_CFG, WONT_OVERWRITE, CORRUPTED_PCB,
-                        PCBDRAW_ERR, NO_PCBNEW_MODULE, NO_YAML_MODULE, INTERNAL_ERROR, MISSING_FILES)
+                        PCBDRAW_ERR, NO_PCBNEW_MODULE, NO_YAML_MODULE, INTERNAL_ERROR, MISSING_FILES, WRONG_INSTALL)
 
 
 POS_DIR = 'positiondir'
@@ -963,6 +970,164 @@ def test_cli_order(test_dir):
     ctx.clean_up()
 
 
+def test_parallel_1(test_dir):
+    prj = 'simple_2layer'
+    ctx = context.TestContext(test_dir, prj, 'pre_and_position', POS_DIR)
+    ctx.run(extra=['-s', 'all', '-j', '2'])
+    ctx.expect_out_file(ctx.get_pos_both_csv_filename())
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    ctx.clean_up()
+
+
+def test_parallel_wrong_jobs(test_dir):
+    prj = 'simple_2layer'
+    ctx = context.TestContext(test_dir, prj, 'pre_and_position', POS_DIR)
+    ctx.run(EXIT_BAD_ARGS, extra=['-s', 'all', '-j', 'many'])
+    assert ctx.search_err('-j/--jobs must be a non-negative integer')
+    ctx.clean_up()
+
+
+def test_incremental_1(test_dir):
+    prj = 'simple_2layer'
+    ctx = context.TestContext(test_dir, prj, 'pre_and_position', POS_DIR)
+    ctx.run(extra=['-s', 'all', '-I'])
+    ctx.expect_out_file(ctx.get_pos_both_csv_filename())
+    ctx.expect_out_file('.kibot_manifest.json')
+    assert 'Up to date' not in ctx.out
+    # Nothing changed, must be skipped
+    ctx.run(extra=['-s', 'all', '-I'])
+    assert ctx.search_out('Up to date, skipping')
+    # A missing target forces the generation
+    os.remove(ctx.get_out_path(ctx.get_pos_both_csv_filename()))
+    ctx.run(extra=['-s', 'all', '-I'])
+    ctx.expect_out_file(ctx.get_pos_both_csv_filename())
+    ctx.clean_up()
+
+
+def up_to_date(ctx, name):
+    return re.search(r'\({}\) \[\w+\]\n\s+- Up to date, skipping'.format(name), ctx.out) is not None
+
+
+def test_incremental_2(test_dir):
+    """ PCB outputs using filters depend on the schematic, the BoM depends on the PCB """
+    prj = 'test_v5'
+    ctx = context.TestContext(test_dir, prj, 'incremental_variant', POS_DIR)
+    # Copy the project, we will change it
+    for f in [prj+'.kicad_pcb', prj+context.KICAD_SCH_EXT, 'sub-sheet'+context.KICAD_SCH_EXT,
+              'deeper'+context.KICAD_SCH_EXT]:
+        shutil.copy2(os.path.join(ctx.get_board_dir(), f), ctx.get_out_path(f))
+    pcb = ctx.get_out_path(prj+'.kicad_pcb')
+    extra = ['-b', pcb, '-e', ctx.get_out_path(prj+context.KICAD_SCH_EXT), '-I']
+    ctx.run(extra=extra, no_board_file=True)
+    assert 'Up to date' not in ctx.out
+    # Nothing changed, must be skipped
+    ctx.run(extra=extra, no_board_file=True)
+    assert up_to_date(ctx, 'pos_plain') and up_to_date(ctx, 'pos_dnf') and up_to_date(ctx, 'bom')
+    # A sub-sheet changed, the outputs reading the schematic components must be generated
+    with open(ctx.get_out_path('sub-sheet'+context.KICAD_SCH_EXT), 'at') as f:
+        f.write('\n')
+    ctx.run(extra=extra, no_board_file=True)
+    assert up_to_date(ctx, 'pos_plain')
+    assert not up_to_date(ctx, 'pos_dnf')
+    assert not up_to_date(ctx, 'bom')
+    # The PCB changed, the BoM must be generated
+    with open(pcb, 'at') as f:
+        f.write('\n')
+    ctx.run(extra=extra, no_board_file=True)
+    assert not up_to_date(ctx, 'bom')
+    ctx.clean_up()
+
+
+def test_profile_1(test_dir):
+    prj = 'simple_2layer'
+    ctx = context.TestContext(test_dir, prj, 'pre_and_position', POS_DIR)
+    ctx.run(extra=['-s', 'all', '--profile', ctx.get_out_path('profile.json')])
+    ctx.expect_out_file('profile.json')
+    with open(ctx.get_out_path('profile.json'), 'rt') as f:
+        data = json.load(f)
+    outs = {e['name'] for e in data['traceEvents'] if e['cat'] == 'output'}
+    assert outs == {'pos_ascii', 'position'}
+    assert ctx.search_out('Profile summary')
+    ctx.clean_up()
+
+
+def test_sch_cache_1(test_dir, monkeypatch):
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_csv_no_info', 'BoM')
+    monkeypatch.setenv('XDG_CACHE_HOME', ctx.get_out_path('cache'))
+    ctx.run(extra=['--sch-cache'])
+    ctx.expect_out_file_d(prj+'-bom.csv')
+    assert ctx.search_err('stored in the cache')
+    # Nothing changed, must use the cache
+    ctx.run(extra=['--sch-cache'])
+    assert ctx.search_err('loaded from the cache')
+    ctx.expect_out_file_d(prj+'-bom.csv')
+    ctx.clean_up()
+
+
+def test_output_cache_1(test_dir, monkeypatch):
+    """ Outputs restored from the cache (KIBOT_CACHE_DIR), but generated again when an input changes """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_csv_no_info', 'BoM')
+    monkeypatch.setenv('KIBOT_CACHE_DIR', ctx.get_out_path('cache'))
+    # Use a copy of the schematic, we modify it
+    sch = ctx.get_out_path(os.path.basename(ctx.sch_file))
+    shutil.copy2(ctx.sch_file, sch)
+    bom = ctx.get_out_path(os.path.join('BoM', prj+'-bom.csv'))
+    ctx.run(filename=sch)
+    ctx.expect_out_file_d(prj+'-bom.csv')
+    assert 'Restored from the cache' not in ctx.out
+    # Nothing changed, must use the cache
+    os.remove(bom)
+    ctx.run(filename=sch)
+    assert ctx.search_out('Restored from the cache')
+    ctx.expect_out_file_d(prj+'-bom.csv')
+    # The schematic changed, must generate it again
+    with open(sch, 'at') as f:
+        f.write('\n')
+    os.remove(bom)
+    ctx.run(filename=sch)
+    assert 'Restored from the cache' not in ctx.out
+    ctx.expect_out_file_d(prj+'-bom.csv')
+    ctx.clean_up()
+
+
+def test_precompile_1(test_dir, monkeypatch):
+    """ --precompile stores the bytecode with the macros expanded, replacing bytecode compiled without expanding them
+        (i.e. pip without --no-compile). Then a normal run imports the plug-ins from this bytecode """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_csv_no_info', 'BoM')
+    monkeypatch.setenv('PYTHONPYCACHEPREFIX', ctx.get_out_path('pycache'))
+    monkeypatch.delenv('PYTHONDONTWRITEBYTECODE', raising=False)
+    # Bytecode without the macros expanded, the plug-in can't be imported
+    bom = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'kibot', 'out_bom.py'))
+    subprocess.run([sys.executable, '-m', 'py_compile', bom], check=True)
+    ctx.run(WRONG_INSTALL)
+    assert ctx.search_err("cannot import name 'macros'")
+    # Precompile the plug-ins
+    ctx.run(extra=['--precompile'], no_out_dir=True, no_yaml_file=True, no_board_file=True)
+    assert ctx.search_out(r'\d+ plug-ins precompiled')
+    pyc = glob(os.path.join(ctx.get_out_path('pycache'), '**', 'out_bom.*.pyc'), recursive=True)
+    assert len(pyc) == 1
+    mtime = os.path.getmtime(pyc[0])
+    # A normal run, using the bytecode
+    ctx.run()
+    ctx.expect_out_file_d(prj+'-bom.csv')
+    assert os.path.getmtime(pyc[0]) == mtime
+    ctx.clean_up()
+
+
+def test_mem_profile_1(test_dir):
+    prj = 'simple_2layer'
+    ctx = context.TestContext(test_dir, prj, 'pre_and_position', POS_DIR)
+    ctx.run(extra=['-s', 'all', '--mem-profile', '--profile', ctx.get_out_path('profile.json')])
+    with open(ctx.get_out_path('profile.json'), 'rt') as f:
+        data = json.load(f)
+    assert {p['name'] for p in data['memory']['phases']} == {'pos_ascii', 'position'}
+    assert ctx.search_out('Memory summary')
+    ctx.clean_up()
+
+
 @pytest.mark.slow
 @pytest.mark.eeschema
 def test_qr_lib_1(test_dir):
@@ -1622,6 +1787,24 @@ def test_sub_pcb_bp(test_dir):
     ctx.clean_up(keep_project=True)
 
 
+@pytest.mark.slow
+@pytest.mark.pcbnew
+def test_sub_pcb_reuse(test_dir):
+    """ Outputs using the same sub-PCB share the PCB, even when other sub-PCBs are used in the middle """
+    prj = 'batteryPack'
+    dir_o = 'Export'
+    ctx = context.TestContext(test_dir, prj, 'netlist_ipc_sub_pcb_reuse', dir_o)
+    ctx.run()
+    fname = os.path.join(dir_o, prj+'-IPC-D-356_')
+    ctx.expect_out_file(fname+'charger_1.d356')
+    ctx.expect_out_file(fname+'battery.d356')
+    ctx.expect_out_file(fname+'charger_2.d356')
+    # Applying the sub-PCBs doesn't invalidate the PCBs already created
+    assert len(re.findall('Creating modified PCB', ctx.err)) == 2
+    ctx.search_err('Reusing modified PCB')
+    ctx.clean_up(keep_project=True)
+
+
 @pytest.mark.skipif(context.ki5(), reason="Needs porting")
 def test_lcsc_field_known(test_dir):
     """ Test we can detect a known LCSC field name """
@@ -1723,3 +1906,63 @@ def test_definitions_1(test_dir):
         for copy in range(2):
             ctx.expect_out_file(f'{prj}-{la}_silk_{copy+1}.gbr')
     ctx.clean_up()
+
+
+def send_job(socket_name, job):
+    """ Sends a job to the --serve server, returns the messages and the exit code """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_name)
+        s.sendall((job if isinstance(job, str) else json.dumps(job)).encode()+b'\n')
+        res = b''
+        while True:
+            data = s.recv(4096)
+            if not data:
+                break
+            res += data
+    res = res.decode()
+    logging.debug('Job {} result: {}'.format(job, res))
+    m = re.search(r'^exit: (\d+)$', res, re.MULTILINE)
+    assert m is not None, res
+    return res, int(m.group(1))
+
+
+def test_serve_1(test_dir):
+    """ --serve: run a job, reload the configuration when it changes and reject malformed jobs """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_simple_csv', 'BoM')
+    # Use a copy of the configuration, we modify it
+    yaml_file = ctx.get_out_path('serve.kibot.yaml')
+    shutil.copy2(ctx.yaml_file, yaml_file)
+    ctx.yaml_file = yaml_file
+    socket_name = ctx.get_out_path('kibot.sock')
+    ctx.start_server(socket_name)
+    try:
+        # A job
+        _, ret = send_job(socket_name, {'targets': ['bom_internal']})
+        assert ret == 0
+        ctx.expect_out_file_d(prj+'-bom.csv')
+        # The configuration changed
+        with open(yaml_file, 'rt') as f:
+            cfg = f.read()
+        with open(yaml_file, 'wt') as f:
+            f.write(cfg.replace('dir: BoM', 'dir: BoM2'))
+        mtime = os.path.getmtime(yaml_file)+10
+        os.utime(yaml_file, (mtime, mtime))
+        _, ret = send_job(socket_name, {'targets': ['bom_internal'], 'out_dir': ctx.get_out_path('job2')})
+        assert ret == 0
+        ctx.expect_out_file(os.path.join('job2', 'BoM2', prj+'-bom.csv'))
+        # Malformed jobs
+        res, ret = send_job(socket_name, 'not a JSON')
+        assert ret == EXIT_BAD_ARGS
+        assert 'Malformed job' in res
+        res, ret = send_job(socket_name, '["bom_internal"]')
+        assert ret == EXIT_BAD_ARGS
+        res, ret = send_job(socket_name, {'targets': ['bom_internal'], 'jobs': 'many'})
+        assert ret == EXIT_BAD_ARGS
+        assert '-j/--jobs must be' in res
+        res, ret = send_job(socket_name, {'targets': ['bom_internal'], 'variant': 'bogus'})
+        assert ret == EXIT_BAD_ARGS
+    finally:
+        ctx.stop_server()
+    assert ctx.search_err('Configuration changed, reloading')
+    ctx.clean_up()
@@ -1,28 +1,46 @@
 from decimal import Decimal as D
+import io
 import os
 import re
+import shutil
 import pytest
 import coverage
 import logging
 import subprocess
 import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
 from . import context
 from kibot.layer import Layer
 from kibot.pre_base import BasePreFlight
-from kibot.out_base import BaseOutput
+from kibot.out_base import BaseOutput, VariantOptions
+from kibot.optionable import BaseOptions
 from kibot.gs import GS
-from kibot.kiplot import load_actions, _import, load_board, generate_makefile
+from kibot.kiplot import (load_actions, _import, load_board, generate_makefile, _index_actions, load_plugins_index,
+                          scan_plugin)
+from kibot import kiplot
 from kibot.dep_downloader import search_as_plugin
-from kibot.registrable import RegOutput, RegFilter
-from kibot.misc import (WRONG_INSTALL, BOM_ERROR, DRC_ERROR, ERC_ERROR, PDF_PCB_PRINT, KICAD2STEP_ERR)
+from kibot import output_cache
+from kibot import incremental
+from kibot.registrable import RegOutput, RegFilter, RegVariant
+from kibot.misc import (WRONG_INSTALL, BOM_ERROR, DRC_ERROR, ERC_ERROR, PDF_PCB_PRINT, KICAD2STEP_ERR, CORRUPTED_SCH,
+                        EXIT_BAD_ARGS)
 from kibot.bom.columnlist import ColumnList
 from kibot.bom.units import get_prefix, comp_match
 import kibot.bom.units as units
 from kibot.bom.electro_grammar import parse
+import kibot.bom.electro_grammar as electro_grammar
 from kibot.__main__ import detect_kicad
-from kibot.kicad.config import KiConf
+from kibot.kicad.config import KiConf, SYM_LIB_TABLE
 from kibot.globals import Globals
 from kibot.PcbDraw.unit import read_resistance
+from kibot.kicad.sexpdata import (Parser, FastParser, ExpectClosingBracket, ExpectNothing, load, loads, sexp_iter, dumps,
+                                  StreamDumper, Sep)
+from kibot.kicad.v6_sch import LibComponent, FontEffects, SchematicFieldV6, SchematicV6
+from kibot.kicad.error import SchError
+from kibot.kicad.v5_sch import SymLib, DocLib, SchematicComponent, SchematicField
+from kibot.kicad import lib_index, v6_sch
+from kibot.server import exit_code
 
 cov = coverage.Coverage()
 mocked_check_output_FNF = True
@@ -550,3 +568,543 @@ def test_electro_grammar_1():
                 res = parse(c)
                 assert res == ref, "For `{}` got:\n{}\nExpected:\n{}".format(c, res, ref)
                 logging.debug(c+" Ok")
+
+
+@pytest.mark.indep
+def test_sexp_fast_parser():
+    """ The fast S-expression parser must give the same results than the original """
+    with context.cover_it(cov):
+        samples = ['(a b)', 'a', "(a 'b)", "(a '(b))", "''a", '"x\\ny\\q"', 'a\\ b', '[1 2]', '(a ;c\n b)', 'nil t',
+                   '(1 -2.5 1e3 inf nan x1 .5 0x1)']
+        base = os.path.join(os.path.dirname(__file__), '..', 'board_samples', 'kicad_7')
+        for f in ('light_control.kicad_sch', 'bom.kicad_pcb'):
+            with open(os.path.join(base, f), 'rt') as f:
+                samples.append(f.read())
+        for s in samples:
+            assert repr(FastParser(s).parse()) == repr(Parser(s).parse())
+        # Errors are reported by the original parser
+        with pytest.raises(ExpectClosingBracket):
+            FastParser('(a ]').parse()
+        with pytest.raises(ExpectNothing):
+            FastParser('a)').parse()
+        # No recursion limit
+        res = FastParser('('*(sys.getrecursionlimit()*2)+')'*(sys.getrecursionlimit()*2)).parse()
+        assert isinstance(res[0][0], list)
+
+
+@pytest.mark.indep
+def test_sexp_stream_dumper():
+    """ The streamed S-expression must be the same we get from dumps """
+    with context.cover_it(cov):
+        fname = os.path.join(os.path.dirname(__file__), '..', 'board_samples', 'kicad_7', 'light_control.kicad_sch')
+        with open(fname, 'rt') as f:
+            sch = load(f)[0]
+        sch.insert(3, Sep())
+        samples = [sch, [Sep()], [1, Sep(), Sep()], [[1, Sep()], Sep(), 'a  ', Sep()]]
+        for s in samples:
+            out = io.StringIO()
+            d = StreamDumper(out)
+            d.extend(s)
+            d.append(1)
+            assert d.pop() == 1
+            d.close()
+            assert out.getvalue() == dumps(s)
+
+
+@pytest.mark.indep
+def test_lazy_lib_symbols():
+    """ The lib symbols body is parsed on demand, the result must be the same """
+    with context.cover_it(cov):
+        fname = os.path.join(os.path.dirname(__file__), '..', 'board_samples', 'kicad_7', 'light_control.kicad_sch')
+        with open(fname, 'rt') as f:
+            sch = load(f)
+        for s in sexp_iter(sch, 'kicad_sch/lib_symbols/symbol'):
+            lazy = LibComponent.load(s, 'test', lazy=True)
+            assert lazy._body is not None
+            eager = LibComponent.load(s, 'test')
+            assert lazy.is_power == eager.is_power
+            assert lazy.get_field_value('ki_description') == eager.get_field_value('ki_description')
+            assert len(lazy.draw) == len(eager.draw)
+            assert lazy._body is None
+            assert len(lazy.units) == len(eager.units)
+            assert lazy.unit_count == eager.unit_count
+            assert len(lazy.all_pins) == len(eager.all_pins)
+            assert lazy.box.x1 == eager.box.x1 and lazy.box.y2 == eager.box.y2
+
+
+@pytest.mark.indep
+def test_lazy_lib_symbols_corrupted(caplog):
+    """ A corrupted lib symbol body is reported when we parse it, like for the eager load """
+    with context.cover_it(cov):
+        s = loads('(symbol "Device:R" (property "Reference" "R" (at 0 0 0) (effects (font (size 1.27 1.27))))'
+                  ' (circle (center 1)))')[0]
+        with pytest.raises(SchError):
+            LibComponent.load(s, 'test')
+        lazy = LibComponent.load(s, 'test', lazy=True)
+        with pytest.raises(SystemExit) as e:
+            lazy.draw
+        assert e.type == SystemExit
+        assert e.value.code == CORRUPTED_SCH
+        assert 'While loading the `Device:R` library symbol' in caplog.text
+
+
+@pytest.mark.indep
+def test_shared_font_effects():
+    """ The parsed font effects are shared, modifying a field must use a copy """
+    with context.cover_it(cov):
+        sexp = '(property "Value" "10k" (at 1 2 0) (effects (font (size 1.27 1.27)) hide))'
+        f1 = SchematicFieldV6.parse(loads(sexp)[0], 1)
+        f2 = SchematicFieldV6.parse(loads(sexp)[0], 1)
+        assert f1.effects is f2.effects
+        assert not hasattr(f1, '__dict__') and not hasattr(f1.effects, '__dict__')
+        # 1 and 1.0 are written in a different way
+        f3 = SchematicFieldV6.parse(loads(sexp.replace('1.27 1.27', '1 1'))[0], 1)
+        f4 = SchematicFieldV6.parse(loads(sexp.replace('1.27 1.27', '1.0 1.0'))[0], 1)
+        assert f3.effects is not f4.effects
+        f1.visible(True)
+        assert f1.is_visible() and not f2.is_visible()
+        f2.set_xy(0, 0, hjustify='L')
+        assert f2.effects.hjustify == 'L'
+        assert FontEffects.parse(loads('(effects (font (size 1.27 1.27)) hide)')[0]).hjustify == 'C'
+
+
+@pytest.mark.indep
+def test_v5_lib_index(monkeypatch, tmp_path):
+    """ Only the needed entries are read from the indexed KiCad 5 libs, the index is stored in the cache """
+    with context.cover_it(cov):
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+        base = os.path.join(os.path.dirname(__file__), '..', 'board_samples', 'kicad_5')
+        lib = os.path.join(base, 'l1.lib')
+        dcm = os.path.join(base, 'l1.dcm')
+        full = SymLib()
+        full.load_all(lib, 'l1', {'l1:R': None}, None)
+        # The first time the index is created, the second is loaded from disk
+        for _ in range(2):
+            lib_index._indexes.clear()
+            needed = {'l1:R': None, 'l1:Resistor': None}
+            o = SymLib()
+            o.load(lib, 'l1', needed)
+            assert list(o.comps.keys()) == ['R'] and list(o.alias.keys()) == ['Resistor']
+            assert needed['l1:R'] is o.comps['R'] and needed['l1:Resistor'] is o.comps['R']
+            assert len(o.comps['R'].draw) == len(full.comps['R'].draw)
+            assert o.comps['R'].get_field_value('Test') == 'Hi!'
+            d = DocLib()
+            d.load(dcm, {'R'})
+            assert len(d.comps) == 0
+            d.load(dcm, {'BLM21PG221SN1D'})
+            assert d.comps['BLM21PG221SN1D'].desc == 'FERRITE BEAD 220 OHM 0805 1LN'
+        assert len(os.listdir(os.path.join(str(tmp_path), 'kibot', 'lib_index'))) == 2
+        # Libs with errors are fully parsed, so we get the same errors and warnings
+        assert lib_index.get_index(os.path.join(base, 'v5_errors', 'l5.lib'), SymLib.scan) is None
+
+
+@pytest.mark.indep
+def test_lib_tables_cache(monkeypatch, tmp_path):
+    """ The resolved lib tables are cached, and the cache is invalidated when a table changes """
+    with context.cover_it(cov):
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+        prj = tmp_path / 'prj'
+        prj.mkdir()
+        table = prj / SYM_LIB_TABLE
+        monkeypatch.setattr(KiConf, 'loaded', True)
+        monkeypatch.setattr(KiConf, 'dirname', str(prj))
+        monkeypatch.setattr(KiConf, 'config_dir', None)
+        monkeypatch.setattr(KiConf, 'kicad_env', {'KIPRJMOD': str(prj)})
+        monkeypatch.setattr(KiConf, 'lib_aliases', None)
+        for name in ('l1', 'l2', 'l2'):
+            table.write_text('(sym_lib_table\n  (lib (name {0})(type Legacy)(uri ${{KIPRJMOD}}/{0}.lib)(options "")'
+                             '(descr ""))\n)\n'.format(name))
+            KiConf.lib_aliases = None
+            alias = KiConf.get_lib_alias('sym', name)
+            assert alias.uri == str(prj / (name+'.lib'))
+            assert alias.type == 'Legacy'
+            assert list(KiConf.lib_aliases.keys()) == [name]
+        assert len(os.listdir(str(tmp_path / 'cache' / 'kibot' / 'lib_tables'))) == 1
+
+
+@pytest.mark.indep
+def test_electro_grammar_cache(monkeypatch, tmp_path):
+    """ The parsed values are stored in the cache, even the ones we fail to parse """
+    with context.cover_it(cov):
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+        monkeypatch.setattr(electro_grammar, 'cache', None)
+        monkeypatch.setattr(electro_grammar, 'cache_modified', False)
+        texts = ['C 100nF 10% X7R 0603', 'R 4k7 1/4W', 'this is total rubbish']
+        ref = [parse(t, with_extra=True) for t in texts]
+        electro_grammar.save_cache()
+        assert os.path.isfile(electro_grammar.get_cache_name())
+        # Now load it from disk, we shouldn't need the parser
+        electro_grammar.cache = None
+        monkeypatch.setattr(electro_grammar, 'do_parse', None)
+        assert [parse(t, with_extra=True) for t in texts] == ref
+        assert parse(texts[0]) == {k: v for k, v in ref[0].items() if k not in ('val', 'mult')}
+
+
+def make_comp(ref, footprint, **fields):
+    c = SchematicComponent()
+    c.ref = ref
+    c.fields = []
+    for n, (name, value) in enumerate((('Reference', ref), ('Footprint', footprint)) + tuple(fields.items())):
+        fld = SchematicField()
+        fld.name = name
+        fld.value = value
+        fld.number = n
+        c.fields.append(fld)
+    c.dfields = {f.name.lower(): f for f in c.fields}
+    return c
+
+
+@pytest.mark.indep
+def test_generic_filter_compiled():
+    """ The generic filter is compiled on the first use and the results are stored using the data from the component """
+    with context.cover_it(cov):
+        load_actions()
+        filter = RegFilter.get_class_for('generic')()
+        filter.set_tree({'name': 'test', 'type': 'generic', 'exclude_all_hash_ref': True, 'exclude_config': True,
+                         'exclude_any': [{'column': 'Footprint', 'regex': 'test.*point'},
+                                         {'column': 'Footprint', 'regex': '^mount.*hole'},
+                                         {'column': 'dnp', 'regex': '^1$', 'skip_if_no_field': True}]})
+        filter.config(None)
+        comps = [make_comp('R1', 'R_0603'), make_comp('TP1', 'TestPoint_Pad'), make_comp('H1', 'MountingHole_3mm'),
+                 make_comp('#PWR01', ''), make_comp('R2', 'R_0603', Config='v1,DNF'), make_comp('R3', 'R_0603', dnp='1'),
+                 make_comp('R4', 'R_0603', dnp='0'), make_comp('R5', 'R_0603')]
+        res = [True, False, False, False, False, False, True, True]
+        assert [filter.filter(c) for c in comps] == res
+        assert len(filter._results) == len(comps)
+        # Again, now from the stored results
+        assert [filter.filter(c) for c in comps] == res
+        assert len(filter._results) == len(comps)
+        # Changing a field changes the data, so we test it again
+        comps[6].dfields['dnp'].value = '1'
+        assert not filter.filter(comps[6])
+
+
+def make_variant_options(variant, monkeypatch):
+    o = VariantOptions()
+    o.variant = RegOutput.check_variant(variant)
+    o.dnf_filter = o.pre_transform = None
+    for m in ('filter_pcb_components', 'unfilter_pcb_components', 'set_title', 'restore_title'):
+        monkeypatch.setattr(o, m, lambda *args, **kwargs: None)
+    return o
+
+
+@pytest.mark.indep
+def test_variant_board_sub_pcbs(monkeypatch, tmp_path):
+    """ Outputs using the same variant share the PCB, but each sub-PCB (var[sub]) gets its own PCB """
+    with context.cover_it(cov):
+        load_actions()
+        monkeypatch.setattr(GS, 'create_eda_rect', MagicMock())
+        monkeypatch.setattr(VariantOptions, '_variant_boards', {})
+        monkeypatch.setattr(VariantOptions, '_variant_boards_files', [])
+        RegOutput.reset()
+        var = RegVariant.get_class_for('kibom')()
+        var.set_tree({'name': 'var', 'type': 'kibom',
+                      'sub_pcbs': [{'name': 'left', 'reference': 'B1'}, {'name': 'right', 'reference': 'B2'}]})
+        var.config(None)
+        RegOutput.add_variants({'var': var})
+        saved = []
+
+        def save():
+            fname = str(tmp_path / 'board_{}.kicad_pcb'.format(len(saved)))
+            open(fname, 'wt').close()
+            saved.append(fname)
+            return fname, []
+
+        boards = [make_variant_options(v, monkeypatch).save_variant_board('test', '', False, save)
+                  for v in ('var[left]', 'var[right]', 'var[left]', 'var[right]')]
+        assert len(saved) == 2
+        assert boards == saved*2
+        # The same for the schematic
+        sch_keys = {make_variant_options(v, monkeypatch).get_variant_sch_key('') for v in ('var[left]', 'var[right]')}
+        assert len(sch_keys) == 2
+        RegOutput.reset()
+
+
+@pytest.mark.indep
+def test_footprints_data(test_dir):
+    """ The footprints data is collected once and invalidated when the PCB is reloaded or changed """
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        detect_kicad()
+        load_actions()
+        init_globals()
+        GS.set_pcb(ctx.board_file)
+        GS.board = None
+        KiConf.loaded = False
+        load_board()
+        data = kiplot.get_footprints_data()
+        assert [m.ref for m in data] == [m.GetReference() for m in GS.get_modules()]
+        assert kiplot.get_footprints_data() is data
+        # The cached data doesn't see changes to the board ...
+        m = next(iter(GS.get_modules()))
+        ori_x = GS.get_center(m).x
+        offset = GS.get_center(m)
+        offset.x = GS.from_mm(1)
+        offset.y = 0
+        m.Move(offset)
+        assert kiplot.get_footprints_data() is data
+        # ... until somebody tells it changed (i.e. sub-PCBs)
+        GS.board_geometry += 1
+        moved = kiplot.get_footprints_data()
+        assert moved is not data
+        assert moved[0].x == ori_x+GS.from_mm(1)
+        # Reloading the PCB invalidates it
+        load_board(forced=True)
+        reloaded = kiplot.get_footprints_data()
+        assert reloaded is not moved
+        assert reloaded == data
+
+
+def load_sch_v6(fname, jobs, monkeypatch):
+    monkeypatch.setattr(GS, 'jobs', jobs)
+    sch = SchematicV6()
+    sch.load(fname, 'fail-erc')
+    return sch
+
+
+@pytest.mark.indep
+@pytest.mark.skipif(sys.version_info < (3, 7) or GS.on_windows, reason="Sub-sheets are loaded sequentially")
+def test_parallel_sheets(monkeypatch, tmp_path):
+    """ The sub-sheets parsed using a pool of processes (-j) give the same result.
+        The files we fail to parse are left to the sequential load, that reports the error """
+    with context.cover_it(cov):
+        load_actions()
+        init_globals()
+        src = os.path.join(os.path.dirname(__file__), '..', 'board_samples', 'kicad_7')
+        for f in ('fail-erc', 'power', 'logic'):
+            shutil.copy(os.path.join(src, f+'.kicad_sch'), tmp_path)
+        fname = str(tmp_path / 'fail-erc.kicad_sch')
+        power = str(tmp_path / 'power.kicad_sch')
+        logic = str(tmp_path / 'logic.kicad_sch')
+        serial = load_sch_v6(fname, 1, monkeypatch)
+        parallel = load_sch_v6(fname, 2, monkeypatch)
+        assert [s.fname for s in parallel.all_sheets] == [s.fname for s in serial.all_sheets]
+        assert ([(c.ref, c.sheet_path_h) for c in parallel.get_components()] ==
+                [(c.ref, c.sheet_path_h) for c in serial.get_components()])
+        # The workers parse the sub-sheets
+        with open(fname, 'rt') as f:
+            root = load(f)[0]
+        sch = SchematicV6()
+        sch._sexp_cache = {}
+        sch._preload_sheets(fname, root)
+        assert set(sch._sexp_cache.keys()) == {power, logic}
+        # A worker fails to parse a sub-sheet
+        with open(logic, 'wt') as f:
+            f.write('(kicad_sch (version 20230121)\n')
+        sch._sexp_cache = {}
+        sch._preload_sheets(fname, root)
+        assert set(sch._sexp_cache.keys()) == {power}
+        with pytest.raises(ExpectClosingBracket):
+            load_sch_v6(fname, 2, monkeypatch)
+
+
+@pytest.mark.indep
+def test_serve_exit_code():
+    """ The exit code of a --serve job is computed like the Python interpreter does """
+    with context.cover_it(cov):
+        assert exit_code(SystemExit()) == 0
+        assert exit_code(SystemExit(None)) == 0
+        assert exit_code(SystemExit(0)) == 0
+        assert exit_code(SystemExit(EXIT_BAD_ARGS)) == EXIT_BAD_ARGS
+        assert exit_code(SystemExit('Fatal error')) == 1
+
+
+def make_cached_output(name, size):
+    """ An output with one target of `size` bytes """
+    fname = os.path.join(GS.out_dir, name+'.txt')
+    with open(fname, 'wb') as f:
+        f.write(name.encode()*size)
+    return SimpleNamespace(name=name, type='test'), [fname]
+
+
+def restore_output(out, targets):
+    os.remove(targets[0])
+    if not output_cache.restore(out, targets):
+        return False
+    with open(targets[0], 'rb') as f:
+        assert f.read() == out.name.encode()*1024
+    return True
+
+
+@pytest.mark.indep
+def test_output_cache(monkeypatch, tmp_path):
+    """ Outputs cache: hits, misses when an input changes, LRU eviction and partial entries left by a crash """
+    with context.cover_it(cov):
+        monkeypatch.setattr(GS, 'out_dir', str(tmp_path))
+        monkeypatch.setenv('KIBOT_CACHE_SIZE', '10k')
+        # The key is the fingerprint, it changes when an input changes
+        fps = {'a': 'a1'*32, 'b': 'b1'*32, 'c': 'c1'*32}
+        monkeypatch.setattr(output_cache, 'get_fingerprint', lambda out: fps[out.name])
+        # Hit
+        monkeypatch.setattr(output_cache, 'cache_dir', str(tmp_path / 'cache1'))
+        a, a_targets = make_cached_output('a', 1024)
+        output_cache.store(a, a_targets)
+        assert os.path.isfile(os.path.join(output_cache.get_entry_dir(fps['a']), output_cache.ENTRY_MANIFEST))
+        assert restore_output(a, a_targets)
+        # Miss after an input change
+        fps['a'] = 'a2'*32
+        assert not restore_output(a, a_targets)
+        # LRU eviction: 3 entries of 4 kB don't fit in 10 kB
+        monkeypatch.setattr(output_cache, 'cache_dir', str(tmp_path / 'cache2'))
+        outs = {n: make_cached_output(n, 1024*4) for n in ('a', 'b')}
+        for t, (n, (out, targets)) in enumerate(outs.items()):
+            output_cache.store(out, targets)
+            # Make the order clear: b is newer than a
+            os.utime(os.path.join(output_cache.get_entry_dir(fps[n]), output_cache.ENTRY_MANIFEST), (1000*(t+1), 1000*(t+1)))
+        # Now we use `a`, so `b` is the least recently used
+        a, a_targets = outs['a']
+        os.remove(a_targets[0])
+        assert output_cache.restore(a, a_targets)
+        c, c_targets = make_cached_output('c', 1024*4)
+        output_cache.store(c, c_targets)
+        assert os.path.isdir(output_cache.get_entry_dir(fps['a']))
+        assert not os.path.isdir(output_cache.get_entry_dir(fps['b']))
+        assert os.path.isdir(output_cache.get_entry_dir(fps['c']))
+        # Partial stores left by a crash, one old and one that could belong to a running process
+        monkeypatch.setattr(output_cache, 'cache_dir', str(tmp_path / 'cache3'))
+        parent = os.path.dirname(output_cache.get_entry_dir(fps['a']))
+        old_tmp = os.path.join(parent, output_cache.TMP_PREFIX+'old')
+        new_tmp = os.path.join(parent, output_cache.TMP_PREFIX+'new')
+        for tmp in (old_tmp, new_tmp):
+            os.makedirs(os.path.join(tmp, 'files'))
+            with open(os.path.join(tmp, 'files', 'a.txt'), 'wb') as f:
+                f.write(b'a'*1024*16)
+        os.utime(old_tmp, (1000, 1000))
+        a, a_targets = make_cached_output('a', 1024)
+        assert not restore_output(a, a_targets)
+        a, a_targets = make_cached_output('a', 1024)
+        output_cache.store(a, a_targets)
+        assert restore_output(a, a_targets)
+        assert not os.path.isdir(old_tmp)
+        assert os.path.isdir(new_tmp)
+
+
+class Fake3DOptions(BaseOptions):
+    def __init__(self, models):
+        super().__init__()
+        self._models = models
+
+    def get_3d_models(self):
+        return self._models
+
+
+def fingerprint_3d(models):
+    incremental.fingerprints.clear()
+    incremental.files_hashes.clear()
+    out = SimpleNamespace(name='step', type='test', dir='.', _tree={}, options=Fake3DOptions(models),
+                          get_dependencies=lambda: [], get_output_dependencies=lambda: [], is_sch=lambda: False,
+                          is_pcb=lambda: False)
+    return incremental.get_fingerprint(out)
+
+
+@pytest.mark.indep
+def test_fingerprint_3d_models(monkeypatch, tmp_path):
+    """ The fingerprint of the 3D outputs (used by the outputs cache) changes when the models or their paths change """
+    with context.cover_it(cov):
+        monkeypatch.setattr(GS, 'pcb_dir', str(tmp_path))
+        monkeypatch.setattr(GS, 'pro_variables', {})
+        monkeypatch.setattr(GS, 'global_use_os_env_for_expand', True)
+        monkeypatch.setattr(KiConf, 'kicad_env', {'KICAD7_3DMODEL_DIR': '/usr/share/kicad/3dmodels'})
+        model = str(tmp_path / 'R.step')
+        missing = str(tmp_path / 'C.step')
+        with open(model, 'wt') as f:
+            f.write('ISO-10303-21;')
+        fp = fingerprint_3d([model, missing])
+        assert fp == fingerprint_3d([model, missing])
+        # An updated model
+        with open(model, 'wt') as f:
+            f.write('ISO-10303-21; updated')
+        fp_updated = fingerprint_3d([model, missing])
+        assert fp_updated != fp
+        # A missing model is now available
+        with open(missing, 'wt') as f:
+            f.write('ISO-10303-21;')
+        fp_found = fingerprint_3d([model, missing])
+        assert fp_found != fp_updated
+        # Another 3D models library
+        KiConf.kicad_env['KICAD7_3DMODEL_DIR'] = '/opt/kicad/3dmodels'
+        assert fingerprint_3d([model, missing]) != fp_found
+        # The KiCad config has priority over the environment, other variables are ignored
+        monkeypatch.setenv('KICAD7_3DMODEL_DIR', '/tmp')
+        monkeypatch.setenv('HOME', '/tmp')
+        assert incremental.get_3d_vars() == {'KICAD7_3DMODEL_DIR': '/opt/kicad/3dmodels'}
+        monkeypatch.setenv('KICAD8_3DMODEL_DIR', '/tmp')
+        assert incremental.get_3d_vars()['KICAD8_3DMODEL_DIR'] == '/tmp'
+        # The models inside the project use relative names, so other checkouts get the same fingerprint
+        assert set(incremental.hash_3d_models([model, missing])) == {'R.step', 'C.step'}
+
+
+@pytest.mark.indep
+def test_sexp_cache_release(monkeypatch):
+    """ Repeated sheets are parsed once, and the S-expressions are released when no other instance needs them """
+    with context.cover_it(cov):
+        load_actions()
+        init_globals()
+        monkeypatch.setattr(GS, 'jobs', 1)
+        parsed = []
+        cached = []
+        ori_load = v6_sch.load
+        ori_release = SchematicV6._release_sexp
+
+        def load_file(f):
+            parsed.append(os.path.basename(f.name))
+            return ori_load(f)
+
+        def release(self, fname):
+            ori_release(self, fname)
+            cached.append(sorted(os.path.basename(f) for f in self.root_sheet._sexp_cache))
+
+        monkeypatch.setattr(v6_sch, 'load', load_file)
+        monkeypatch.setattr(SchematicV6, '_release_sexp', release)
+        # The root instantiates sub-sheet.kicad_sch twice, and it instantiates deeper.kicad_sch
+        fname = os.path.join(os.path.dirname(__file__), '..', 'board_samples', 'kicad_7', 'test_v5.kicad_sch')
+        sch = SchematicV6()
+        sch.load(fname, 'test_v5')
+        assert parsed == ['test_v5.kicad_sch', 'sub-sheet.kicad_sch', 'deeper.kicad_sch']
+        assert cached == [[], ['sub-sheet.kicad_sch'], ['deeper.kicad_sch', 'sub-sheet.kicad_sch'], ['deeper.kicad_sch'], []]
+        assert len(sch.all_sheets) == 5
+
+
+LAZY_PLUGIN = '''from kibot.macros import macros, output_class  # noqa: F401
+
+
+@output_class
+class {}(BaseOutput):  # noqa: F821
+    def __init__(self):
+        super().__init__()
+'''
+
+
+@pytest.mark.indep
+def test_plugins_index(monkeypatch, tmp_path):
+    """ The plug-ins are indexed without importing them, and imported when one of their classes is needed.
+        The index is updated when a plug-in changes """
+    with context.cover_it(cov):
+        load_actions()
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+        # Only our plug-in
+        monkeypatch.setattr(RegOutput, '_registered', {})
+        monkeypatch.setattr(RegOutput, '_lazy', {})
+        plugins = tmp_path / 'plugins'
+        plugins.mkdir()
+        plugin = plugins / 'out_lazy_test.py'
+        plugin.write_text(LAZY_PLUGIN.format('Lazy_Test'))
+        # The first dir is the KiBot dir, it also loads the globals
+        dirs = [str(tmp_path / 'no_kibot'), str(plugins)]
+        _index_actions(dirs)
+        assert load_plugins_index()[str(plugin)]['classes'] == [['output_class', 'lazy_test']]
+        assert 'lazy_test' in RegOutput._lazy
+        assert 'lazy_test' not in RegOutput._registered
+        assert RegOutput.is_registered('lazy_test')
+        # Using the index, no need to scan the plug-in
+        monkeypatch.setattr(kiplot, 'scan_plugin', None)
+        _index_actions(dirs)
+        # Asking for all the outputs imports the plug-in
+        assert list(RegOutput.get_registered().keys()) == ['lazy_test']
+        assert not RegOutput._lazy
+        # Changing the plug-in makes the index stale
+        monkeypatch.setattr(kiplot, 'scan_plugin', scan_plugin)
+        plugin.write_text(LAZY_PLUGIN.format('Lazy_Test_Changed'))
+        _index_actions(dirs)
+        assert load_plugins_index()[str(plugin)]['classes'] == [['output_class', 'lazy_test_changed']]
+        assert RegOutput.get_class_for('lazy_test_changed').__name__ == 'Lazy_Test_Changed'
@@ -170,6 +170,19 @@ def test_print_sch_svg_variant_ni_1(test_dir):
     ctx.clean_up()
 
 
+@pytest.mark.slow
+@pytest.mark.eeschema
+def test_print_sch_variant_shared(test_dir):
+    """ Two formats using the same variant, the schematic is saved once """
+    prj = 'test_v5'
+    ctx = context.TestContextSCH(test_dir, prj, 'print_sch_variant_shared')
+    ctx.run()
+    ctx.expect_out_file(os.path.join(NI_DIR, 'test_v5-schematic_(no_L).svg'))
+    ctx.expect_out_file(os.path.join(NI_DIR, 'test_v5-schematic_(no_L).pdf'))
+    assert ctx.search_err('Reusing modified schematic')
+    ctx.clean_up()
+
+
 @pytest.mark.slow
 @pytest.mark.eeschema
 def test_print_sch_variant_ni_2(test_dir):
@@ -6,6 +6,8 @@ import logging
 import subprocess
 import re
 import csv
+import signal
+import time
 from contextlib import contextmanager
 from glob import glob
 from pty import openpty
@@ -441,6 +443,32 @@ class TestContext(object):
             else:
                 del os.environ['LANG']
 
+    def start_server(self, socket_name):
+        """ Runs KiBot in server mode (--serve) in background, returns when the server is waiting for jobs """
+        cmd = [COVERAGE_SCRIPT, 'run', os.path.abspath(os.path.dirname(os.path.abspath(__file__))+'/../../src/kibot'), '-v',
+               '-b' if self.mode == MODE_PCB else '-e', self.board_file if self.mode == MODE_PCB else self.sch_file,
+               '-c', self.yaml_file, '-d', self.output_dir, '--serve', socket_name]
+        logging.debug(usable_cmd(cmd))
+        err_filename = self.get_out_path('error.txt')
+        with open(err_filename, 'wt') as f_err:
+            self.proc = subprocess.Popen(cmd, stdout=f_err, stderr=f_err)
+        for _ in range(600):
+            assert self.proc.poll() is None, 'Server died with {}'.format(self.proc.returncode)
+            with open(err_filename, 'rt') as f:
+                if 'Waiting for jobs' in f.read():
+                    return
+            time.sleep(0.1)
+        assert False, 'Server not ready'
+
+    def stop_server(self):
+        """ Stops the server using Ctrl+C, the messages from the server are in `err` """
+        self.proc.send_signal(signal.SIGINT)
+        ret_code = self.proc.wait(timeout=60)
+        self.proc = None
+        with open(self.get_out_path('error.txt'), 'rt') as f:
+            self.err = f.read()
+        assert ret_code == 0, 'ret_code: {}'.format(ret_code)
+
     def search_out(self, text):
         m = re.search(text, self.out, re.MULTILINE)
         assert m is not None, text
@@ -773,6 +801,9 @@ class TestContext(object):
         rows = []
         root = ET.parse(worksheet).getroot()
         ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        # Read the strings, the constant memory mode uses in-line strings
+        strings = self.get_out_path(os.path.join('desc', 'xl', 'sharedStrings.xml'))
+        strs = [t.text for t in ET.parse(strings).getroot().iter(ns+'t')] if os.path.isfile(strings) else []
         rnum = 1
         rfirst = 1
         sh_head = []
@@ -790,13 +821,16 @@ class TestContext(object):
                     type = cell.attrib['t']
                 else:
                     type = 'n'   # default: number
+                if type == 'inlineStr':
+                    this_row.append(cell.find(ns+'is').find(ns+'t').text)
+                    continue
                 value = cell.find(ns+'v')
                 if value is not None:
                     if type == 'n':
                         # Numbers as integers
                         value = int(value.text)
                     else:
-                        value = value.text
+                        value = strs[int(value.text)]
                     this_row.append(value)
             rows.append(this_row)
             rnum += 1
@@ -807,18 +841,6 @@ class TestContext(object):
         if hlinks:
             for r in hlinks.iter(ns+'hyperlink'):
                 links[r.attrib['ref']] = r.attrib[nr+'id']
-        # Read the strings
-        strings = self.get_out_path(os.path.join('desc', 'xl', 'sharedStrings.xml'))
-        strs = [t.text for t in ET.parse(strings).getroot().iter(ns+'t')]
-        # Replace the indexes by the strings
-        for r in rows:
-            for i, val in enumerate(r):
-                if isinstance(val, str):
-                    r[i] = strs[int(val)]
-        for r in sh_head:
-            for i, val in enumerate(r):
-                if isinstance(val, str):
-                    r[i] = strs[int(val)]
         # Translate the links
         if links:
             # Read the relationships